@@ -10,4 +10,5 @@ Author: Walker M. White (wmw2)
 Date:   June 7, 2019
 """
 import sys, app
-app.execute(sys.argv[1:])
+if __name__ == '__main__':      # Worker processes import this file too
+    app.execute(sys.argv[1:])
@@ -11,25 +11,47 @@ functions in modules and we only want script code in the file __main__.py
 Author: Melissa Nondorf
 Date: 2/14/23
 """
-import utils
-import tests
+import os
 import os.path
-import violations
+import itertools
 
-# Uncomment for the extra credit
-#import endorsements
-#import inspections
+# The audit modules (violations.py and the rest) are imported by the functions that use
+# them, so that printing the usage message (or running the tests) does not load them
 
+# The engines that can check for weather violations
+ENGINES = ('scalar','numpy')
 
-def discover_violations(directory,output):
+# The suffix of a dataset database (see database.py)
+DATABASE_SUFFIX = '.db'
+
+# The usage message for a malformed command line
+USAGE = ('Usage: python auditor dataset [dataset ...] [output.csv] [--out-dir DIR] [--jobs N] '+
+         '[--shards N] [--engine scalar|numpy] [--no-cache] [--clear-cache]\n'+
+         '       [--convert-weather] [--incremental] [--memo-size N] [--profile report.json]\n'+
+         '       [--profile-stacks FILE] [--import] [--student ID] [--plane TAILNO]\n'+
+         '       [--instructor ID] [--from TIME] [--to TIME] [--repairs]')
+
+# The command line options (which all take a value) and their default values
+OPTIONS = {'--out-dir': None, '--jobs': None, '--shards': '1', '--engine': 'scalar',
+           '--memo-size': None, '--profile': None, '--profile-stacks': None,
+           '--student': None, '--plane': None, '--instructor': None, '--from': None, '--to': None}
+
+# The options that filter the lessons of a database audit (see database.get_conditions)
+FILTERS = ('--student','--plane','--instructor','--from','--to')
+
+# The command line flags (which take no value)
+FLAGS = ('--no-cache','--clear-cache','--convert-weather','--incremental','--import','--repairs')
+
+
+def discover_violations(directory,output,engine='scalar',shards=1,use_cache=True,
+                        incremental=False,memo_size=None,filters=None):
     """
     Searches the dataset directory for any flight lessons the violation regulations.
     
     This function will call list_weather_violations() to get the list of weather violations.
-    If list_endorsment_violations (optional) is completed, it will call that too, as
-    well as list_inspection_violations.  It will concatenate all of these 2d lists
-    into a single 2d list of violations (so a flight may be listed more than once for
-    each of the three types of violations).
+    It will also call list_endorsement_violations and list_inspection_violations.  It
+    will concatenate all of these 2d lists into a single 2d list of violations (so a
+    flight may be listed more than once for each of the three types of violations).
     
     If the parameter output is not None, it will create the CSV file with name output
     and write the 2d list of violations to this file.  This CSV file should have the
@@ -46,6 +68,18 @@ def discover_violations(directory,output):
     
         'No violations found.'
     
+    The weather violations may be computed by one of two engines.  The 'scalar' engine
+    (the default) checks one lesson at a time in violations.py.  The 'numpy' engine
+    checks thousands of lessons at once in vectorized.py (and requires NumPy).  Both
+    engines produce exactly the same violations.
+    
+    The compiled reference files are kept in a cache in the dataset directory (see
+    cache.py), so repeated audits of the same dataset start almost immediately.
+    
+    If incremental is True, the audit continues from the checkpoint of the last
+    incremental audit (see checkpoint.py), so only the lessons appended since then are
+    checked.  The violations are the same as those of a full audit.
+    
     Parameter directory: The directory of files to audit
     Precondition: directory is the name of a directory containing the files 'daycycle.json',
     'weather.json', 'minimums.csv', 'students.csv', 'teachers.csv', 'lessons.csv',
@@ -53,66 +87,435 @@ def discover_violations(directory,output):
     
     Parameter output: The CSV file to store the results
     Precondition: output is None or a string that is a valid file name
+    
+    Parameter engine: The engine for weather violations (OPTIONAL)
+    Precondition: engine is one of the strings in ENGINES
+    
+    Parameter shards: The number of worker processes for the scalar engine (OPTIONAL)
+    Precondition: shards is an int > 0
+    
+    Parameter use_cache: Whether to use the dataset cache (OPTIONAL)
+    Precondition: use_cache is a boolean
+    
+    Parameter incremental: Whether to continue from the last checkpoint (OPTIONAL)
+    Precondition: incremental is a boolean
+    
+    Parameter memo_size: The size of the memo of weather violations (OPTIONAL)
+    Precondition: memo_size is None (to keep the current size) or an int >= 0
+    
+    Parameter filters: The lessons to audit in a database (OPTIONAL)
+    Precondition: filters is None or a dictionary as in database.get_conditions
+    """
+    print(summarize(audit_dataset(directory,output,engine,shards,use_cache,incremental,
+                                  memo_size,filters)))
+
+
+def audit_dataset(directory,output=None,engine='scalar',shards=1,use_cache=True,
+                  incremental=False,memo_size=None,filters=None):
     """
-    violations_list = violations.list_weather_violations(directory)
-    v_count = len(violations_list)
+    Returns the number of violations in the dataset directory.
+    
+    This function does all of the work of discover_violations, except that it does not
+    print anything.  It writes the violations to the CSV file output if that is not None.
+    It is a separate function so that it can run in a worker process.
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the dataset files
+    (see discover_violations), or of a database made by database.import_dataset
+    
+    Parameter output: The CSV file to store the results (OPTIONAL)
+    Precondition: output is None or a string that is a valid file name
+    
+    Parameter engine: The engine for weather violations (OPTIONAL)
+    Precondition: engine is one of the strings in ENGINES
+    
+    Parameter shards: The number of worker processes for the scalar engine (OPTIONAL)
+    Precondition: shards is an int > 0; if it is more than 1, the lessons are split 
+    between the workers by violations.iter_sharded_violations
+    
+    The engine and shards are ignored by an incremental audit, which checks the new
+    lessons in this process with the scalar engine.  They are also ignored by the audit
+    of a database (a file ending in DATABASE_SUFFIX, see database.py), which can be
+    limited to the lessons that match filters.
+    
+    Parameter use_cache: Whether to use the dataset cache (OPTIONAL)
+    Precondition: use_cache is a boolean
+    
+    Parameter incremental: Whether to continue from the last checkpoint (OPTIONAL)
+    Precondition: incremental is a boolean
+    
+    Parameter memo_size: The size of the memo of weather violations (OPTIONAL)
+    Precondition: memo_size is None (to keep the current size) or an int >= 0
+    
+    Parameter filters: The lessons to audit in a database (OPTIONAL)
+    Precondition: filters is None or a dictionary as in database.get_conditions
+    """
+    import utils
+    import violations
+    import inspections
+    import endorsements
+    if memo_size != None:
+        import memo
+        memo.get_memo(violations.WEATHER_MEMO,memo_size)
+    if is_database(directory):
+        import database
+        violations_list = database.iter_violations(directory,filters)
+    elif incremental:
+        import checkpoint
+        violations_list = checkpoint.audit_incremental(directory,use_cache)
+    elif engine == 'numpy':
+        import vectorized
+        violations_list = vectorized.list_weather_violations(directory,use_cache=use_cache)
+    elif shards > 1:
+        violations_list = violations.iter_sharded_violations(directory,shards,use_cache=use_cache)
+    else:
+        violations_list = violations.iter_weather_violations(directory,use_cache=use_cache)
+    if not incremental and not is_database(directory):
+        violations_list = itertools.chain(violations_list,
+                                          endorsements.iter_endorsement_violations(directory,use_cache),
+                                          inspections.iter_inspection_violations(directory))
     header = ['STUDENT','AIRPLANE','INSTRUCTOR','TAKEOFF','LANDING','FILED','AREA','REASON']
     
+    # Violations are written as they are found, and only counted at the end
+    if output != None:
+        return utils.stream_csv(violations_list, output, header)
+    
+    v_count = 0
+    for violation in violations_list:
+        v_count += 1
+    return v_count
+
+
+def is_database(directory):
+    """
+    Returns True if directory names a dataset database rather than a dataset directory.
+    
+    Parameter directory: The dataset to audit
+    Precondition: directory is a string
+    """
+    return directory.lower().endswith(DATABASE_SUFFIX)
+
+
+def summarize(v_count):
+    """
+    Returns the summary message for the given number of violations.
+    
+    The message is '23 violations found.', '1 violation found.', or 'No violations found.'
+    
+    Parameter v_count: The number of violations
+    Precondition: v_count is an int >= 0
+    """
     if v_count>1:
-        print(f"{v_count} violations found.")
+        return f"{v_count} violations found."
     elif v_count==1:
-        print(f"{v_count} violation found.")
+        return f"{v_count} violation found."
     else:
-        print('No violations found.')
+        return 'No violations found.'
 
-    if output != None:
-        violations_list.insert(0,header)
-        utils.write_csv(violations_list, output)
+
+def output_for(directory,outdir):
+    """
+    Returns the output CSV file for the dataset directory (or None if outdir is None).
+    
+    The file is named after the dataset, so KITH-2019 (or the database KITH-2019.db) is
+    written to KITH-2019.csv.
     
+    Parameter directory: The directory of files to audit
+    Precondition: directory is a string
+    
+    Parameter outdir: The directory for the output files
+    Precondition: outdir is None or a string
+    """
+    if outdir == None:
+        return None
+    name = os.path.basename(os.path.normpath(directory))
+    if is_database(name):
+        name = name[:-len(DATABASE_SUFFIX)]
+    return os.path.join(outdir,name+'.csv')
+
+
+def discover_all_violations(directories,outdir=None,jobs=None,engine='scalar',shards=1,
+                            use_cache=True,incremental=False,memo_size=None,filters=None):
+    """
+    Searches several dataset directories for violations, in parallel.
+    
+    Each dataset is audited by audit_dataset in its own worker process, with at most
+    jobs processes at a time (as many as there are CPUs if jobs is None).  The results
+    are printed in the same order as directories, no matter which finishes first.  For
+    example
+    
+        KITH-2017: 93 violations found.
+        KITH-2018: 169 violations found.
+        KITH-2019: 223 violations found.
+    
+    If outdir is not None, the violations for each dataset are written to a CSV file
+    in outdir named after the dataset (see output_for).  A dataset that cannot be
+    audited is reported as such without stopping the others.
+    
+    Parameter directories: The directories of files to audit
+    Precondition: directories is a list of strings naming dataset directories
+    
+    Parameter outdir: The directory for the output files (OPTIONAL)
+    Precondition: outdir is None or a string naming a directory (it may not exist)
+    
+    Parameter jobs: The maximum number of worker processes (OPTIONAL)
+    Precondition: jobs is None or an int > 0
+    
+    Parameter engine: The engine for weather violations (OPTIONAL)
+    Precondition: engine is one of the strings in ENGINES
+    
+    Parameter shards: The number of worker processes for each dataset (OPTIONAL)
+    Precondition: shards is an int > 0
+    
+    Parameter use_cache: Whether to use the dataset cache (OPTIONAL)
+    Precondition: use_cache is a boolean
+    
+    Parameter incremental: Whether to continue from the last checkpoint (OPTIONAL)
+    Precondition: incremental is a boolean
+    
+    Parameter memo_size: The size of the memo of weather violations (OPTIONAL)
+    Precondition: memo_size is None (to keep the current size) or an int >= 0
+    
+    Parameter filters: The lessons to audit in a database (OPTIONAL)
+    Precondition: filters is None or a dictionary as in database.get_conditions
+    """
+    if outdir != None:
+        os.makedirs(outdir,exist_ok=True)
+    if jobs == None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs,len(directories))
+    
+    if jobs <= 1:
+        for directory in directories:
+            try:
+                output = output_for(directory,outdir)
+                message = summarize(audit_dataset(directory,output,engine,shards,use_cache,
+                                                  incremental,memo_size,filters))
+            except Exception as e:
+                message = 'could not be audited (%s)' % e
+            print(f"{directory}: {message}")
+        return
+    
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(audit_dataset,directory,output_for(directory,outdir),engine,
+                               shards,use_cache,incremental,memo_size,filters)
+                   for directory in directories]
+        for directory, future in zip(directories,futures):
+            try:
+                message = summarize(future.result())
+            except Exception as e:
+                message = 'could not be audited (%s)' % e
+            print(f"{directory}: {message}",flush=True)
+
+
+def parse_arguments(args):
+    """
+    Returns the tuple (positional, options) for the command line arguments.
+    
+    The value positional is the list of arguments that are not options.  The value
+    options is a dictionary with a value for every key of OPTIONS (the default value
+    if the option was not given), and for every flag in FLAGS (True if it was given,
+    False otherwise).  If the arguments are malformed (an unknown option, or an option
+    with no value), this function returns None.
+    
+    Parameter args: The command line arguments for the application (minus the application name)
+    Precondition: args is a list of strings
+    """
+    positional = []
+    options = dict(OPTIONS)
+    for flag in FLAGS:
+        options[flag] = False
+    pos = 0
+    while pos < len(args):
+        if args[pos] in FLAGS:
+            options[args[pos]] = True
+            pos += 1
+        elif args[pos].startswith('--'):
+            if not args[pos] in OPTIONS or pos+1 == len(args):
+                return None
+            options[args[pos]] = args[pos+1]
+            pos += 2
+        else:
+            positional.append(args[pos])
+            pos += 1
+    return (positional,options)
+
 
-def execute(*args):
+def execute(args):
     """
     Executes the application or prints an error message if executed incorrectly.
     
     The arguments to the application (EXCLUDING the application name) are provided to
-    the list args. This list should contain either 1 or 2 elements.  If there is one
-    element, it should be the name of the data set folder or the value '--test'.  
-    If there are two elements, the first should be the data set folder and the second
-    should be the name of a CSV file (for output of the results).
+    the list args. If this list is just the value '--test', it runs the tests.
+    Otherwise it should contain one or more data set folders, optionally followed
+    by the name of a CSV file (for output of the results) if there is exactly one
+    data set.  It may also contain the following options, each followed by a value:
+    
+        --out-dir DIR      write the results for each data set to DIR/dataset.csv
+        --jobs N           audit at most N data sets at a time (default: every CPU)
+        --shards N         split the lessons of each data set between N processes
+        --engine ENGINE    check weather with the 'scalar' or 'numpy' engine
+        --memo-size N      remember the last N weather violations checked (see memo.py;
+                           the memo is off by default, and 0 turns it off again)
+        --profile FILE     write the time and rows of each stage of the audit to the JSON
+                           file FILE (see profiling.py)
+        --profile-stacks FILE
+                           run the audit under cProfile and write its call stacks to FILE
+                           (in the collapsed-stack format of flamegraph tools)
+        --student ID       only audit the lessons of this student
+        --plane TAILNO     only audit the lessons in this plane
+        --instructor ID    only audit the lessons with this instructor
+        --from TIME        only audit the lessons that take off at or after TIME (a
+                           timestamp or a date, in the time zone of the daycycle)
+        --to TIME          only audit the lessons that take off before TIME
+    
+    and the following flags, which take no value:
+    
+        --no-cache         neither read nor write the cache of compiled reference files
+                           (otherwise every audit writes the cache to the directory
+                           .auditor-cache inside each data set, even an audit that then
+                           fails, so use this flag for data sets that must not change)
+        --clear-cache      delete the cache of each data set instead of auditing it (the
+                           checkpoint of --incremental is kept; it is reported instead)
+        --convert-weather  convert weather.json of each data set to weather.bin (see
+                           weatherstore.py) instead of auditing it
+        --incremental      only check the lessons added since the last incremental audit
+                           (see checkpoint.py)
+        --import           load each data set into the SQLite database DATASET.db (see
+                           database.py) instead of auditing it
+        --repairs          list the repairs of the --plane that overlap the span from
+                           --from to --to (or that are in progress at --from, if there is
+                           no --to) instead of auditing, and say whether the plane is in
+                           the shop at --from (see inspections.list_repairs)
+    
+    The last five options (the filters) require every data set to be a database made
+    by --import, such as KITH-2019.db.  Filters are combined, so
+    
+        python auditor KITH-2019.db --plane 684TM --from 2019-03-01 --to 2019-04-01
+    
+    lists the violations of the lessons in 684TM during March.  With --repairs, the
+    options --plane and --from are required, and the data sets are directories, so
     
-    If the user calls this script incorrectly (with the wrong number of arguments), this
-    function prints:
+        python auditor KITH-2019 --repairs --plane 684TM --from 2019-03-01 --to 2019-04-01
     
-        Usage: python auditor dataset [output.csv]
+    lists the repairs of 684TM during March.
     
-    This function does not do much error checking beyond counting the number of arguments.
+    A single data set is audited as in discover_violations.  Several data sets are
+    audited concurrently in a process pool (see discover_all_violations).  When profiling,
+    every data set is audited in this process (as if --jobs and --shards were 1), so
+    that all of the work is measured.
+    
+    If the user calls this script incorrectly, this function prints:
+    
+        Usage: python auditor dataset [dataset ...] [output.csv] [--out-dir DIR] [--jobs N] 
+               [--shards N] [--engine scalar|numpy] [--no-cache] [--clear-cache]
+               [--convert-weather] [--incremental] [--memo-size N] [--profile report.json]
+               [--profile-stacks FILE] [--import] [--student ID] [--plane TAILNO]
+               [--instructor ID] [--from TIME] [--to TIME] [--repairs]
+    
+    This function does not do much error checking beyond checking the form of the 
+    arguments.
     
     Parameter args: The command line arguments for the application (minus the application name)
     Precondition: args is a list of strings
     """
+    if args == ['--test']:
+        import tests
+        tests.test_all()
+        return
     
-    # Quit if wrong number of arguments
-    if len(args)!=1 and len(args)!= 2:
-        print('Usage: python auditor dataset [output.csv]')
+    parsed = parse_arguments(args)
+    if parsed == None or len(parsed[0]) == 0:
+        print(USAGE)
+        return
     
-    if len(args) == 1:
-        try:
-            if args[0] == '--test':  
-                tests.test_all()
-            else:
-                discover_violations(args[0], None)
-        except:
-            print('Usage: python auditor dataset [output.csv]')
-
-    if len(args) ==  2:
-        try:
-            if args[1] == None:
-                result = discover_violations(args[0],None)
-            elif '.csv' in args[1]:                
-                discover_violations(args[0],args[1])
-            else:
-                print('Usage: python auditor dataset [output.csv]')            
-        except:
-            print('Usage: python auditor dataset [output.csv]')
-
-
+    datasets, options = parsed
+    if options['--clear-cache']:
+        import cache
+        import checkpoint
+        for directory in datasets:
+            print(f"{directory}: {cache.clear(directory)} cache entries removed.")
+            if os.path.isfile(checkpoint.checkpoint_file(directory)):
+                print(f"{directory}: incremental checkpoint kept in {checkpoint.checkpoint_file(directory)}.")
+        return
+    if options['--convert-weather']:
+        import violations
+        import weatherstore
+        for directory in datasets:
+            source = os.path.join(directory,violations.WEATHER)
+            target = os.path.join(directory,violations.WEATHER_STORE)
+            print(f"{directory}: {weatherstore.convert_weather(source,target)} weather records written.")
+        return
+    if options['--repairs']:
+        import inspections
+        tail = options['--plane']
+        if tail == None or options['--from'] == None:
+            print(USAGE)
+            return
+        for directory in datasets:
+            try:
+                grounded, repairs = inspections.list_repairs(directory,tail,options['--from'],
+                                                             options['--to'])
+            except:
+                print(USAGE)
+                return
+            status = 'is' if grounded else 'is not'
+            print(f"{directory}: {tail} {status} in the shop at {options['--from']}.")
+            for row in repairs:
+                print('    '+', '.join(row))
+        return
+    if options['--import']:
+        import database
+        for directory in datasets:
+            target = os.path.normpath(directory)+DATABASE_SUFFIX
+            count = database.import_dataset(directory,target)
+            print(f"{directory}: {count} lessons imported into {target}.")
+        return
+    
+    output = None
+    if datasets[-1].lower().endswith('.csv'):
+        output = datasets.pop()
+    
+    try:
+        jobs = None if options['--jobs'] == None else int(options['--jobs'])
+        assert jobs == None or jobs > 0
+        shards = int(options['--shards'])
+        assert shards > 0
+        assert options['--engine'] in ENGINES
+        assert len(datasets) > 0
+        assert output == None or (len(datasets) == 1 and options['--out-dir'] == None)
+        use_cache = not options['--no-cache']
+        incremental = options['--incremental']
+        memo_size = None if options['--memo-size'] == None else int(options['--memo-size'])
+        assert memo_size == None or memo_size >= 0
+        filters = {option[2:]: options[option] for option in FILTERS}
+        if all(value == None for value in filters.values()):
+            filters = None
+        assert filters == None or all(is_database(directory) for directory in datasets)
+    except:
+        print(USAGE)
+        return
+    
+    report = options['--profile']
+    stacks = options['--profile-stacks']
+    if report != None or stacks != None:
+        jobs = 1
+        shards = 1
+    
+    def audit():
+        if len(datasets) == 1 and options['--out-dir'] == None:
+            try:
+                discover_violations(datasets[0],output,options['--engine'],shards,use_cache,
+                                    incremental,memo_size,filters)
+            except:
+                print(USAGE)
+            return
+        discover_all_violations(datasets,options['--out-dir'],jobs,options['--engine'],shards,
+                                use_cache,incremental,memo_size,filters)
+    
+    if report == None and stacks == None:
+        audit()
+    else:
+        import profiling
+        profiling.run_profiled(audit,report,stacks,datasets)
@@ -0,0 +1,375 @@
+"""
+Module providing an on-disk cache of compiled dataset files.
+
+Most of the time of an audit goes into reading and compiling the reference files
+(weather.json in particular).  These files rarely change between runs, so this module
+saves the compiled forms (a WeatherIndex, a DaycycleTable, and so on) in a directory
+named .auditor-cache inside the dataset directory.  A later run loads them in
+milliseconds instead of parsing the files again.
+
+The cache is part of the dataset folder, so anyone who ships or edits the dataset can
+write it.  For that reason an entry is only data: the state of the compiled object (see
+encode), as JSON followed by the raw bytes of its arrays.  It is never unpickled, and
+loading it runs no code beyond rebuilding an object of the class the caller expects.
+
+Each cache entry records a fingerprint of every file it was compiled from: the size,
+the modification time, and a SHA-256 hash of the contents.  An entry is only used if
+every file still has the same size and the same contents.  If the size and modification
+time are unchanged, the contents are assumed to be unchanged as well (so a warm load
+does not need to hash anything).  If only the modification time has changed, the file
+is hashed to decide.
+
+Cache entries are written to a temporary file and renamed into place, so concurrent
+audits of the same dataset never see a partial entry.  A damaged or out-of-date entry
+is simply ignored and rebuilt.  The SHA-256 hash stored with each entry only detects
+damage; anyone who can change an entry can change its hash too.
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import os
+import os.path
+import json
+import array
+import hashlib
+
+
+# The name of the cache directory (inside the dataset directory)
+CACHE_DIR = '.auditor-cache'
+# The version of the cached data; changing it invalidates all existing entries
+CACHE_VERSION = 3
+# The suffix of the file with the data of a cache entry (its metadata is in a .json file)
+DATA_SUFFIX = '.data'
+# The suffixes of the data files of earlier cache versions (removed by clear)
+OLD_SUFFIXES = ('.pickle',)
+# The key of the JSON object that stands for an array in an encoded state (see encode)
+ARRAY_KEY = '__array__'
+
+
+def cache_dir(directory):
+    """
+    Returns the path of the cache directory for the dataset directory.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string
+    """
+    return os.path.join(directory,CACHE_DIR)
+
+
+def file_hash(filename):
+    """
+    Returns the SHA-256 hash of the contents of filename, as a hex string.
+    
+    Parameter filename: The file to hash
+    Precondition: filename is a string naming a file that exists
+    """
+    digest = hashlib.sha256()
+    with open(filename,'rb') as file:
+        for block in iter(lambda: file.read(1 << 20),b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(filename, previous=None):
+    """
+    Returns the fingerprint of filename, as a dictionary.
+    
+    The fingerprint has the keys 'size', 'mtime' (in nanoseconds), and 'sha256'.  If
+    previous is a fingerprint with the same size and modification time, its hash is
+    reused instead of reading the file again.
+    
+    Parameter filename: The file to fingerprint
+    Precondition: filename is a string naming a file that exists
+    
+    Parameter previous: An earlier fingerprint of this file (OPTIONAL)
+    Precondition: previous is None or a dictionary returned by fingerprint
+    """
+    info = os.stat(filename)
+    if (previous != None and previous.get('size') == info.st_size and
+        previous.get('mtime') == info.st_mtime_ns):
+        return previous
+    return {'size': info.st_size, 'mtime': info.st_mtime_ns, 'sha256': file_hash(filename)}
+
+
+def current_fingerprints(directory, sources, fingerprints):
+    """
+    Returns the fingerprints of the source files if they match the recorded ones.
+    
+    A file matches if it has the same size and the same contents (see fingerprint).
+    If any file does not match, this function returns None.  Otherwise it returns the
+    new fingerprints, which differ from the recorded ones only if a file was touched
+    without changing its contents.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory
+    
+    Parameter sources: The names of the source files in directory
+    Precondition: sources is a list of strings
+    
+    Parameter fingerprints: The recorded fingerprints, by source file name
+    Precondition: fingerprints is a dictionary
+    """
+    result = {}
+    for name in sources:
+        previous = fingerprints.get(name)
+        if previous == None:
+            return None
+        filename = os.path.join(directory,name)
+        if os.stat(filename).st_size != previous['size']:
+            return None
+        result[name] = fingerprint(filename,previous)
+        if result[name]['sha256'] != previous['sha256']:
+            return None
+    return result
+
+
+def encode(state):
+    """
+    Returns the bytes of a data-only state.
+    
+    The state may contain dictionaries with string keys, lists, strings, numbers,
+    booleans, None, and array.array objects.  The result is one line of JSON followed by
+    the bytes of the arrays.  In the JSON, each array is replaced by the object
+    {ARRAY_KEY: [typecode, start, end]}, where start and end are the positions of its
+    bytes after the line break.  Tuples are stored as lists.
+    
+    Parameter state: The state to encode
+    Precondition: state is a data-only value, as described above
+    """
+    blobs = []
+    size = [0]
+    
+    def replace(value):
+        if isinstance(value,array.array):
+            data = value.tobytes()
+            blobs.append(data)
+            size[0] += len(data)
+            return {ARRAY_KEY: [value.typecode,size[0]-len(data),size[0]]}
+        if isinstance(value,dict):
+            return {key: replace(value[key]) for key in value}
+        if isinstance(value,(list,tuple)):
+            return [replace(item) for item in value]
+        return value
+    
+    text = json.dumps(replace(state),separators=(',',':'))
+    return b''.join([text.encode(),b'\n']+blobs)
+
+
+def decode(data):
+    """
+    Returns the state encoded in the bytes data (see encode).
+    
+    Parameter data: The encoded state
+    Precondition: data is a bytes object returned by encode
+    """
+    text, newline, blobs = data.partition(b'\n')
+    blobs = memoryview(blobs)
+    
+    def restore(value):
+        if len(value) == 1 and ARRAY_KEY in value:
+            typecode, start, end = value[ARRAY_KEY]
+            result = array.array(typecode)
+            result.frombytes(blobs[start:end])
+            return result
+        return value
+    
+    return json.loads(text,object_hook=restore)
+
+
+def get_state(value):
+    """
+    Returns the data-only state of value (see encode).
+    
+    The state is value.__getstate__() if its class defines that method (as a WeatherIndex
+    does), and the attributes of value otherwise.
+    
+    Parameter value: The value to cache
+    Precondition: value has a data-only state
+    """
+    if '__getstate__' in vars(type(value)):
+        return value.__getstate__()
+    return vars(value)
+
+
+def make_value(kind, state):
+    """
+    Returns a new object of the class kind with the given state.
+    
+    This reverses get_state.  The object is made without calling kind.__init__.
+    
+    Parameter kind: The class of the value
+    Precondition: kind is a class whose objects have a data-only state
+    
+    Parameter state: The state of the value
+    Precondition: state is a dictionary returned by get_state for an object of kind
+    """
+    value = kind.__new__(kind)
+    if '__setstate__' in vars(kind):
+        value.__setstate__(state)
+    else:
+        vars(value).update(state)
+    return value
+
+
+def load(directory, name, sources, kind):
+    """
+    Returns the cached value name for the dataset directory, or None if not current.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory
+    
+    Parameter name: The name of the cache entry
+    Precondition: name is a string that is a valid file name
+    
+    Parameter sources: The names of the files the value was compiled from
+    Precondition: sources is a list of strings naming files in directory
+    
+    Parameter kind: The class of the value
+    Precondition: kind is a class whose objects have a data-only state (see get_state)
+    """
+    path = os.path.join(cache_dir(directory),name)
+    try:
+        with open(path+'.json') as file:
+            meta = json.load(file)
+        if (meta.get('version') != CACHE_VERSION or meta.get('sources') != sources or
+            meta.get('kind') != kind.__name__):
+            return None
+        fingerprints = current_fingerprints(directory,sources,meta['fingerprints'])
+        if fingerprints == None:
+            return None
+        with open(path+DATA_SUFFIX,'rb') as file:
+            data = file.read()
+        if meta.get('sha256') != hashlib.sha256(data).hexdigest():
+            return None
+        value = make_value(kind,decode(data))
+        
+        # Remember touched files, so that they are not hashed again next time
+        if fingerprints != meta['fingerprints']:
+            meta['fingerprints'] = fingerprints
+            write_atomic(path+'.json',json.dumps(meta).encode())
+    except Exception:
+        return None
+    return value
+
+
+def save(directory, name, sources, value):
+    """
+    Saves value as the cache entry name for the dataset directory.
+    
+    Failing to write the cache (for example, a read-only dataset) is not an error; the
+    value is just not cached.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory
+    
+    Parameter name: The name of the cache entry
+    Precondition: name is a string that is a valid file name
+    
+    Parameter sources: The names of the files the value was compiled from
+    Precondition: sources is a list of strings naming files in directory
+    
+    Parameter value: The value to cache
+    Precondition: value has a data-only state (see get_state)
+    """
+    path = os.path.join(cache_dir(directory),name)
+    try:
+        os.makedirs(cache_dir(directory),exist_ok=True)
+        fingerprints = {}
+        for source in sources:
+            fingerprints[source] = fingerprint(os.path.join(directory,source))
+        data = encode(get_state(value))
+        meta = {'version': CACHE_VERSION, 'kind': type(value).__name__, 'sources': sources,
+                'fingerprints': fingerprints, 'sha256': hashlib.sha256(data).hexdigest()}
+
+        write_atomic(path+DATA_SUFFIX,data)
+        write_atomic(path+'.json',json.dumps(meta).encode())
+    except OSError:
+        pass
+
+
+def write_atomic(filename, data):
+    """
+    Writes data to filename, so that readers see either the old or the new contents.
+    
+    The data is written to a temporary file first, which is then renamed into place.
+    
+    Parameter filename: The file to write
+    Precondition: filename is a string that is a valid file name
+    
+    Parameter data: The contents of the file
+    Precondition: data is a bytes object
+    """
+    temp = '%s.%d.tmp' % (filename,os.getpid())
+    with open(temp,'wb') as file:
+        file.write(data)
+    os.replace(temp,filename)
+
+
+def cached(directory, name, sources, kind, build, enabled=True):
+    """
+    Returns the cached value name for the dataset directory, building it if necessary.
+    
+    If there is a current cache entry, it is loaded.  Otherwise this function calls
+    build() to compile the value from the source files, and caches the result.  If
+    enabled is False, the cache is ignored entirely (neither read nor written).
+    
+    A loaded value is always an object of the class kind, with the state that was saved
+    (see get_state).  An object of a subclass of kind is loaded as an object of kind.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory
+    
+    Parameter name: The name of the cache entry
+    Precondition: name is a string that is a valid file name
+    
+    Parameter sources: The names of the files the value is compiled from
+    Precondition: sources is a list of strings naming files in directory
+    
+    Parameter kind: The class of the value
+    Precondition: kind is a class whose objects have a data-only state (see get_state)
+    
+    Parameter build: The function to compile the value
+    Precondition: build is a function with no arguments
+    
+    Parameter enabled: Whether to use the cache (OPTIONAL)
+    Precondition: enabled is a boolean
+    """
+    if not enabled:
+        return build()
+    value = load(directory,name,sources,kind)
+    if value == None:
+        value = build()
+        save(directory,name,sources,value)
+    return value
+
+
+def clear(directory):
+    """
+    Removes every cache entry for the dataset directory, returning the number removed.
+    
+    Only the cache entries (their data and metadata files, including entries of earlier
+    cache versions) and temporary files left behind by an interrupted write_atomic are
+    removed.  Any other file in the cache
+    directory, such as the checkpoint of an incremental audit (see checkpoint.py), is
+    kept; the cache directory itself is removed only if that leaves it empty.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string
+    """
+    path = cache_dir(directory)
+    if not os.path.isdir(path):
+        return 0
+    stems = set()
+    for name in os.listdir(path):
+        stem, suffix = os.path.splitext(name)
+        if suffix == DATA_SUFFIX or suffix in OLD_SUFFIXES:
+            os.remove(os.path.join(path,name))
+            stems.add(stem)
+        elif suffix == '.tmp':
+            os.remove(os.path.join(path,name))
+    for stem in stems:
+        if os.path.isfile(os.path.join(path,stem+'.json')):
+            os.remove(os.path.join(path,stem+'.json'))
+    if len(os.listdir(path)) == 0:
+        os.rmdir(path)
+    return len(stems)
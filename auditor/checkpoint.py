@@ -0,0 +1,387 @@
+"""
+Module providing incremental audits of a lessons file that only grows by appending.
+
+New lessons are appended to lessons.csv as they are flown, so most of the file has
+already been audited by the previous run.  An incremental audit saves a checkpoint in
+the cache directory of the dataset (see cache.py) with everything needed to continue:
+
+    offset:      the number of bytes of lessons.csv already audited
+    rows:        the number of lessons already audited
+    digest:      the SHA-256 hash of those bytes
+    newline:     whether those bytes end with a line break
+    references:  the fingerprints of the reference files (see cache.fingerprint)
+    violations:  the weather, endorsement, and inspection violations found so far (as
+                 CSV text, see append_rows)
+    planes:      the running state of every plane in the inspection sweep (see
+                 inspections.sweep_inspections)
+
+The next run only reads and checks the lessons after offset, and appends the new
+violations to those in the checkpoint.  The weather and endorsement checks look at one
+lesson at a time, so they need no other state.
+
+The audit falls back to a full audit (and a new checkpoint) whenever the saved work may
+be wrong: an audited row was changed (the hash differs), a reference file such as
+students.csv or minimums.csv was changed, the last audited row had no line break (so
+it may have been extended), or a new lesson takes off before the last audited lesson
+of the same plane (so the inspection sweep would have to go back in time).  In every
+case the violations are exactly those of a full audit, in the same order.
+
+Like the cache entries, the checkpoint is only data (a JSON file), as anyone who can
+write the dataset folder can write it too.
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import os
+import os.path
+import io
+import csv
+import json
+import hashlib
+import cache
+import utils
+import records
+import violations
+import endorsements
+import inspections
+
+
+# The name of the checkpoint file (inside the cache directory)
+CHECKPOINT = 'checkpoint.json'
+# The version of the checkpoint data; changing it invalidates all existing checkpoints
+CHECKPOINT_VERSION = 2
+# The reference files; changing any of them forces a full audit
+REFERENCES = [violations.DAYCYCLE, violations.WEATHER, violations.MINIMUMS, violations.STUDENTS,
+              endorsements.TEACHERS, inspections.PLANES, inspections.REPAIRS]
+# The kinds of violations, in the order they are reported
+KINDS = ('weather','endorsements','inspections')
+
+
+def checkpoint_file(directory):
+    """
+    Returns the path of the checkpoint file for the dataset directory.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string
+    """
+    return os.path.join(cache.cache_dir(directory),CHECKPOINT)
+
+
+def scan_lessons(filename, offset):
+    """
+    Returns the tuple (digest, hasher, data) for the lessons file.
+    
+    The value digest is the SHA-256 hash (as a hex string) of the first offset bytes of
+    the file, and data is the bytes after them.  The value hasher is a hashlib object
+    that has seen the whole file, so the digest of the next checkpoint is not computed
+    by reading the file again.
+    
+    Parameter filename: The lessons file
+    Precondition: filename is a string naming a file with at least offset bytes
+    
+    Parameter offset: The number of bytes already audited
+    Precondition: offset is an int >= 0
+    """
+    hasher = hashlib.sha256()
+    with open(filename,'rb') as file:
+        left = offset
+        while left > 0:
+            block = file.read(min(left,1 << 20))
+            if block == b'':
+                break
+            hasher.update(block)
+            left -= len(block)
+        digest = hasher.hexdigest()
+        data = file.read()
+    hasher.update(data)
+    return (digest,hasher,data)
+
+
+def encode_planes(planes):
+    """
+    Returns the plane states as a dictionary of lists (for the checkpoint file).
+    
+    Each plane state becomes the list of its attributes, in the order of
+    inspections.PlaneState.__slots__.
+    
+    Parameter planes: The plane states
+    Precondition: planes is a dictionary of inspections.PlaneState, or None
+    """
+    if planes == None:
+        return None
+    fields = inspections.PlaneState.__slots__
+    return {id: [getattr(planes[id],field) for field in fields] for id in planes}
+
+
+def decode_planes(planes):
+    """
+    Returns the plane states encoded by encode_planes.
+    
+    Parameter planes: The encoded plane states
+    Precondition: planes is a dictionary returned by encode_planes, or None
+    """
+    if planes == None:
+        return None
+    fields = inspections.PlaneState.__slots__
+    result = {}
+    for id in planes:
+        if len(planes[id]) != len(fields):
+            raise ValueError('Plane state %s has %d fields' % (repr(id),len(planes[id])))
+        state = inspections.PlaneState()
+        for pos in range(len(fields)):
+            setattr(state,fields[pos],planes[id][pos])
+        result[id] = state
+    return result
+
+
+def load_checkpoint(directory):
+    """
+    Returns the checkpoint for the dataset directory, or None if it cannot be continued.
+    
+    A checkpoint can be continued if it has the current version and every reference file
+    has the same contents as when it was saved.  The audited rows are checked separately
+    by continue_audit.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory
+    """
+    try:
+        with open(checkpoint_file(directory)) as file:
+            state = json.load(file)
+        if state.get('version') != CHECKPOINT_VERSION:
+            return None
+        if cache.current_fingerprints(directory,REFERENCES,state['references']) == None:
+            return None
+        state['planes'] = decode_planes(state['planes'])
+    except Exception:
+        return None
+    return state
+
+
+def save_checkpoint(directory, state):
+    """
+    Saves the checkpoint state for the dataset directory.
+    
+    Failing to write the checkpoint (for example, a read-only dataset) is not an error;
+    the next run is just a full audit.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory
+    
+    Parameter state: The checkpoint
+    Precondition: state is a dictionary returned by start_checkpoint
+    """
+    try:
+        os.makedirs(cache.cache_dir(directory),exist_ok=True)
+        data = dict(state)
+        data['planes'] = encode_planes(state['planes'])
+        cache.write_atomic(checkpoint_file(directory),json.dumps(data).encode())
+    except OSError:
+        pass
+
+
+def start_checkpoint(directory):
+    """
+    Returns a new checkpoint for the dataset directory, before any lessons are audited.
+    
+    The offset of the new checkpoint is just past the header of lessons.csv.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is the name of a directory containing the dataset files
+    (see app.discover_violations)
+    """
+    fingerprints = {}
+    for name in REFERENCES:
+        fingerprints[name] = cache.fingerprint(os.path.join(directory,name))
+    with open(os.path.join(directory,violations.LESSONS),'rb') as file:
+        header = file.readline()
+
+    state = {'version': CHECKPOINT_VERSION, 'references': fingerprints, 'offset': len(header),
+             'rows': 0, 'digest': hashlib.sha256(header).hexdigest(),
+             'newline': header.endswith(b'\n'), 'planes': None}
+    for kind in KINDS:
+        state[kind] = ''
+    return state
+
+
+def continue_audit(state, digest, data):
+    """
+    Returns True if the audited bytes of the lessons file are unchanged since state.
+    
+    The audited bytes must have the digest of the checkpoint.  If there are new bytes,
+    the audited bytes must also end with a line break (so the last audited row was not
+    extended).
+    
+    Parameter state: The checkpoint
+    Precondition: state is a dictionary returned by load_checkpoint
+    
+    Parameter digest: The SHA-256 hash of the audited bytes (see scan_lessons)
+    Precondition: digest is a string
+    
+    Parameter data: The bytes after the audited bytes
+    Precondition: data is a bytes object
+    """
+    if digest != state['digest']:
+        return False
+    return data == b'' or state['newline']
+
+
+def in_order(state, lessons):
+    """
+    Returns True if no new lesson takes off before the last audited lesson of its plane.
+    
+    Otherwise the inspection sweep cannot be continued (see inspections.sweep_inspections).
+    
+    Parameter state: The checkpoint
+    Precondition: state is a dictionary returned by load_checkpoint
+    
+    Parameter lessons: The new lessons
+    Precondition: lessons is a list of records.Lesson
+    """
+    if state['planes'] == None:
+        return True
+    for lesson in lessons:
+        plane = state['planes'].get(lesson.plane)
+        if (lesson.takeoff != None and plane != None and plane.swept != None and
+            lesson.takeoff < plane.swept):
+            return False
+    return True
+
+
+def read_rows(data):
+    """
+    Returns the rows of lessons.csv in the bytes data (a list of lists of strings).
+    
+    Parameter data: The new part of the lessons file
+    Precondition: data is a bytes object starting on a line boundary
+    """
+    return list(csv.reader(io.TextIOWrapper(io.BytesIO(data))))
+
+
+def append_rows(text, rows):
+    """
+    Returns the CSV text with the rows added to the end.
+    
+    The violations in a checkpoint are kept as CSV text, one string for each kind.  A
+    string is saved (and loaded) far faster than the same rows as lists of strings.
+    
+    Parameter text: The CSV text
+    Precondition: text is a string of complete CSV lines
+    
+    Parameter rows: The rows to add
+    Precondition: rows is a list of lists of strings
+    """
+    if not rows:
+        return text
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return text+buffer.getvalue()
+
+
+def iter_violations(state):
+    """
+    Generates the violations in the checkpoint state, in the order of KINDS.
+    
+    Parameter state: The checkpoint
+    Precondition: state is a dictionary returned by start_checkpoint
+    """
+    for kind in KINDS:
+        for row in csv.reader(io.StringIO(state[kind])):
+            yield row
+
+
+def audit_incremental(directory, use_cache=True):
+    """
+    Returns a generator of the (annotated) violations in the dataset directory.
+    
+    The violations are the same, and in the same order, as those of app.audit_dataset:
+    the weather violations, then the endorsement violations, then the inspection
+    violations.  Only the lessons appended since the last checkpoint are checked (if the
+    checkpoint can be continued), and a new checkpoint is saved before this function
+    returns.
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the dataset files
+    (see app.discover_violations)
+    
+    Parameter use_cache: Whether to use the cache of compiled reference files (OPTIONAL)
+    Precondition: use_cache is a boolean
+    """
+    filename = os.path.join(directory,violations.LESSONS)
+    state = load_checkpoint(directory)
+    if state != None:
+        digest, hasher, data = scan_lessons(filename,state['offset'])
+        if not continue_audit(state,digest,data):
+            state = None
+        elif data == b'':
+            return iter_violations(state)
+        else:
+            rows = read_rows(data)
+            lessons = [records.Lesson(row) for row in rows]
+            if not in_order(state,lessons):
+                state = None
+    
+    if state == None:
+        state = start_checkpoint(directory)
+        digest, hasher, data = scan_lessons(filename,state['offset'])
+        rows = read_rows(data)
+        lessons = [records.Lesson(row) for row in rows]
+    
+    advance_checkpoint(directory,state,rows,lessons,use_cache)
+    if data != b'':
+        state['newline'] = data.endswith(b'\n')
+    state['offset'] += len(data)
+    state['digest'] = hasher.hexdigest()
+    save_checkpoint(directory,state)
+    return iter_violations(state)
+
+
+def advance_checkpoint(directory, state, rows, lessons, use_cache=True):
+    """
+    Audits the new lessons, adding their violations and plane states to the checkpoint.
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the dataset files
+    
+    Parameter state: The checkpoint
+    Precondition: state is a dictionary that can be continued with these lessons
+    
+    Parameter rows: The new rows of lessons.csv
+    Precondition: rows is a list of 7-element lists of strings
+    
+    Parameter lessons: The records for rows
+    Precondition: lessons is a list of records.Lesson, the same length as rows
+    
+    Parameter use_cache: Whether to use the cache of compiled reference files (OPTIONAL)
+    Precondition: use_cache is a boolean
+    """
+    state['rows'] += len(rows)
+    if not rows:
+        return
+    
+    weather = violations.load_weather_references(directory,use_cache=use_cache)
+    credentials = endorsements.load_endorsement_references(directory,use_cache)
+    found = {'weather': [], 'endorsements': [], 'inspections': []}
+    checked = violations.check_batch(lessons,weather)
+    for pos in range(len(rows)):
+        if checked[pos] != '':
+            found['weather'].append(rows[pos]+[checked[pos]])
+        violation = endorsements.check_lesson(lessons[pos],credentials)
+        if violation != '':
+            found['endorsements'].append(rows[pos]+[violation])
+    
+    daycycle = utils.read_json(os.path.join(directory,inspections.DAYCYCLE))
+    planes = records.read_registry(os.path.join(directory,inspections.PLANES),records.Plane)
+    repairs = records.read_records(os.path.join(directory,inspections.REPAIRS),records.Repair)
+    if state['planes'] == None:
+        state['planes'] = {}
+        for id in planes.rows:
+            state['planes'][id] = inspections.PlaneState(planes.rows[id])
+    
+    swept = inspections.sweep_inspections(lessons,repairs,planes,daycycle['timezone'],
+                                          state['planes'])
+    for pos, problems in swept:
+        found['inspections'].append(rows[pos]+[inspections.get_label(problems)])
+    
+    for kind in KINDS:
+        state[kind] = append_rows(state[kind],found[kind])
@@ -0,0 +1,518 @@
+"""
+Module providing a SQLite database of a dataset, so that audits can be limited to a
+few students, planes, instructors, or dates.
+
+An audit of a dataset directory reads every file, even to answer a question like "what
+are the violations of student S01716?"  The function import_dataset loads a dataset
+directory ONCE into a SQLite database with the following tables:
+
+    lessons:      one row per lesson, in the order of lessons.csv (the column id); the
+                  takeoff and landing are ints (seconds since the epoch) with their UTC
+                  offsets, so the lessons can be searched by time
+    weather:      one row per weather observation, already normalized into the numbers
+                  compared against the minimums (see weather.Observation)
+    daycycle:     the sunrise and sunset of every day
+    settings:     the other entries of daycycle.json (such as the time zone), and the
+                  version of the database
+    headers:      the header of each CSV file
+    students, instructors, planes, repairs, minimums:
+                  the rows of the other CSV files, column for column
+
+The lessons are indexed by student, plane, instructor, and takeoff.  An audit of the
+database (see iter_violations) can be given filters, and then it only reads the
+lessons that match them through those indexes.  The weather of each takeoff is one
+lookup by primary key.  The result is exactly the violations of those lessons in a full
+audit of the dataset, in the same order.  That is true for the inspection violations as
+well, which depend on every earlier flight of the plane.  The inspection sweep reads the
+earlier lessons of just the planes that were flown in the matching lessons (see
+iter_inspection_violations).
+
+A lesson with a timestamp that is not in the standard form (see records.Lesson) keeps
+the text of its takeoff and landing as well, so that the violations have the original
+row.  A database does not change when the dataset does; import it again to update it.
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import os
+import os.path
+import json
+import sqlite3
+import utils
+import records
+import pilots
+import weather as wx
+import violations
+import endorsements
+import inspections
+
+
+# The version of the database layout; a database of any other version must be imported again
+SCHEMA_VERSION = 1
+
+# The tables and indexes for the lessons, weather, and daycycle
+SCHEMA = """
+CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE headers (name TEXT PRIMARY KEY, header TEXT NOT NULL);
+CREATE TABLE lessons (id INTEGER PRIMARY KEY, student TEXT NOT NULL, plane TEXT NOT NULL,
+                      instructor TEXT NOT NULL, takeoff INTEGER, takeoff_offset INTEGER,
+                      landing INTEGER, landing_offset INTEGER, filed TEXT NOT NULL,
+                      area TEXT NOT NULL, takeoff_text TEXT, landing_text TEXT);
+CREATE TABLE weather (time INTEGER PRIMARY KEY, visibility REAL NOT NULL, wind REAL NOT NULL,
+                      crosswind REAL NOT NULL, ceiling REAL NOT NULL, flags INTEGER NOT NULL);
+CREATE TABLE daycycle (day TEXT PRIMARY KEY, sunrise TEXT, sunset TEXT);
+"""
+
+# The indexes of the lessons, created after the lessons are loaded
+INDEXES = """
+CREATE INDEX lessons_student ON lessons (student);
+CREATE INDEX lessons_plane ON lessons (plane);
+CREATE INDEX lessons_instructor ON lessons (instructor);
+CREATE INDEX lessons_takeoff ON lessons (takeoff);
+"""
+
+# The other CSV files as (table, file, columns); every column is TEXT, as in the file
+TABLES = [('students',violations.STUDENTS,('id','last','first','joined','solo','license',
+                                           'hours50','instrument','advanced','multiengine')),
+          ('instructors',endorsements.TEACHERS,('id','last','first','cfi','cfii','mei')),
+          ('planes',inspections.PLANES,('id','type','capability','advanced','multiengine',
+                                        'annual','hours')),
+          ('repairs',inspections.REPAIRS,('plane','indate','outdate','description')),
+          ('minimums',violations.MINIMUMS,('category','conditions','area','time','ceiling',
+                                           'visibility','wind','crosswind'))]
+
+# The columns of a lesson, in the order read by make_lesson
+LESSON_COLUMNS = ('id, student, plane, instructor, takeoff, takeoff_offset, landing, '+
+                  'landing_offset, filed, area, takeoff_text, landing_text')
+
+# The filters of an audit as (name, condition); from and to are takeoff times
+FILTERS = (('student','student = ?'),('plane','plane = ?'),('instructor','instructor = ?'),
+           ('from','takeoff >= ?'),('to','takeoff < ?'))
+
+
+def import_dataset(directory, filename):
+    """
+    Creates the database filename for the dataset directory, returning the number of lessons.
+
+    If filename already exists, it is replaced.  The new database is written to a
+    temporary file first, so a failed import leaves the old database in place.
+
+    Parameter directory: The dataset directory
+    Precondition: directory is the name of a directory containing the dataset files
+    (see app.discover_violations)
+
+    Parameter filename: The database file
+    Precondition: filename is a string that is a valid file name
+    """
+    temporary = filename+'.tmp'
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    connection = sqlite3.connect(temporary)
+    try:
+        connection.executescript(SCHEMA)
+        for table, name, columns in TABLES:
+            connection.execute('CREATE TABLE %s (pos INTEGER PRIMARY KEY, %s)' %
+                               (table,', '.join(column+' TEXT' for column in columns)))
+        with connection:
+            count = import_lessons(connection,os.path.join(directory,violations.LESSONS))
+            import_weather(connection,os.path.join(directory,violations.WEATHER))
+            import_daycycle(connection,os.path.join(directory,violations.DAYCYCLE))
+            for table, name, columns in TABLES:
+                import_table(connection,table,columns,os.path.join(directory,name),name)
+            connection.execute('INSERT INTO settings VALUES (?, ?)',
+                               ('schema',json.dumps(SCHEMA_VERSION)))
+        connection.executescript(INDEXES)
+        connection.execute('ANALYZE')
+    finally:
+        connection.close()
+    os.replace(temporary,filename)
+    return count
+
+
+def import_lessons(connection, filename):
+    """
+    Loads the lessons file filename into the lessons table, returning the number of lessons.
+
+    Parameter connection: The new database
+    Precondition: connection is an sqlite3 connection with the tables of SCHEMA
+
+    Parameter filename: The lessons file
+    Precondition: filename is a string naming a CSV file of 7-element rows with a header
+    """
+    rows = utils.iter_csv(filename)
+    header = next(rows,[])
+    connection.execute('INSERT INTO headers VALUES (?, ?)',(violations.LESSONS,json.dumps(header)))
+
+    def values():
+        for row in rows:
+            lesson = records.Lesson(row)
+            texts = (None,None) if lesson.to_row()[3:5] == row[3:5] else (row[3],row[4])
+            yield (lesson.student,lesson.plane,lesson.instructor,lesson.takeoff,lesson.offset,
+                   lesson.landing,lesson.landing_offset,lesson.filed,lesson.area)+texts
+
+    cursor = connection.executemany('INSERT INTO lessons (student, plane, instructor, takeoff, '+
+                                    'takeoff_offset, landing, landing_offset, filed, area, '+
+                                    'takeoff_text, landing_text) VALUES (?,?,?,?,?,?,?,?,?,?,?)',
+                                    values())
+    return cursor.rowcount
+
+
+def import_weather(connection, filename):
+    """
+    Loads the normalized observations of the weather file filename into the weather table.
+
+    If two reports are for the same time, the one that a WeatherIndex would use is kept.
+
+    Parameter connection: The new database
+    Precondition: connection is an sqlite3 connection with the tables of SCHEMA
+
+    Parameter filename: The weather file
+    Precondition: filename is a string naming a weather JSON file
+    """
+    index = wx.WeatherIndex(utils.read_json(filename),reports=False)
+    connection.executemany('INSERT OR REPLACE INTO weather VALUES (?, ?, ?, ?, ?, ?)',
+                           ((ob.time,ob.visibility,ob.wind,ob.crosswind,ob.ceiling,ob.flags)
+                            for ob in index.observations))
+
+
+def import_daycycle(connection, filename):
+    """
+    Loads the daycycle file filename into the daycycle and settings tables.
+
+    Each year of the file becomes one row per day.  Every other entry (such as the time
+    zone) is a setting, saved as JSON.
+
+    Parameter connection: The new database
+    Precondition: connection is an sqlite3 connection with the tables of SCHEMA
+
+    Parameter filename: The daycycle file
+    Precondition: filename is a string naming a daycycle JSON file
+    """
+    daycycle = utils.read_json(filename)
+    for key in daycycle:
+        if key.isdecimal() and type(daycycle[key]) == dict:
+            for md in daycycle[key]:
+                entry = daycycle[key][md]
+                if type(entry) == dict:
+                    connection.execute('INSERT OR REPLACE INTO daycycle VALUES (?, ?, ?)',
+                                       (key+'-'+md,entry.get('sunrise'),entry.get('sunset')))
+        else:
+            connection.execute('INSERT INTO settings VALUES (?, ?)',(key,json.dumps(daycycle[key])))
+
+
+def import_table(connection, table, columns, filename, name):
+    """
+    Loads the CSV file filename into the given table, with its header in the headers table.
+
+    Parameter connection: The new database
+    Precondition: connection is an sqlite3 connection with the tables of SCHEMA and TABLES
+
+    Parameter table: The table
+    Precondition: table is a string naming a table in TABLES
+
+    Parameter columns: The columns of the table
+    Precondition: columns is the tuple of columns for table in TABLES
+
+    Parameter filename: The CSV file
+    Precondition: filename is a string naming a CSV file with a header
+
+    Parameter name: The name of the file
+    Precondition: name is a string
+    """
+    rows = utils.read_csv(filename)
+    connection.execute('INSERT INTO headers VALUES (?, ?)',(name,json.dumps(rows[0] if rows else [])))
+    size = len(columns)
+    connection.executemany('INSERT INTO %s (%s) VALUES (%s)' % (table,', '.join(columns),
+                                                                ', '.join('?'*size)),
+                           ((row+['']*size)[:size] for row in rows[1:]))
+
+
+def open_database(filename):
+    """
+    Returns an sqlite3 connection to the database filename.
+
+    Parameter filename: The database file
+    Precondition: filename is a string naming a database made by import_dataset
+    """
+    if not os.path.isfile(filename):
+        raise FileNotFoundError('%s does not exist' % filename)
+    connection = sqlite3.connect(filename)
+    version = connection.execute("SELECT value FROM settings WHERE key = 'schema'").fetchone()
+    if version == None or json.loads(version[0]) != SCHEMA_VERSION:
+        connection.close()
+        raise ValueError('%s is from another version of the auditor; import it again' % filename)
+    return connection
+
+
+def get_setting(connection, key):
+    """
+    Returns the value of the setting key (None if there is no such setting).
+
+    Parameter connection: The database
+    Precondition: connection is an sqlite3 connection returned by open_database
+
+    Parameter key: The name of the setting
+    Precondition: key is a string
+    """
+    row = connection.execute('SELECT value FROM settings WHERE key = ?',(key,)).fetchone()
+    return None if row == None else json.loads(row[0])
+
+
+def read_table(connection, table):
+    """
+    Returns the rows of the table for a CSV file, with the header (a list of lists).
+
+    The table is the same as utils.read_csv of the original file, except that rows that
+    were short are padded with empty strings.
+
+    Parameter connection: The database
+    Precondition: connection is an sqlite3 connection returned by open_database
+
+    Parameter table: The table
+    Precondition: table is a string naming a table in TABLES
+    """
+    for name, filename, columns in TABLES:
+        if name == table:
+            break
+    header = connection.execute('SELECT header FROM headers WHERE name = ?',(filename,)).fetchone()
+    rows = [json.loads(header[0])]
+    for row in connection.execute('SELECT %s FROM %s ORDER BY pos' % (', '.join(columns),table)):
+        rows.append(list(row))
+    return rows
+
+
+def read_records(connection, table, kind):
+    """
+    Returns the list of records in the table for a CSV file.
+
+    Parameter connection: The database
+    Precondition: connection is an sqlite3 connection returned by open_database
+
+    Parameter table: The table
+    Precondition: table is a string naming a table in TABLES
+
+    Parameter kind: The record type
+    Precondition: kind is one of the record classes in records.py
+    """
+    return [kind(row) for row in read_table(connection,table)[1:]]
+
+
+def read_registry(connection, table, kind):
+    """
+    Returns a Registry of the records in the table for a CSV file (see records.read_registry).
+
+    Parameter connection: The database
+    Precondition: connection is an sqlite3 connection returned by open_database
+
+    Parameter table: The table
+    Precondition: table is 'students', 'instructors', or 'planes'
+
+    Parameter kind: The record type
+    Precondition: kind is records.Student, records.Instructor, or records.Plane
+    """
+    rows = read_table(connection,table)
+    return utils.Registry([rows[0]]+[kind(row) for row in rows[1:]])
+
+
+def read_daycycle(connection):
+    """
+    Returns the daycycle dictionary of the database (as read from daycycle.json).
+
+    Parameter connection: The database
+    Precondition: connection is an sqlite3 connection returned by open_database
+    """
+    result = {}
+    for key, value in connection.execute("SELECT key, value FROM settings WHERE key != 'schema'"):
+        result[key] = json.loads(value)
+    for day, sunrise, sunset in connection.execute('SELECT day, sunrise, sunset FROM daycycle'):
+        entry = result.setdefault(day[:4],{}).setdefault(day[5:],{})
+        if sunrise != None:
+            entry['sunrise'] = sunrise
+        if sunset != None:
+            entry['sunset'] = sunset
+    return result
+
+
+class WeatherTable(object):
+    """
+    A class answering the weather queries of a WeatherIndex from the weather table.
+
+    Each lookup is a search of the primary key of the weather table, so only the
+    observations used by the lessons are read.
+
+    Attribute maxage: The oldest a report may be to be used
+    Invariant: maxage is None or an int of seconds >= 0
+    """
+
+    def __init__(self, connection, maxage=None):
+        """
+        Initializes the weather of the given database.
+
+        Parameter connection: The database
+        Precondition: connection is an sqlite3 connection returned by open_database
+
+        Parameter maxage: The oldest a report may be to be used (OPTIONAL)
+        Precondition: maxage is None or an int of seconds >= 0
+        """
+        self._connection = connection
+        self.maxage = maxage
+
+    def get_observation(self, takeoff):
+        """
+        Returns the normalized weather report to use for takeoff (see WeatherIndex).
+
+        If there is no such report (or it is older than maxage), this method
+        returns None.
+
+        Parameter takeoff: The takeoff time
+        Precondition: takeoff is a datetime object with a time zone, or an int
+        """
+        takeoff = wx.to_epoch(takeoff)
+        row = self._connection.execute('SELECT time, visibility, wind, crosswind, ceiling, flags '+
+                                       'FROM weather WHERE time <= ? ORDER BY time DESC LIMIT 1',
+                                       (takeoff,)).fetchone()
+        if row == None or (self.maxage != None and takeoff-row[0] > self.maxage):
+            return None
+        return wx.Observation(*row)
+
+
+def get_conditions(connection, filters):
+    """
+    Returns the pair (where, parameters) selecting the lessons that match filters.
+
+    The value where is an SQL WHERE clause (the empty string if there are no filters),
+    and parameters are its values.  The filters 'from' and 'to' are timestamps (or
+    dates) in the time zone of the daycycle; a lesson matches if it takes off at or
+    after 'from' and before 'to'.
+
+    Parameter connection: The database
+    Precondition: connection is an sqlite3 connection returned by open_database
+
+    Parameter filters: The filters
+    Precondition: filters is None or a dictionary whose keys are names in FILTERS and
+    whose values are strings
+    """
+    conditions = []
+    parameters = []
+    for name, condition in FILTERS:
+        if filters == None or filters.get(name) == None:
+            continue
+        value = filters[name]
+        if name in ('from','to'):
+            time = utils.str_to_time(value,get_setting(connection,'timezone'))
+            if time == None:
+                raise ValueError('%s is not a valid time' % repr(value))
+            value = int(time.timestamp())
+        conditions.append(condition)
+        parameters.append(value)
+    if len(conditions) == 0:
+        return ('',[])
+    return (' WHERE '+' AND '.join(conditions),parameters)
+
+
+def make_lesson(row):
+    """
+    Returns the records.Lesson for a row of the lessons table (in LESSON_COLUMNS order).
+
+    Parameter row: The row of the lessons table
+    Precondition: row is a tuple of the values of LESSON_COLUMNS
+    """
+    return records.make_lesson(*row[1:10],texts=None if row[10] == None else row[10:12])
+
+
+def iter_lessons(connection, where='', parameters=()):
+    """
+    Generates the pairs (id, lesson) of the lessons that satisfy where, in file order.
+
+    Parameter connection: The database
+    Precondition: connection is an sqlite3 connection returned by open_database
+
+    Parameter where: An SQL WHERE clause for the lessons table (OPTIONAL)
+    Precondition: where is a string (see get_conditions)
+
+    Parameter parameters: The values of the WHERE clause (OPTIONAL)
+    Precondition: parameters is a sequence with a value for each ? in where
+    """
+    for row in connection.execute('SELECT '+LESSON_COLUMNS+' FROM lessons'+where+' ORDER BY id',
+                                  parameters):
+        yield (row[0],make_lesson(row))
+
+
+def iter_inspection_violations(connection, matched, where=''):
+    """
+    Generates the (annotated) lessons in matched that have inspection violations.
+
+    The violations of a lesson depend on every earlier flight of its plane.  So the
+    sweep (see inspections.sweep_inspections) covers every lesson of the planes flown
+    in the matching lessons, up to the last matching takeoff, and only the violations
+    of the matching lessons are kept.  The planes are independent in the sweep, so the
+    result is the same as in a sweep of every lesson.
+
+    Parameter connection: The database
+    Precondition: connection is an sqlite3 connection returned by open_database
+
+    Parameter matched: The matching lessons
+    Precondition: matched is the list of pairs (id, lesson) from iter_lessons for where
+
+    Parameter where: The SQL WHERE clause of the matching lessons (OPTIONAL)
+    Precondition: where is a string (see get_conditions); it is empty if matched has
+    every lesson
+    """
+    if where != '':
+        flown = [lesson for id, lesson in matched if lesson.takeoff != None]
+        wanted = set(id for id, lesson in matched)
+        matched = []
+        if flown:
+            last = max(lesson.takeoff for lesson in flown)
+            for plane in sorted(set(lesson.plane for lesson in flown)):
+                matched.extend(iter_lessons(connection,' WHERE plane = ? AND takeoff <= ?',
+                                            (plane,last)))
+            matched.sort(key=lambda pair: pair[0])
+    else:
+        wanted = None
+
+    lessons = [lesson for id, lesson in matched]
+    planes = read_registry(connection,'planes',records.Plane)
+    repairs = read_records(connection,'repairs',records.Repair)
+    timezone = get_setting(connection,'timezone')
+    for pos, problems in inspections.sweep_inspections(lessons,repairs,planes,timezone):
+        if wanted == None or matched[pos][0] in wanted:
+            yield lessons[pos].to_row()+[inspections.get_label(problems)]
+
+
+def iter_violations(filename, filters=None):
+    """
+    Generates the (annotated) violations of the lessons in the database that match filters.
+
+    The violations are the same, and in the same order, as those of app.audit_dataset
+    for the original dataset (limited to the matching lessons): the weather violations,
+    then the endorsement violations, then the inspection violations.
+
+    Parameter filename: The database file
+    Precondition: filename is a string naming a database made by import_dataset
+
+    Parameter filters: The filters (OPTIONAL)
+    Precondition: filters is None or a dictionary as in get_conditions
+    """
+    connection = open_database(filename)
+    try:
+        where, parameters = get_conditions(connection,filters)
+        timelines = pilots.Timelines(read_registry(connection,'students',records.Student))
+        weather = {'timelines': timelines,
+                   'minimums':  pilots.MinimumsTable(read_table(connection,'minimums')),
+                   'daycycle':  utils.DaycycleTable(read_daycycle(connection)),
+                   'weather':   WeatherTable(connection)}
+        instructors = read_records(connection,'instructors',records.Instructor)
+        planes = read_records(connection,'planes',records.Plane)
+        credentials = endorsements.compile_references(timelines,instructors,planes)
+
+        matched = list(iter_lessons(connection,where,parameters))
+        lessons = [lesson for id, lesson in matched]
+        for row in violations.check_lessons(lessons,weather):
+            yield row
+        for row in endorsements.check_lessons(lessons,credentials):
+            yield row
+        for row in iter_inspection_violations(connection,matched,where):
+            yield row
+    finally:
+        connection.close()
@@ -36,13 +36,47 @@ makes writing the functions simpler (because the preconditions ensure we have
 less to worry about), enforcing these preconditions can be quite hard. That is
 why it is not necessary to enforce any of the preconditions in this module.
 
-Author: YOUR NAME HERE
-Date: THE DATE HERE
+Every credential in this module is a bit (see CREDENTIAL BITS below).  Each plane is
+compiled ONCE into the bits it requires (ADVANCED, MULTIENGINE) and the bits it provides
+(EQUIPPED for IFR), and each instructor into the bits he or she can teach.  The student
+milestones are already wall-clock times in a pilots.Timeline, so the bits of a student
+are a few integer comparisons against the time of takeoff.  A lesson is then checked by
+masking the bits the flight needs with the bits its pilot and plane have; any bits left
+over are the violations.
+
+Author: Melissa Nondorf
+Date: 10/18/26
 """
 import pilots
 import utils
+import records
+import cache
 import os.path
-import datetime
+
+
+# CREDENTIAL BITS (what a flight needs, and what its pilot and plane have)
+# An endorsement for advanced planes
+ADVANCED = 1
+# An endorsement for multiengine planes
+MULTIENGINE = 2
+# An instrument rating (a CFII for an instructor)
+INSTRUMENT = 4
+# A plane outfitted for IFR flight
+EQUIPPED = 8
+# The bits that are checked as endorsements
+ENDORSEMENT_BITS = ADVANCED | MULTIENGINE
+# The bits that every IFR flight needs
+IFR_BITS = INSTRUMENT | EQUIPPED
+
+# VIOLATION FLAGS
+# A student who has not soloed flies without an instructor
+SOLO = 1
+# The pilot is not endorsed for the plane
+ENDORSEMENT = 2
+# The flight cannot be flown under IFR
+IFR = 4
+# The labels for each combination of flags
+LABELS = {0: '', SOLO: 'Solo', ENDORSEMENT: 'Endorsement', IFR: 'IFR'}
 
 
 def teaches_multiengine(instructor):
@@ -51,9 +85,10 @@ def teaches_multiengine(instructor):
     False otherwise.
     
     Parameter instructor: The flight instructor
-    Precondition: instructor is a 6-element list of strings representing an instructor
+    Precondition: instructor is a 6-element list of strings representing an instructor,
+    or a records.Instructor
     """
-    pass                    # Implement this function
+    return get_instructor_bits(instructor) & MULTIENGINE != 0
 
 
 def teaches_instrument(instructor):
@@ -62,9 +97,10 @@ def teaches_instrument(instructor):
     False otherwise.
     
     Parameter instructor: The flight instructor
-    Precondition: instructor is a 6-element list of strings representing an instructor
+    Precondition: instructor is a 6-element list of strings representing an instructor,
+    or a records.Instructor
     """
-    pass                    # Implement this function
+    return get_instructor_bits(instructor) & INSTRUMENT != 0
 
 
 def is_advanced(plane):
@@ -72,9 +108,10 @@ def is_advanced(plane):
     Returns True if the plane requires an advanced endorsement; False otherwise.
     
     Parameter plane: The school airplane
-    Precondition: plane is a 7-element list of strings representing an airplane
+    Precondition: plane is a 7-element list of strings representing an airplane, or a
+    records.Plane
     """
-    pass                    # Implement this function
+    return get_plane_bits(plane)[0] & ADVANCED != 0
 
 
 def is_multiengine(plane):
@@ -82,9 +119,10 @@ def is_multiengine(plane):
     Returns True if the plane requires a multiengine endorsement; False otherwise.
     
     Parameter plane: The school airplane
-    Precondition: plane is a 7-element list of strings representing an airplane
+    Precondition: plane is a 7-element list of strings representing an airplane, or a
+    records.Plane
     """
-    pass                    # Implement this function
+    return get_plane_bits(plane)[0] & MULTIENGINE != 0
 
 
 def is_ifr_capable(plane):
@@ -95,9 +133,10 @@ def is_ifr_capable(plane):
     with it is an IFR flight.
     
     Parameter plane: The school airplane
-    Precondition: plane is a 7-element list of strings representing an airplane
+    Precondition: plane is a 7-element list of strings representing an airplane, or a
+    records.Plane
     """
-    pass                    # Implement this function
+    return get_plane_bits(plane)[1] & EQUIPPED != 0
 
 
 def bad_endorsement(takeoff,student,instructor,plane):
@@ -116,15 +155,17 @@ def bad_endorsement(takeoff,student,instructor,plane):
     Precondition: takeoff is a datetime object
     
     Parameter student: The student pilot
-    Precondition: student is 10-element list of strings representing a pilot
+    Precondition: student is 10-element list of strings representing a pilot, or a Timeline
     
     Parameter instructor: The flight instructor
-    Precondition: instructor is a 6-element list of strings representing an instructor
+    Precondition: instructor is a 6-element list of strings representing an instructor,
+    a records.Instructor, or None if there is no instructor
     
     Parameter plane: The school airplane
-    Precondition: plane is a 7-element list of strings representing an airplane
+    Precondition: plane is a 7-element list of strings representing an airplane, or a
+    records.Plane
     """
-    pass                    # Implement this function
+    return compare_bits(takeoff,student,instructor,plane,False) & ENDORSEMENT_BITS != 0
 
 
 def bad_ifr(takeoff,student,instructor,plane):
@@ -135,7 +176,7 @@ def bad_ifr(takeoff,student,instructor,plane):
     is an instructor, that instructor must have a CFII. If the student is alone,
     the student must have an instrument rating at the time of takeoff.
     
-    NOTE: The precondition for takeoff does not assume anything about the flight. 
+    NOTE: The precondition for takeoff does not assume anything about the flight.
     It may be a VFR flight not subject to IFR rules.  This function should still
     return False if that flight COULD have been a successful IFR flight.
     
@@ -143,15 +184,130 @@ def bad_ifr(takeoff,student,instructor,plane):
     Precondition: takeoff is a datetime object
     
     Parameter student: The student pilot
-    Precondition: student is 10-element list of strings representing a pilot
+    Precondition: student is 10-element list of strings representing a pilot, or a Timeline
+    
+    Parameter instructor: The flight instructor
+    Precondition: instructor is a 6-element list of strings representing an instructor,
+    a records.Instructor, or None if there is no instructor
+    
+    Parameter plane: The school airplane
+    Precondition: plane is a 7-element list of strings representing an airplane, or a
+    records.Plane
+    """
+    return compare_bits(takeoff,student,instructor,plane,True) & IFR_BITS != 0
+
+
+def compare_bits(takeoff,student,instructor,plane,ifr):
+    """
+    Returns the credential bits that a flight needs but that its pilot and plane lack.
+    
+    This is the shared work of bad_endorsement and bad_ifr, for uncompiled rows.
+    
+    Parameter takeoff: The takeoff time of this flight
+    Precondition: takeoff is a datetime object
+    
+    Parameter student: The student pilot
+    Precondition: student is 10-element list of strings representing a pilot, or a Timeline
+    
+    Parameter instructor: The flight instructor
+    Precondition: instructor is a 6-element list of strings representing an instructor,
+    a records.Instructor, or None if there is no instructor
+    
+    Parameter plane: The school airplane
+    Precondition: plane is a 7-element list of strings representing an airplane, or a
+    records.Plane
+    
+    Parameter ifr: Whether the flight is checked as an IFR flight
+    Precondition: ifr is a boolean
+    """
+    needs, has = get_plane_bits(plane)
+    if ifr:
+        needs |= IFR_BITS
+    if instructor != None:
+        has |= get_instructor_bits(instructor)
+    else:
+        if not isinstance(student,pilots.Timeline):
+            student = pilots.Timeline(student)
+        has |= get_student_bits(student,pilots.wall_time(takeoff))
+    return needs & ~has
+
+
+def get_instructor_bits(instructor):
+    """
+    Returns the credential bits of an instructor.
+    
+    All instructors are certified for advanced planes.  An instructor with an MEI also
+    has MULTIENGINE, and an instructor with a CFII also has INSTRUMENT.
     
     Parameter instructor: The flight instructor
-    Precondition: instructor is a 6-element list of strings representing an instructor
+    Precondition: instructor is a 6-element list of strings representing an instructor,
+    or a records.Instructor
+    """
+    if not isinstance(instructor,records.Instructor):
+        instructor = records.Instructor(instructor)
+    bits = ADVANCED
+    if instructor.mei:
+        bits |= MULTIENGINE
+    if instructor.cfii:
+        bits |= INSTRUMENT
+    return bits
+
+
+def get_plane_bits(plane):
+    """
+    Returns the pair (needs, has) of credential bits for a plane.
+    
+    The value needs combines the endorsements the plane requires (ADVANCED, MULTIENGINE).
+    The value has is EQUIPPED if the plane is outfitted for IFR flight, and 0 otherwise.
     
     Parameter plane: The school airplane
-    Precondition: plane is a 7-element list of strings representing an airplane
+    Precondition: plane is a 7-element list of strings representing an airplane, or a
+    records.Plane
+    """
+    if not isinstance(plane,records.Plane):
+        plane = records.Plane(plane)
+    needs = 0
+    if plane.advanced:
+        needs |= ADVANCED
+    if plane.multiengine:
+        needs |= MULTIENGINE
+    return (needs,EQUIPPED if plane.ifr_capable else 0)
+
+
+def get_student_bits(timeline,when):
+    """
+    Returns the credential bits that a student has at the given time.
+    
+    The rating and the endorsements only count after the time they are given, not at
+    that exact time (as in pilots.has_instrument_rating and the endorsement checks).
+    
+    Parameter timeline: The student pilot
+    Precondition: timeline is a pilots.Timeline
+    
+    Parameter when: The wall-clock time of takeoff
+    Precondition: when is an int (see pilots.wall_time)
+    """
+    bits = 0
+    if timeline.advanced < when:
+        bits |= ADVANCED
+    if timeline.multiengine < when:
+        bits |= MULTIENGINE
+    if timeline.instrument < when:
+        bits |= INSTRUMENT
+    return bits
+
+
+def get_label(problems):
+    """
+    Returns the violation label for a combination of violation flags.
+    
+    A single violation is 'Solo', 'Endorsement', or 'IFR'.  More than one is
+    'Credentials'.  No violation is the empty string.
+    
+    Parameter problems: The violation flags
+    Precondition: problems is an int combining SOLO, ENDORSEMENT, and IFR
     """
-    pass                    # Implement this function
+    return LABELS.get(problems,'Credentials')
 
 
 # FILENAMES
@@ -205,11 +361,150 @@ def list_endorsement_violations(directory):
     'daycycle.json', 'students.csv', 'instructors.csv', 'fleet.csv' and
     'lessons.csv'
     """
-    # Load in all of the files
+    return list(iter_endorsement_violations(directory))
+
+
+def iter_endorsement_violations(directory,use_cache=True):
+    """
+    Returns a generator of the (annotated) flight lessons that violate endorsement
+    or rating regulations.
+    
+    The generator produces the same rows as list_endorsement_violations, in the same
+    order, but it streams lessons.csv one row at a time (as in
+    violations.iter_weather_violations).
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the files
+    'students.csv', 'instructors.csv', 'fleet.csv' and 'lessons.csv'
     
-    # For each of the lessons
-        # Check if the student is allowed to fly by themselves
-        # Check if pilot/instructor is endorsed for the plane
-        # Check if pilot/instructor is permitted to fly IFR in this plane
-        # Add any violations to the result
-    pass
+    Parameter use_cache: Whether to use the dataset cache (OPTIONAL)
+    Precondition: use_cache is a boolean
+    """
+    references = load_endorsement_references(directory,use_cache)
+    lessons = utils.iter_csv(os.path.join(directory,LESSONS))
+
+    #skip the header
+    next(lessons,None)
+    return check_lessons(lessons,references)
+
+
+def load_endorsement_references(directory,use_cache=True):
+    """
+    Returns the compiled reference data for checking endorsements.
+    
+    The result is a dictionary with three keys.  The value for 'timelines' is the
+    pilots.Timelines of the students (shared with the weather audit in the cache).
+    The value for 'instructors' maps each instructor identifier to its credential bits
+    (see get_instructor_bits).  The value for 'planes' maps each tail number to its
+    pair of credential bits (see get_plane_bits).
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the files
+    'students.csv', 'instructors.csv' and 'fleet.csv'
+    
+    Parameter use_cache: Whether to use the dataset cache (OPTIONAL)
+    Precondition: use_cache is a boolean
+    """
+    def build_timelines():
+        return pilots.Timelines(records.read_registry(os.path.join(directory,STUDENTS),
+                                                      records.Student))
+
+    timelines = cache.cached(directory,'timelines',[STUDENTS],pilots.Timelines,build_timelines,
+                             use_cache)
+    return compile_references(timelines,
+                              records.iter_records(os.path.join(directory,TEACHERS),records.Instructor),
+                              records.iter_records(os.path.join(directory,PLANES),records.Plane))
+
+
+def compile_references(timelines,instructors,planes):
+    """
+    Returns the compiled reference data for the given students, instructors, and planes.
+    
+    The result is the dictionary described in load_endorsement_references.
+    
+    Parameter timelines: The student timelines
+    Precondition: timelines is a pilots.Timelines
+    
+    Parameter instructors: The instructors
+    Precondition: instructors is an iterable of records.Instructor
+    
+    Parameter planes: The school airplanes
+    Precondition: planes is an iterable of records.Plane
+    """
+    result = {'timelines': timelines, 'instructors': {}, 'planes': {}}
+    for instructor in instructors:
+        result['instructors'][instructor.id] = get_instructor_bits(instructor)
+    for plane in planes:
+        result['planes'][plane.id] = get_plane_bits(plane)
+    return result
+
+
+def check_lesson(lesson,references):
+    """
+    Returns the endorsement violation for a single lesson (empty string if flight is ok)
+    
+    A flight needs the endorsements of its plane, and an IFR flight also needs the
+    bits in IFR_BITS.  These are provided by the plane and by the instructor (or by
+    the student if there is no instructor).  A flight without an instructor is also a
+    violation if the student has not soloed by takeoff.  A lesson without a valid
+    takeoff is not checked.  A plane that is not in fleet.csv requires no endorsements
+    and is not outfitted for IFR.
+    
+    Parameter lesson: The flight lesson
+    Precondition: lesson is a records.Lesson, or a 7-element list of strings (a row of
+    lessons.csv)
+    
+    Parameter references: The compiled reference data
+    Precondition: references is a dictionary returned by load_endorsement_references
+    """
+    if not isinstance(lesson,records.Lesson):
+        lesson = records.Lesson(lesson)
+    if lesson.takeoff == None:
+        return ''
+
+    needs, has = references['planes'].get(lesson.plane,(0,0))
+    if not lesson.vfr:
+        needs |= IFR_BITS
+
+    problems = 0
+    if lesson.instructed:
+        has |= references['instructors'].get(lesson.instructor,0)
+    else:
+        when = lesson.takeoff if lesson.offset == None else lesson.takeoff+lesson.offset
+        timeline = references['timelines'].get(lesson.student)
+        if timeline.get_certification(when) < pilots.PILOT_STUDENT:
+            problems = SOLO
+        has |= get_student_bits(timeline,when)
+
+    missing = needs & ~has
+    if missing & ENDORSEMENT_BITS:
+        problems |= ENDORSEMENT
+    if missing & IFR_BITS:
+        problems |= IFR
+    return get_label(problems)
+
+
+def check_lessons(lessons,references):
+    """
+    Generates the (annotated) lessons that violate endorsement or rating regulations.
+    
+    Each lesson with a violation is produced as a row with the violation appended to it
+    (a record is converted back with records.Lesson.to_row).  Lessons without a violation
+    are skipped.
+    
+    Parameter lessons: The flight lessons to check
+    Precondition: lessons is an iterable of records.Lesson or of 7-element lists of
+    strings (rows of lessons.csv, without the header)
+    
+    Parameter references: The compiled reference data
+    Precondition: references is a dictionary returned by load_endorsement_references
+    """
+    for lesson in lessons:
+        if isinstance(lesson,records.Lesson):
+            record = lesson
+            lesson = None
+        else:
+            record = records.Lesson(lesson)
+        violation = check_lesson(record,references)
+        if violation != '':
+            yield (record.to_row() if lesson == None else lesson)+[violation]
@@ -47,12 +47,31 @@ makes writing the functions simpler (because the preconditions ensure we have
 less to worry about), enforcing these preconditions can be quite hard. That is
 why it is not necessary to enforce any of the preconditions in this module.
 
-Author: YOUR NAME HERE
-Date: THE DATE HERE
+This module interleaves the lessons with the repairs in a single sweep.  Every repair
+becomes two events (the plane enters the shop, and the plane leaves the shop) and every
+lesson is an event at its takeoff.  The events are sorted by time ONCE, and then each
+plane keeps running accumulators (the hours since its last repair, the day of its last
+annual, and how many repairs it is in the shop for).  So the whole audit costs one sort
+of the lessons and repairs, instead of a loop over the repairs for every lesson.
+
+The dates in repairs.csv and fleet.csv have no time zone; they are the local midnight
+in the time zone of daycycle.json.  A plane is in the shop from the start of the IN
+DATE until the start of the OUT DATE (planes fly lessons on the day they leave the
+shop).  The hours and the annual are reset when the plane leaves the shop.
+
+For questions about one plane at one time (such as whether a plane can be dispatched),
+a RepairIndex answers with a binary search instead of a sweep.  The application uses it
+for the --repairs option (see list_repairs).
+
+Author: Melissa Nondorf
+Date: 10/18/26
 """
 import os.path
 import datetime
+import bisect
 import utils
+import pilots
+import records
 
 # FILENAMES
 # Sunrise and sunset (mainly useful for timezones, since repairs do not have them)
@@ -64,6 +83,35 @@ PLANES   = 'fleet.csv'
 # The list of all repairs made to planes over the past year
 REPAIRS  = 'repairs.csv'
 
+# INSPECTION LIMITS
+# The most a plane may fly between repairs, in seconds (exactly 100 hours is allowed)
+INSPECTION_LIMIT = 100*3600
+# The most days a plane may fly after its annual (exactly 365 days is allowed)
+ANNUAL_DAYS = 365
+# Seconds in a day
+DAY_SECONDS = 86400
+
+# VIOLATION FLAGS
+# The annual inspection has expired
+ANNUAL = 1
+# The plane is past its 100 hour inspection
+INSPECTION = 2
+# The plane is in the shop
+GROUNDED = 4
+# The labels for each combination of flags
+LABELS = {0: '', ANNUAL: 'Annual', INSPECTION: 'Inspection', GROUNDED: 'Grounded'}
+
+# The number of lessons checked at once after putting them in time order (see stream_inspections)
+REORDER_WINDOW = 4096
+
+# EVENT KINDS (in the order they are processed at the same time)
+# A plane leaves the shop
+LEAVE_SHOP = 0
+# A plane enters the shop
+ENTER_SHOP = 1
+# A plane takes off
+TAKEOFF = 2
+
 
 def list_inspection_violations(directory):
     """
@@ -89,22 +137,556 @@ def list_inspection_violations(directory):
     Violations of type (3) is annotated 'Grounded'.  If more than one is
     violated, it should be annotated 'Maintenance'.
     
-    Example: Suppose that the lessons
+    Example: In KITH-2017, the lessons
     
-        S00898  811AX  I072  2017-01-27T13:00:00-05:00  2017-01-27T15:00:00-05:00  VFR  Pattern
         S00681  684TM  I072  2017-02-26T14:00:00-05:00  2017-02-26T17:00:00-05:00  VFR  Practice Area
         S01031  738GG  I010  2017-03-19T13:00:00-04:00  2017-03-19T15:00:00-04:00  VFR  Pattern
+        S00722  738GG  I061  2017-11-10T09:00:00-05:00  2017-11-12T12:00:00-05:00  VFR  Practice Area
+    
+    violate for reasons of 'Inspection', 'Grounded', and 'Annual', respectively.  If
+    they were the only violations, this function would return the 2d list
     
-    violate for reasons of 'Annual', 'Inspection', and 'Grounded', respectively
-    (and are the only violations).  Then this function will return the 2d list
+        [['S00681', '684TM', 'I072', '2017-02-26T14:00:00-05:00', '2017-02-26T17:00:00-05:00', 'VFR', 'Practice Area', 'Inspection'],
+         ['S01031', '738GG', 'I010', '2017-03-19T13:00:00-04:00', '2017-03-19T15:00:00-04:00', 'VFR', 'Pattern', 'Grounded'],
+         ['S00722', '738GG', 'I061', '2017-11-10T09:00:00-05:00', '2017-11-12T12:00:00-05:00', 'VFR', 'Practice Area', 'Annual']]
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the files
+    'daycycle.json', 'fleet.csv', 'repairs.csv' and 'lessons.csv'
+    """
+    return list(iter_inspection_violations(directory))
+
+
+def iter_inspection_violations(directory):
+    """
+    Returns an iterator of the (annotated) violations of list_inspection_violations.
     
-        [['S00898', '811AX', 'I072', '2017-01-27T13:00:00-05:00', '2017-01-27T15:00:00-05:00', 'VFR', 'Pattern', 'Annual'],
-         ['S00681', '684TM', 'I072', '2017-02-26T14:00:00-05:00', '2017-02-26T17:00:00-05:00', 'VFR', 'Practice Area', 'Inspection'],
-         ['S01031', '738GG', 'I010', '2017-03-19T13:00:00-04:00', '2017-03-19T15:00:00-04:00', 'VFR', 'Pattern', 'Grounded']]
+    The violations are the same, and in the same order, as list_inspection_violations.
+    The lessons are streamed through stream_inspections, so the memory does not grow
+    with lessons.csv (only with the repairs and the violations found).  If a lesson
+    takes off before an earlier lesson in the same plane, the stream cannot be checked
+    in one pass, and the lessons are read into memory for sweep_inspections instead.
     
     Parameter directory: The directory of files to audit
     Precondition: directory is the name of a directory containing the files
     'daycycle.json', 'fleet.csv', 'repairs.csv' and 'lessons.csv'
     """
-    # You are on your own
-    pass
+    daycycle = utils.read_json(os.path.join(directory,DAYCYCLE))
+    planes = records.read_registry(os.path.join(directory,PLANES),records.Plane)
+    repairs = records.read_records(os.path.join(directory,REPAIRS),records.Repair)
+    filename = os.path.join(directory,LESSONS)
+    
+    result = stream_inspections(records.iter_records(filename,records.Lesson),repairs,planes,
+                                daycycle['timezone'])
+    if result == None:
+        lessons = records.read_records(filename,records.Lesson)
+        result = []
+        for pos, problems in sweep_inspections(lessons,repairs,planes,daycycle['timezone']):
+            result.append(lessons[pos].to_row()+[get_label(problems)])
+    return iter(result)
+
+
+def get_label(problems):
+    """
+    Returns the violation label for a combination of violation flags.
+    
+    A single violation is 'Annual', 'Inspection', or 'Grounded'.  More than one is
+    'Maintenance'.  No violation is the empty string.
+    
+    Parameter problems: The violation flags
+    Precondition: problems is an int combining ANNUAL, INSPECTION, and GROUNDED
+    """
+    return LABELS.get(problems,'Maintenance')
+
+
+def is_annual(repair):
+    """
+    Returns True if the repair is an annual inspection.
+    
+    Parameter repair: The repair
+    Precondition: repair is a records.Repair
+    """
+    return 'annual' in repair.description.lower()
+
+
+class PlaneState(object):
+    """
+    A class holding the running accumulators of one plane during the sweep.
+    
+    Attribute used: The flight time since the last repair, in seconds
+    Invariant: used is an int >= 0
+    
+    Attribute annual: The day of the last annual (days since 1970-01-01 local time)
+    Invariant: annual is an int, or None if unknown
+    
+    Attribute shop: The number of repairs that currently have the plane in the shop
+    Invariant: shop is an int >= 0
+    
+    Attribute known: Whether the plane is in fleet.csv (only those are inspected)
+    Invariant: known is a boolean
+    
+    Attribute swept: The last takeoff of the plane in the sweep so far
+    Invariant: swept is an int (seconds since the epoch), or None if it has not flown
+    """
+    __slots__ = ('used','annual','shop','known','swept')
+    
+    def __init__(self, plane=None):
+        """
+        Initializes the state of a plane at the start of the audit.
+        
+        Parameter plane: The plane (None if not in fleet.csv)
+        Precondition: plane is a records.Plane or None
+        """
+        self.shop = 0
+        self.known = plane != None
+        self.swept = None
+        self.used = 0
+        self.annual = None
+        if plane != None:
+            self.used = round(plane.hours*3600)
+            if plane.annual != pilots.NEVER:
+                self.annual = plane.annual//DAY_SECONDS
+
+
+def stream_inspections(lessons, repairs, planes, timezone):
+    """
+    Returns the (annotated) inspection violations of the lessons, or None.
+    
+    This is the one-pass form of sweep_inspections for lessons that arrive roughly in
+    time order (lessons.csv is sorted by day, but not always by time within a day).  The
+    lessons are read into a buffer, and whenever it holds 2*REORDER_WINDOW lessons it is
+    sorted and the earliest REORDER_WINDOW are checked.  The planes do not affect each
+    other, so only the lessons of each plane need to come out in order.  The repair events are sorted by plane, and
+    each plane applies its events up to the takeoff of its next lesson.  The violations
+    are lessons (as rows) with their label, in the order of lessons.
+    
+    If a lesson is checked after a later lesson in the same plane (it was more than
+    REORDER_WINDOW lessons out of place), this function stops and returns None, as the
+    events of that plane have already been applied.
+    
+    Parameter lessons: The flight lessons
+    Precondition: lessons is an iterable of records.Lesson
+    
+    Parameter repairs: The repairs
+    Precondition: repairs is a list of records.Repair
+    
+    Parameter planes: The school airplanes
+    Precondition: planes is a Registry of records.Plane
+    
+    Parameter timezone: The local time zone of the repair dates
+    Precondition: timezone is a string naming a valid time zone
+    """
+    states = {}
+    for id in planes.rows:
+        states[id] = PlaneState(planes.rows[id])
+    
+    # The repair events of each plane, latest first (so the next one is popped off the end)
+    events = {}
+    for pos in range(len(repairs)):
+        repair = repairs[pos]
+        if repair.start != pilots.NEVER and repair.end != pilots.NEVER:
+            queue = events.setdefault(repair.plane,[])
+            queue.append((utils.wall_to_epoch(repair.start,timezone),ENTER_SHOP,pos))
+            queue.append((utils.wall_to_epoch(repair.end,timezone),LEAVE_SHOP,pos))
+    tracks = {}
+    for plane in events:
+        events[plane].sort(reverse=True)
+    for plane in states:
+        tracks[plane] = (states[plane],events.get(plane,[]))
+    found = []
+    
+    def sweep(batch):
+        for takeoff, pos, lesson in batch:
+            track = tracks.get(lesson.plane)
+            if track == None:
+                track = tracks[lesson.plane] = (PlaneState(),events.get(lesson.plane,[]))
+            state, queue = track
+            if state.swept != None and takeoff < state.swept:
+                return False
+            while queue and queue[-1][0] <= takeoff:
+                time, kind, next = queue.pop()
+                apply_repair(state,kind,repairs[next])
+            
+            state.swept = takeoff
+            problems = check_takeoff(lesson,state)
+            if problems:
+                found.append((pos,lesson.to_row()+[get_label(problems)]))
+        return True
+    
+    pending = []
+    limit = 2*REORDER_WINDOW
+    for pos, lesson in enumerate(lessons):
+        if lesson.takeoff != None:
+            pending.append((lesson.takeoff,pos,lesson))
+            if len(pending) == limit:
+                pending.sort()
+                if not sweep(pending[:REORDER_WINDOW]):
+                    return None
+                del pending[:REORDER_WINDOW]
+    pending.sort()
+    if not sweep(pending):
+        return None
+    
+    found.sort()
+    return [pair[1] for pair in found]
+
+
+def sweep_inspections(lessons, repairs, planes, timezone, states=None):
+    """
+    Returns the list of pairs (position, problems) for lessons with inspection violations.
+    
+    The value position is the position of the lesson in lessons, and problems combines
+    the flags ANNUAL, INSPECTION, and GROUNDED.  The pairs are in the order of lessons.
+    
+    This is a single sweep over the lessons and repairs in time order (see the module
+    docstring).  A lesson is checked at takeoff for the annual and for the shop, and at
+    landing for the hours (so a lesson that ends at exactly 100 hours is fine).  A lesson
+    without a valid takeoff is skipped.
+    
+    The sweep of each plane stops at its last takeoff, so later repairs are not applied.
+    A sweep can be continued with more lessons (see checkpoint.py) by passing the
+    dictionary states of an earlier sweep, which holds the PlaneState of each plane and
+    is updated in place.  The repairs of a plane up to its last takeoff in that sweep
+    (PlaneState.swept) are then skipped, since they are already in its state.  This
+    gives the same result as a single sweep only if no lesson of a plane takes off
+    before the last takeoff of that plane in the earlier sweep.
+    
+    Parameter lessons: The flight lessons
+    Precondition: lessons is a list of records.Lesson
+    
+    Parameter repairs: The repairs
+    Precondition: repairs is a list of records.Repair
+    
+    Parameter planes: The school airplanes
+    Precondition: planes is a Registry of records.Plane
+    
+    Parameter timezone: The local time zone of the repair dates
+    Precondition: timezone is a string naming a valid time zone
+    
+    Parameter states: The plane states of an earlier sweep (OPTIONAL)
+    Precondition: states is None or a dictionary mapping tail numbers to PlaneState
+    """
+    if states == None:
+        states = {}
+        for id in planes.rows:
+            states[id] = PlaneState(planes.rows[id])
+    
+    events = []
+    lasts = {}
+    for pos in range(len(lessons)):
+        lesson = lessons[pos]
+        if lesson.takeoff != None:
+            events.append((lesson.takeoff,TAKEOFF,pos))
+            if lasts.get(lesson.plane,lesson.takeoff) <= lesson.takeoff:
+                lasts[lesson.plane] = lesson.takeoff
+    for pos in range(len(repairs)):
+        repair = repairs[pos]
+        last = lasts.get(repair.plane)
+        if last != None and repair.start != pilots.NEVER and repair.end != pilots.NEVER:
+            state = states.get(repair.plane)
+            swept = None if state == None else state.swept
+            for time, kind in ((utils.wall_to_epoch(repair.start,timezone),ENTER_SHOP),
+                               (utils.wall_to_epoch(repair.end,timezone),LEAVE_SHOP)):
+                if (swept == None or time > swept) and time <= last:
+                    events.append((time,kind,pos))
+    events.sort()
+    
+    found = []
+    for time, kind, pos in events:
+        if kind == TAKEOFF:
+            lesson = lessons[pos]
+            state = states.get(lesson.plane)
+            if state == None:
+                state = states[lesson.plane] = PlaneState()
+            state.swept = time
+            problems = check_takeoff(lesson,state)
+            if problems:
+                found.append((pos,problems))
+            continue
+        
+        repair = repairs[pos]
+        state = states.get(repair.plane)
+        if state == None:
+            state = states[repair.plane] = PlaneState()
+        apply_repair(state,kind,repair)
+    
+    found.sort()
+    return found
+
+
+def apply_repair(state, kind, repair):
+    """
+    Updates the plane state for the plane entering or leaving the shop for repair.
+    
+    Leaving the shop resets the hours of the plane, and also the annual if the repair
+    is an annual inspection.
+    
+    Parameter state: The running state of the plane of the repair
+    Precondition: state is a PlaneState
+    
+    Parameter kind: The event
+    Precondition: kind is ENTER_SHOP or LEAVE_SHOP
+    
+    Parameter repair: The repair
+    Precondition: repair is a records.Repair with a valid IN DATE and OUT DATE
+    """
+    if kind == ENTER_SHOP:
+        state.shop += 1
+    else:
+        state.shop -= 1
+        state.used = 0
+        if is_annual(repair):
+            state.annual = repair.end//DAY_SECONDS
+
+
+def check_takeoff(lesson, state):
+    """
+    Returns the violation flags for the lesson, and adds the flight to the plane state.
+    
+    Parameter lesson: The flight lesson
+    Precondition: lesson is a records.Lesson with a valid takeoff
+    
+    Parameter state: The running state of the plane of the lesson
+    Precondition: state is a PlaneState
+    """
+    problems = 0
+    if state.shop > 0:
+        problems |= GROUNDED
+    if not state.known:
+        return problems
+    
+    offset = lesson.offset if lesson.offset != None else 0
+    day = (lesson.takeoff+offset)//DAY_SECONDS
+    if state.annual != None and day-state.annual > ANNUAL_DAYS:
+        problems |= ANNUAL
+    
+    if lesson.landing != None and lesson.landing > lesson.takeoff:
+        state.used += lesson.landing-lesson.takeoff
+    if state.used > INSPECTION_LIMIT:
+        problems |= INSPECTION
+    return problems
+
+
+class RepairIndex(object):
+    """
+    A class answering "is this plane in the shop?" with a binary search.
+    
+    The index is built once from the repairs.  For each tail number it keeps two views
+    of the repair windows (each window is [IN DATE, OUT DATE) localized as in the module
+    docstring):
+    
+        merged:  the union of the windows, as disjoint sorted intervals, so overlapping
+                 and back-to-back repairs become one stretch in the shop
+        windows: the individual repairs sorted by start, with a max tree of the ends
+                 (a segment tree whose nodes hold the latest end of their windows)
+    
+    The method is_grounded is a single binary search.  The method overlapping_repairs
+    is a binary search plus a descent of the max tree that only visits the paths to the
+    windows in the answer, so a query with k answers out of n windows costs
+    O((k+1) log n), however the windows nest.  Times may be ints (seconds since the
+    epoch) or datetime objects.  A datetime without a time zone is in the time zone of
+    the index.
+    
+    Attribute timezone: The local time zone of the repair dates
+    Invariant: timezone is a string naming a valid time zone
+    """
+    
+    def __init__(self, repairs, timezone):
+        """
+        Initializes the index for the given repairs.
+        
+        Repairs without a valid IN DATE and OUT DATE, or that end before they start, are
+        ignored.
+        
+        Parameter repairs: The repairs
+        Precondition: repairs is a list of records.Repair
+        
+        Parameter timezone: The local time zone of the repair dates
+        Precondition: timezone is a string naming a valid time zone
+        """
+        self.timezone = timezone
+        windows = {}
+        for repair in repairs:
+            if repair.start == pilots.NEVER or repair.end == pilots.NEVER:
+                continue
+            start = utils.wall_to_epoch(repair.start,timezone)
+            end = utils.wall_to_epoch(repair.end,timezone)
+            if start < end:
+                windows.setdefault(repair.plane,[]).append((start,end,repair))
+        
+        # Each tail maps to (merged starts, merged ends, starts, max tree, repairs)
+        self._tails = {}
+        for tail in windows:
+            spans = sorted(windows[tail],key=lambda span: (span[0],span[1]))
+            merged_starts = []
+            merged_ends = []
+            for start, end, repair in spans:
+                if merged_ends and start <= merged_ends[-1]:
+                    merged_ends[-1] = max(merged_ends[-1],end)
+                else:
+                    merged_starts.append(start)
+                    merged_ends.append(end)
+            self._tails[tail] = (merged_starts,merged_ends,[span[0] for span in spans],
+                                 build_max_tree([span[1] for span in spans]),
+                                 [span[2] for span in spans])
+    
+    def to_epoch(self, time):
+        """
+        Returns time as an int of seconds since the epoch.
+        
+        Parameter time: The time to convert
+        Precondition: time is an int, or a datetime object (with or without a time zone)
+        """
+        if isinstance(time,datetime.datetime):
+            if time.tzinfo == None or time.utcoffset() == None:
+                return utils.wall_to_epoch(pilots.wall_time(time),self.timezone)
+            return int(time.timestamp())
+        return time
+    
+    def is_grounded(self, tail, time):
+        """
+        Returns True if the plane is in the shop at the given time.
+        
+        Parameter tail: The tail number of the plane
+        Precondition: tail is a string
+        
+        Parameter time: The time to check
+        Precondition: time is an int (seconds since the epoch) or a datetime object
+        """
+        entry = self._tails.get(tail)
+        if entry == None:
+            return False
+        time = self.to_epoch(time)
+        pos = bisect.bisect_right(entry[0],time)-1
+        return pos >= 0 and time < entry[1][pos]
+    
+    def overlapping_repairs(self, tail, start, end):
+        """
+        Returns the list of repairs for the plane whose windows overlap [start, end).
+        
+        The repairs are records.Repair objects, ordered by the start of their windows.
+        
+        A binary search finds the windows that start before end.  Among those, the max
+        tree is searched from left to right for the windows that end after start,
+        skipping every node whose windows all ended by then (see search_max_tree).
+        
+        Parameter tail: The tail number of the plane
+        Precondition: tail is a string
+        
+        Parameter start: The start of the span
+        Precondition: start is an int (seconds since the epoch) or a datetime object
+        
+        Parameter end: The end of the span
+        Precondition: end is an int or a datetime object, no earlier than start
+        """
+        entry = self._tails.get(tail)
+        if entry == None:
+            return []
+        start = self.to_epoch(start)
+        end = self.to_epoch(end)
+        starts, tree, repairs = entry[2], entry[3], entry[4]
+        last = bisect.bisect_left(starts,end)
+        return [repairs[pos] for pos in search_max_tree(tree,last,start)]
+
+
+def build_max_tree(values):
+    """
+    Returns the max tree (an implicit segment tree) of the list values.
+    
+    The result is a list of size 2*width, where width is the smallest power of two that
+    is at least len(values) (and at least 1).  Position width+i holds values[i], and
+    every position p < width holds the maximum of positions 2*p and 2*p+1.  Unused
+    leaves hold -NEVER.
+    
+    Parameter values: The values
+    Precondition: values is a list of ints
+    """
+    width = 1
+    while width < len(values):
+        width *= 2
+    tree = [-pilots.NEVER]*width+values+[-pilots.NEVER]*(width-len(values))
+    for pos in range(width-1,0,-1):
+        tree[pos] = max(tree[2*pos],tree[2*pos+1])
+    return tree
+
+
+def search_max_tree(tree, last, bound):
+    """
+    Returns the positions i < last (in increasing order) with a value greater than bound.
+    
+    The search descends from the root, and skips any node whose maximum is at most
+    bound or whose leaves all come at or after last.  Every node it visits is on the
+    path to a position in the answer or to last, or is a child of such a node, so the
+    cost is O((k+1) log n) for k positions out of n.
+    
+    Parameter tree: The max tree
+    Precondition: tree is a list returned by build_max_tree
+    
+    Parameter last: The end of the positions to search
+    Precondition: last is an int >= 0
+    
+    Parameter bound: The value to exceed
+    Precondition: bound is an int
+    """
+    width = len(tree)//2
+    result = []
+    stack = [(1,0,width)]
+    while stack:
+        node, low, high = stack.pop()
+        if low >= last or tree[node] <= bound:
+            continue
+        if node >= width:
+            result.append(low)
+            continue
+        middle = (low+high)//2
+        stack.append((2*node+1,middle,high))
+        stack.append((2*node,low,middle))
+    return result
+
+
+def read_repair_index(directory):
+    """
+    Returns the RepairIndex for the dataset directory.
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the files 
+    'daycycle.json' and 'repairs.csv'
+    """
+    daycycle = utils.read_json(os.path.join(directory,DAYCYCLE))
+    repairs = records.read_records(os.path.join(directory,REPAIRS),records.Repair)
+    return RepairIndex(repairs,daycycle['timezone'])
+
+
+def list_repairs(directory, tail, start, end=None):
+    """
+    Returns the pair (grounded, repairs) for the plane in the dataset directory.
+    
+    The value grounded is True if the plane is in the shop at start, and repairs are the
+    rows of repairs.csv for the plane that overlap [start, end), in the order of their
+    IN DATE (see RepairIndex.overlapping_repairs).  If end is None, they are the repairs
+    that have the plane in the shop at start.
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the files 
+    'daycycle.json' and 'repairs.csv'
+    
+    Parameter tail: The tail number of the plane
+    Precondition: tail is a string
+    
+    Parameter start: The start of the span
+    Precondition: start is a timestamp or a date (in the time zone of the daycycle)
+    
+    Parameter end: The end of the span (OPTIONAL)
+    Precondition: end is None, or a timestamp or a date no earlier than start
+    """
+    index = read_repair_index(directory)
+    times = []
+    for text in (start,start if end == None else end):
+        time = utils.str_to_time(text,index.timezone)
+        if time == None:
+            raise ValueError('%s is not a valid time' % repr(text))
+        times.append(time)
+    if end == None:
+        times[1] += datetime.timedelta(seconds=1)
+    repairs = index.overlapping_repairs(tail,times[0],times[1])
+    return (index.is_grounded(tail,times[0]),[repair.to_row() for repair in repairs])
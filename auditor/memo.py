@@ -0,0 +1,181 @@
+"""
+Module providing bounded memos of pure functions, with least-recently-used eviction.
+
+A memo remembers the results of a function for the most recent keys.  When it is full,
+adding a key forgets the key that was used least recently.  Every memo counts its hits
+(results found), misses (results computed), and evictions (results forgotten), and the
+counters of every memo in the process are reported by get_stats (see profiling.py).
+
+Memos are shared by name, so every audit in a process uses the same memo for the same
+function (see get_memo).  A memo may be used from several threads at once.  Each
+lookup holds a lock only while it reads or updates the memo, and not while it computes
+a result, so two threads may compute the same result at the same time.  This is safe
+because the function is pure.  A worker process has its own memos (and counters).
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import threading
+import collections
+
+
+# The default number of results kept by a memo
+DEFAULT_SIZE = 4096
+
+# Every memo in this process, by name (see get_memo)
+_MEMOS = {}
+# The lock for creating memos
+_MEMOS_LOCK = threading.Lock()
+
+
+class Memo(object):
+    """
+    A class representing a bounded memo of a pure function.
+    
+    Attribute name: The name of this memo
+    Invariant: name is a string
+    
+    Attribute size: The most results this memo keeps (0 disables the memo)
+    Invariant: size is an int >= 0
+    
+    Attribute hits: The number of lookups answered from the memo
+    Invariant: hits is an int >= 0
+    
+    Attribute misses: The number of lookups that computed their result
+    Invariant: misses is an int >= 0
+    
+    Attribute evictions: The number of results forgotten to make room
+    Invariant: evictions is an int >= 0
+    """
+
+    def __init__(self, name, size=DEFAULT_SIZE):
+        """
+        Initializes an empty memo.
+        
+        Parameter name: The name of this memo
+        Precondition: name is a string
+        
+        Parameter size: The most results to keep (OPTIONAL)
+        Precondition: size is an int >= 0
+        """
+        self.name = name
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """
+        Returns the number of results in this memo.
+        """
+        return len(self._results)
+
+    def lookup(self, key, function, *args):
+        """
+        Returns function(*args), remembered under key.
+        
+        If the result for key is in the memo, it is returned without calling function,
+        and it becomes the most recently used result.  Otherwise the result is computed
+        and added to the memo (forgetting the least recently used result if the memo is
+        full).
+        
+        Parameter key: The key of the result
+        Precondition: key is hashable, and function(*args) is the same for equal keys
+        
+        Parameter function: The function to compute the result
+        Precondition: function is a pure function
+        
+        Parameter args: The arguments to function
+        Precondition: args are valid arguments of function
+        """
+        with self._lock:
+            try:
+                result = self._results[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+
+        result = function(*args)
+        with self._lock:
+            if self.size > 0 and not key in self._results:
+                self._results[key] = result
+                while len(self._results) > self.size:
+                    self._results.popitem(last=False)
+                    self.evictions += 1
+        return result
+
+    def resize(self, size):
+        """
+        Changes the most results this memo keeps, forgetting results if necessary.
+        
+        Parameter size: The most results to keep
+        Precondition: size is an int >= 0
+        """
+        with self._lock:
+            self.size = size
+            while len(self._results) > size:
+                self._results.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Forgets every result and resets the counters of this memo.
+        """
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def to_json(self):
+        """
+        Returns the counters of this memo as a dictionary for a JSON report.
+        
+        The dictionary has the size, the number of results, the hits, misses, and
+        evictions, and the hit rate (None if there were no lookups).
+        """
+        with self._lock:
+            lookups = self.hits+self.misses
+            return {'size': self.size, 'entries': len(self._results), 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions,
+                    'hit_rate': None if lookups == 0 else round(self.hits/lookups,4)}
+
+
+def get_memo(name, size=None):
+    """
+    Returns the memo of this process with the given name, creating it if necessary.
+    
+    If size is not None, the memo is resized to it.  A new memo has DEFAULT_SIZE if
+    size is None.
+    
+    Parameter name: The name of the memo
+    Precondition: name is a string
+    
+    Parameter size: The most results to keep (OPTIONAL)
+    Precondition: size is None or an int >= 0
+    """
+    with _MEMOS_LOCK:
+        memo = _MEMOS.get(name)
+        if memo == None:
+            memo = Memo(name,DEFAULT_SIZE if size == None else size)
+            _MEMOS[name] = memo
+            return memo
+    if size != None:
+        memo.resize(size)
+    return memo
+
+
+def get_stats():
+    """
+    Returns the counters of every memo in this process, as a dictionary by name.
+    
+    The counters of each memo are described in Memo.to_json.
+    """
+    with _MEMOS_LOCK:
+        memos = list(_MEMOS.values())
+    return {memo.name: memo.to_json() for memo in memos}
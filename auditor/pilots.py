@@ -39,7 +39,8 @@ Author: Melissa Nondorf
 Date: 2/1/23
 """
 import utils
-from dateutil.parser import parse
+import array
+import calendar
 
 # CERTIFICATION CLASSIFICATIONS
 # The certification of this pilot is unknown
@@ -72,15 +73,21 @@ def get_certification(takeoff,student):
     solo, time of private license, time of 50 hours certification, time of instrument 
     rating, time of advanced endorsement, and time of multiengine endorsement.
     
+    The student may also be a Timeline compiled from that list, in which case no dates
+    are parsed.
+    
     Parameter takeoff: The takeoff time of this flight
     Precondition: takeoff is a datetime object with a time zone
     
     Parameter student: The student pilot
-    Precondition: student is 10-element list of strings representing a pilot
+    Precondition: student is 10-element list of strings representing a pilot, or a Timeline
     """
+    if isinstance(student,Timeline):
+        return student.get_certification(wall_time(takeoff))
+    
     #give student info tz tag from 'takeoff'
     #all students will have at least this entry, so am giving it global tz
-    joined = parse(student[3])
+    joined = utils.str_to_time(student[3])
     joined_tz = joined.replace(tzinfo = takeoff.tzinfo)
     #check that flight takes place after pilot joined the school
     if takeoff<joined_tz:
@@ -88,13 +95,13 @@ def get_certification(takeoff,student):
     
     #create datetime objects with tz if dates exist for each qualification
     if student[6]!='':
-        hr50= parse(student[6])
+        hr50= utils.str_to_time(student[6])
         hr50_tz = hr50.replace(tzinfo = takeoff.tzinfo)
     if student[5]!='':
-        license =parse(student[5])
+        license =utils.str_to_time(student[5])
         license_tz = license.replace(tzinfo = takeoff.tzinfo)
     if student[4]!='':
-        solo = parse(student[4])
+        solo = utils.str_to_time(student[4])
         solo_tz = solo.replace(tzinfo = takeoff.tzinfo)
     
     #check for most advanced status
@@ -130,16 +137,11 @@ def has_instrument_rating(takeoff,student):
     Precondition: takeoff is a datetime object
     
     Parameter student: The student pilot
-    Precondition: student is 10-element list of strings representing a pilot
+    Precondition: student is 10-element list of strings representing a pilot, or a Timeline
     """
-    if student[7] == '':
-        return False
-    elif student[7] != '':
-        instrument_date = parse(student[7])
-        if instrument_date < takeoff:
-            return True
-        else:
-            return False
+    if not isinstance(student,Timeline):
+        student = Timeline(student)
+    return student.instrument < wall_time(takeoff)
     
 
 def has_advanced_endorsement(takeoff,student):
@@ -147,7 +149,8 @@ def has_advanced_endorsement(takeoff,student):
     (OPTIONAL)
     Returns True if the student has an endorsement to fly an advanced plane at the time of takeoff.
     
-    The function returns False otherwise.
+    The function returns False otherwise.  As with has_instrument_rating, the endorsement
+    only counts after the time it was given, so not for a takeoff at that exact time.
     
     Recall that a student is a 10-element list of strings.  The first three elements are
     the student's identifier, last name, and first name.  The remaining elements are all
@@ -159,9 +162,11 @@ def has_advanced_endorsement(takeoff,student):
     Precondition: takeoff is a datetime object
     
     Parameter student: The student pilot
-    Precondition: student is 10-element list of strings representing a pilot
+    Precondition: student is 10-element list of strings representing a pilot, or a Timeline
     """
-    pass                    # Implement this function
+    if not isinstance(student,Timeline):
+        student = Timeline(student)
+    return student.advanced < wall_time(takeoff)
 
 
 def has_multiengine_endorsement(takeoff,student):
@@ -169,7 +174,8 @@ def has_multiengine_endorsement(takeoff,student):
     (OPTIONAL)
     Returns True if the student has an endorsement to fly an multiengine plane at the time of takeoff.
     
-    The function returns False otherwise.
+    The function returns False otherwise.  As with has_instrument_rating, the endorsement
+    only counts after the time it was given, so not for a takeoff at that exact time.
     
     Recall that a student is a 10-element list of strings.  The first three elements are
     the student's identifier, last name, and first name.  The remaining elements are all
@@ -181,9 +187,11 @@ def has_multiengine_endorsement(takeoff,student):
     Precondition: takeoff is a datetime object
     
     Parameter student: The student pilot
-    Precondition: student is 10-element list of strings representing a pilot
+    Precondition: student is 10-element list of strings representing a pilot, or a Timeline
     """
-    pass                    # Implement this function
+    if not isinstance(student,Timeline):
+        student = Timeline(student)
+    return student.multiengine < wall_time(takeoff)
 
 def get_best_value(data, index, maximum=True):
     """
@@ -361,4 +369,339 @@ def get_minimums(cert, area, instructed, vfr, daytime, minimums):
         return None
         
     return best_mins
-    
\ No newline at end of file
+    
+
+# The flight areas a lesson may be filed for
+AREAS = ('Pattern','Practice Area','Cross Country')
+
+
+class MinimumsTable(object):
+    """
+    A class answering get_minimums queries with a single dictionary lookup.
+    
+    The function get_minimums searches the entire minimums table on every call.  But
+    there are very few distinct queries: 5 certifications, 3 areas, and three booleans.
+    This class is compiled once from the minimums table by calling get_minimums for
+    every one of these combinations, so it gives exactly the same answers (including
+    None when no rows match).
+    
+    Queries that were not compiled (such as an unusual area, or daytime None because
+    there is no daycycle entry) fall back to get_minimums and the answer is remembered.
+    
+    Attribute minimums: The table of allowed minimums, including header
+    Invariant: minimums is a 2d-list (table) as described in get_minimums
+    
+    Attribute table: The compiled answers
+    Invariant: table is a dictionary whose keys are tuples (cert,area,instructed,vfr,daytime)
+    and whose values are the result of get_minimums for those arguments
+    """
+    
+    def __init__(self, minimums):
+        """
+        Initializes the lookup table for the given table of minimums.
+        
+        Parameter minimums: The table of allowed minimums
+        Precondition: minimums is a 2d-list (table) as described in get_minimums,
+        including header
+        """
+        self.minimums = minimums
+        self.table = {}
+        for cert in range(PILOT_INVALID,PILOT_50_HOURS+1):
+            for area in AREAS:
+                for instructed in (True,False):
+                    for vfr in (True,False):
+                        for daytime in (True,False):
+                            key = (cert,area,instructed,vfr,daytime)
+                            self.table[key] = get_minimums(cert,area,instructed,vfr,daytime,minimums)
+    
+    def __getstate__(self):
+        """
+        Returns the state of this table (for the cache).
+        
+        Only the table of minimums is stored.  The compiled answers take a few
+        milliseconds to rebuild, and their tuple keys have no place in a data-only state.
+        """
+        return {'minimums': self.minimums}
+    
+    def __setstate__(self, state):
+        """
+        Restores this table from the state returned by __getstate__.
+        
+        Parameter state: The cached state
+        Precondition: state is a dictionary returned by __getstate__
+        """
+        self.__init__(state['minimums'])
+    
+    def get(self, cert, area, instructed, vfr, daytime):
+        """
+        Returns the most advantageous minimums for the given flight category.
+        
+        The result is the same as get_minimums(cert,area,instructed,vfr,daytime,minimums)
+        for the table of minimums this object was built from.  The list returned is
+        shared, and should not be modified.
+        
+        Parameter cert: The pilot certification
+        Precondition: cert is an int and one of PILOT_NOVICE, PILOT_STUDENT, PILOT_CERTIFIED, 
+        PILOT_50_HOURS, or PILOT_INVALID.
+        
+        Parameter area: The flight area for this flight plan
+        Precondition: area is a string
+        
+        Parameter instructed: Whether an instructor is present
+        Precondition: instructed is a boolean
+        
+        Parameter vfr: Whether the pilot has filed this as an VFR flight
+        Precondition: vfr is a boolean
+        
+        Parameter daytime: Whether this flight is during the day
+        Precondition: daytime is boolean (or None if unknown)
+        """
+        key = (cert,area,instructed,vfr,daytime)
+        try:
+            return self.table[key]
+        except KeyError:
+            result = get_minimums(cert,area,instructed,vfr,daytime,self.minimums)
+            self.table[key] = result
+            return result
+
+
+# PRE-PARSED TIMELINES
+# The time of a milestone that the pilot has not reached (later than any takeoff)
+NEVER = 2**62
+
+
+def wall_time(time):
+    """
+    Returns the wall-clock time of time as an int of seconds.
+    
+    The wall-clock time is the number of seconds since 1970-01-01 00:00 in the time zone
+    of time (so the UTC offset is added back in).  The dates in the student table have no
+    time zone and are interpreted in the time zone of the takeoff, so comparing wall-clock
+    times gives the same answers as get_certification.
+    
+    Parameter time: The time to convert
+    Precondition: time is a datetime object (with or without a time zone)
+    """
+    return calendar.timegm(time.timetuple())
+
+
+def date_to_wall(timestamp):
+    """
+    Returns the wall-clock time (see wall_time) for the given date string.
+    
+    If the timestamp is empty or invalid, this function returns NEVER.
+    
+    Parameter timestamp: The date to convert
+    Precondition: timestamp is a string
+    """
+    if timestamp == '':
+        return NEVER
+    when = utils.parse_iso(timestamp)
+    if when == None:
+        return NEVER
+    if when[1] == None:
+        return when[0]
+    return when[0]+when[1]
+
+
+# The milestones of a timeline, in the order of the student row
+MILESTONES = ('joined','solo','license','hours50','instrument','advanced','multiengine')
+
+
+class Timeline(object):
+    """
+    A class representing a pilot's milestones as pre-parsed integers.
+    
+    A timeline is compiled once from a 10-element student row.  Every milestone is a
+    wall-clock time (see wall_time) or NEVER if the pilot has not reached it. This turns
+    the certification, rating, and endorsement checks into integer comparisons.
+    
+    Attribute id: The student identifier
+    Invariant: id is a string
+    
+    Attribute joined, solo, license, hours50, instrument, advanced, multiengine: The
+    time of each milestone
+    Invariant: each is an int (NEVER if the milestone was not reached)
+    """
+    __slots__ = ('id','joined','solo','license','hours50','instrument','advanced','multiengine')
+    
+    def __init__(self, student):
+        """
+        Initializes a timeline from the given student row.
+        
+        Parameter student: The student pilot
+        Precondition: student is 10-element list of strings representing a pilot
+        """
+        self.id = student[0]
+        self.joined = date_to_wall(student[3])
+        self.solo = date_to_wall(student[4])
+        self.license = date_to_wall(student[5])
+        self.hours50 = date_to_wall(student[6])
+        self.instrument = date_to_wall(student[7])
+        self.advanced = date_to_wall(student[8])
+        self.multiengine = date_to_wall(student[9])
+    
+    def get_certification(self, when):
+        """
+        Returns the certification classification for this pilot at the given time.
+        
+        The result is the same as get_certification for the student row.
+        
+        Parameter when: The wall-clock time of takeoff
+        Precondition: when is an int (see wall_time)
+        """
+        if when < self.joined:
+            return PILOT_INVALID
+        elif when >= self.hours50:
+            return PILOT_50_HOURS
+        elif when >= self.license:
+            return PILOT_CERTIFIED
+        elif when >= self.solo:
+            return PILOT_STUDENT
+        return PILOT_NOVICE
+
+
+class Timelines(object):
+    """
+    A class holding the timelines for every student in the school.
+    
+    Each student has a position in this collection.  The timelines are also stored
+    column by column so that get_certifications can classify a whole lesson file at
+    once.  The position -1 is reserved for an unknown student, and always classifies
+    as PILOT_INVALID.
+    
+    Attribute index: The position of each student
+    Invariant: index is a dictionary mapping student identifiers to ints
+    
+    Attribute timelines: The timelines of the students
+    Invariant: timelines is a list of Timeline objects; the last one is the unknown student
+    """
+    
+    def __init__(self, students):
+        """
+        Initializes the timelines for the given students.
+        
+        Parameter students: The student pilots
+        Precondition: students is a Registry of students (rows or records.Student), or a
+        2d list of student rows (including the header)
+        """
+        if isinstance(students,utils.Registry):
+            rows = students.rows.values()
+        else:
+            rows = students[1:]
+        
+        self.index = {}
+        self.timelines = []
+        for row in rows:
+            timeline = row if isinstance(row,Timeline) else Timeline(row)
+            if not timeline.id in self.index:
+                self.index[timeline.id] = len(self.timelines)
+                self.timelines.append(timeline)
+        self.timelines.append(Timeline(['','','']+['']*7))
+        self._columns = None
+    
+    def __getstate__(self):
+        """
+        Returns the state of this collection (for the cache).
+        
+        The timelines are stored column by column: a list of identifiers and an array
+        of ints for each milestone.  The names of the students (when the timelines are
+        records.Student objects) are not stored, as no check uses them.
+        """
+        state = {'ids': [timeline.id for timeline in self.timelines]}
+        for field in MILESTONES:
+            state[field] = array.array('q',[getattr(timeline,field) for timeline in self.timelines])
+        return state
+    
+    def __setstate__(self, state):
+        """
+        Restores this collection from the state returned by __getstate__.
+        
+        Every timeline is restored as a Timeline, even if it was a subclass.
+        
+        Parameter state: The cached state
+        Precondition: state is a dictionary returned by __getstate__
+        """
+        ids = state['ids']
+        self.timelines = []
+        for pos in range(len(ids)):
+            timeline = Timeline.__new__(Timeline)
+            timeline.id = ids[pos]
+            for field in MILESTONES:
+                setattr(timeline,field,state[field][pos])
+            self.timelines.append(timeline)
+        self.index = {ids[pos]: pos for pos in range(len(ids)-1)}
+        self._columns = None
+    
+    def __len__(self):
+        """
+        Returns the number of students (excluding the unknown student).
+        """
+        return len(self.timelines)-1
+    
+    def position(self, id):
+        """
+        Returns the position of the given student, or -1 if unknown.
+        
+        Parameter id: The student identifier
+        Precondition: id is a string
+        """
+        return self.index.get(id,-1)
+    
+    def get(self, id):
+        """
+        Returns the timeline for the given student.
+        
+        An unknown student gets a timeline with no milestones, so that student is
+        always PILOT_INVALID.
+        
+        Parameter id: The student identifier
+        Precondition: id is a string
+        """
+        return self.timelines[self.index.get(id,-1)]
+    
+    def columns(self):
+        """
+        Returns the joined, solo, license, and 50 hours columns as NumPy arrays.
+        
+        The arrays are built the first time this method is called.  This method
+        requires NumPy.
+        """
+        if self._columns == None:
+            numpy = utils.load_numpy()
+            self._columns = tuple(numpy.array([getattr(t,field) for t in self.timelines],dtype=numpy.int64)
+                                  for field in ('joined','solo','license','hours50'))
+        return self._columns
+
+
+def get_certifications(takeoffs, positions, timelines):
+    """
+    Returns the certification classifications for many takeoffs at once.
+    
+    This is the batch form of get_certification.  Element i of the result is the
+    classification of the student at position positions[i] at the (wall-clock) time
+    takeoffs[i].  Unknown students (position -1) are PILOT_INVALID.
+    
+    If NumPy is installed, the result is a NumPy array computed without a Python loop.
+    Otherwise it is a list of ints.
+    
+    Parameter takeoffs: The wall-clock takeoff times (see wall_time)
+    Precondition: takeoffs is a sequence of ints
+    
+    Parameter positions: The position of the student for each takeoff
+    Precondition: positions is a sequence of ints, the same length as takeoffs
+    
+    Parameter timelines: The student timelines
+    Precondition: timelines is a Timelines object
+    """
+    numpy = utils.load_numpy()
+    if numpy == None:
+        lines = timelines.timelines
+        return [lines[pos].get_certification(when) for when, pos in zip(takeoffs,positions)]
+    
+    when = numpy.asarray(takeoffs,dtype=numpy.int64)
+    pos = numpy.asarray(positions,dtype=numpy.int64)
+    joined, solo, license, hours50 = (column[pos] for column in timelines.columns())
+    return numpy.select([when < joined, when >= hours50, when >= license, when >= solo],
+                        [PILOT_INVALID, PILOT_50_HOURS, PILOT_CERTIFIED, PILOT_STUDENT],
+                        PILOT_NOVICE)
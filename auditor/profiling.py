@@ -0,0 +1,473 @@
+"""
+Module that measures where the time of an audit goes.
+
+An audit spends its time in a handful of stages:
+
+    load:           reading the dataset files and the cache
+    parse:          turning rows and timestamps into records
+    certification:  finding the certification of a student at takeoff
+    daytime:        deciding whether a takeoff is during the day
+    minimums:       finding the minimums for a lesson
+    weather:        finding the weather report at takeoff
+    rules:          checking a lesson (or the inspection sweep) for violations
+    output:         writing the violations to the CSV file
+
+The functions of each stage are listed in PROBES.  When profiling is installed (see
+install), each of them is replaced in its module or class by a wrapper that times the
+call with time.perf_counter_ns and counts it.  Nothing is replaced until then, so an
+audit without --profile runs exactly the same code as before, at no cost.
+
+The stages call each other (a rule calls the weather lookup, the output writer pulls
+the rules through a generator), so each stage has two times.  The total is the wall
+time from entering the stage until leaving it.  The self time leaves out the time of
+the stages called inside it, so the self times of all of the stages (and 'other', the
+time outside of every stage) add up to the wall time of the audit.  A generator (like
+utils.iter_csv) is timed each time it produces a row.  Timing a call costs about a
+tenth of a microsecond, which is noticeable for the smallest stages (a minimums lookup
+takes little more than that), so their times are an upper bound.
+
+This module can also run the audit under cProfile and save the statistics in the
+collapsed-stack format read by flamegraph tools (one line per call stack, with the
+frames separated by semicolons and followed by the microseconds spent in that stack).
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import os.path
+import json
+import time
+import cProfile
+import pstats
+import importlib
+import memo
+
+
+# The stages, in the order they are reported
+STAGES = ('load','parse','certification','daytime','minimums','weather','rules','output')
+
+# The instrumented functions as (stage, module, attribute, rows).  The attribute may be
+# a method (Class.method).  The value rows is how a call counts its rows: 'call' for
+# one row per call, 'size' for the length of the result, 'result' if the result is the
+# number of rows, or 'items' for a generator (one row for each item produced)
+PROBES = [('load','utils','read_json','size'),
+          ('load','utils','read_csv','size'),
+          ('load','utils','iter_csv','items'),
+          ('load','records','read_registry','size'),
+          ('load','records','iter_records','items'),
+          ('load','cache','load','call'),
+          ('load','weatherstore','open_store','call'),
+          ('parse','records','Lesson.__init__','call'),
+          ('parse','records','Student.__init__','call'),
+          ('parse','utils','parse_iso','call'),
+          ('parse','utils','str_to_time','call'),
+          ('certification','pilots','Timeline.get_certification','call'),
+          ('certification','pilots','get_certification','call'),
+          ('daytime','utils','DaycycleTable.is_daytime','call'),
+          ('daytime','utils','daytime','call'),
+          ('minimums','pilots','MinimumsTable.get','call'),
+          ('minimums','pilots','get_minimums','call'),
+          ('weather','weather','WeatherIndex.get_observation','call'),
+          ('weather','weather','WeatherIndex.get_report','call'),
+          ('weather','weatherstore','WeatherStore.get_observation','call'),
+          ('weather','violations','get_weather_report','call'),
+          ('rules','violations','check_lesson','call'),
+          ('rules','violations','check_batch','size'),
+          ('rules','endorsements','check_lesson','call'),
+          ('rules','inspections','sweep_inspections','call'),
+          ('rules','vectorized','list_weather_violations','size'),
+          ('output','utils','stream_csv','result')]
+
+# The smallest time (in microseconds) of a call stack saved by write_stacks
+MIN_STACK = 1
+# The file name of the wrappers in cProfile statistics (see disguise)
+PROBE_FILE = '<profiling>'
+
+
+class Stage(object):
+    """
+    A class holding the timers and counters of one stage.
+    
+    Attribute name: The stage name
+    Invariant: name is a string in STAGES
+    
+    Attribute calls: The number of calls to the stage (not counting calls inside itself)
+    Invariant: calls is an int >= 0
+    
+    Attribute rows: The number of rows handled by the stage (see PROBES)
+    Invariant: rows is an int >= 0
+    
+    Attribute total: The time spent in the stage, in nanoseconds
+    Invariant: total is an int >= 0
+    
+    Attribute own: The time spent in the stage but not in other stages, in nanoseconds
+    Invariant: own is an int >= 0
+    
+    Attribute depth: The number of calls to the stage in progress
+    Invariant: depth is an int >= 0
+    """
+
+    def __init__(self, name):
+        """
+        Initializes a stage with no calls.
+        
+        Parameter name: The stage name
+        Precondition: name is a string in STAGES
+        """
+        self.name = name
+        self.calls = 0
+        self.rows = 0
+        self.total = 0
+        self.own = 0
+        self.depth = 0
+
+    def to_json(self):
+        """
+        Returns the stage as a dictionary for the JSON report (times in seconds).
+        """
+        total = self.total/1e9
+        return {'calls': self.calls, 'rows': self.rows, 'total': round(total,6),
+                'self': round(self.own/1e9,6),
+                'rows_per_sec': round(self.rows/total,1) if total > 0 else None}
+
+
+# The stages by name (while profiling is installed)
+_STAGES = {}
+# The calls in progress, innermost last; each is a list [stage, time in inner stages]
+_ACTIVE = []
+# The replaced attributes as (owner, attribute, original)
+_ORIGINALS = []
+
+
+def enter(stage):
+    """
+    Returns the frame for a new call to stage, after adding it to the calls in progress.
+    
+    Parameter stage: The stage called
+    Precondition: stage is a Stage
+    """
+    frame = [stage,0]
+    _ACTIVE.append(frame)
+    stage.depth += 1
+    return frame
+
+
+def leave(frame, elapsed, rows):
+    """
+    Records the end of the call in frame, which took elapsed nanoseconds.
+    
+    The total (and the calls and rows) only count the outermost call of a stage, since
+    the time of a call inside the same stage is already part of it.
+    
+    Parameter frame: The frame returned by enter
+    Precondition: frame is the innermost call in progress
+    
+    Parameter elapsed: The time of the call in nanoseconds
+    Precondition: elapsed is an int >= 0
+    
+    Parameter rows: The rows handled by the call
+    Precondition: rows is an int >= 0
+    """
+    _ACTIVE.pop()
+    stage = frame[0]
+    stage.depth -= 1
+    stage.own += elapsed-frame[1]
+    if stage.depth == 0:
+        stage.total += elapsed
+        stage.calls += 1
+        stage.rows += rows
+    if _ACTIVE:
+        _ACTIVE[-1][1] += elapsed
+
+
+def count_rows(result, rows):
+    """
+    Returns the number of rows handled by a call with the given result.
+    
+    Parameter result: The result of the call
+    Precondition: result is any value
+    
+    Parameter rows: How the call counts its rows
+    Precondition: rows is 'call', 'size', or 'result' (see PROBES)
+    """
+    if rows == 'result' and type(result) == int:
+        return result
+    if rows == 'size' and hasattr(result,'__len__'):
+        return len(result)
+    return 1
+
+
+def disguise(wrapper, function):
+    """
+    Returns wrapper, after giving it the name and documentation of function.
+    
+    The wrapper also gets its own code object, with the file PROBE_FILE and the full
+    name of function.  Otherwise cProfile would see one function for every wrapper, and
+    mix up their callers and callees.  The wrappers are left out of collapsed stacks.
+    
+    Parameter wrapper: The wrapper
+    Precondition: wrapper is a function defined in this module
+    
+    Parameter function: The function wrapped
+    Precondition: function is a function
+    """
+    name = '%s.%s' % (function.__module__,function.__qualname__)
+    wrapper.__code__ = wrapper.__code__.replace(co_filename=PROBE_FILE,co_name=name)
+    wrapper.__wrapped__ = function
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+def probe(stage, function, rows):
+    """
+    Returns a wrapper of function that times its calls in stage.
+    
+    Parameter stage: The stage of the function
+    Precondition: stage is a Stage
+    
+    Parameter function: The function to time
+    Precondition: function is callable
+    
+    Parameter rows: How the function counts its rows
+    Precondition: rows is 'call', 'size', or 'result' (see PROBES)
+    """
+    clock = time.perf_counter_ns
+    def wrapper(*args, **kwargs):
+        frame = enter(stage)
+        start = clock()
+        result = None
+        try:
+            result = function(*args,**kwargs)
+            return result
+        finally:
+            leave(frame,clock()-start,count_rows(result,rows) if rows != 'call' else 1)
+    return disguise(wrapper,function)
+
+
+def probe_items(stage, function):
+    """
+    Returns a wrapper of the generator function that times each item in stage.
+    
+    The time to create the generator and the time to produce each item are each one
+    call to the stage, but only the items count as rows.
+    
+    Parameter stage: The stage of the function
+    Precondition: stage is a Stage
+    
+    Parameter function: The generator function to time
+    Precondition: function is callable and returns an iterator
+    """
+    clock = time.perf_counter_ns
+    def items(iterator):
+        while True:
+            frame = enter(stage)
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                leave(frame,clock()-start,0)
+                return
+            except:
+                leave(frame,clock()-start,0)
+                raise
+            leave(frame,clock()-start,1)
+            yield item
+    disguise(items,function)
+
+    def wrapper(*args, **kwargs):
+        frame = enter(stage)
+        start = clock()
+        try:
+            iterator = iter(function(*args,**kwargs))
+        finally:
+            leave(frame,clock()-start,0)
+        return items(iterator)
+    return disguise(wrapper,function)
+
+
+def install():
+    """
+    Installs the timers of every function in PROBES, starting all stages at zero.
+    
+    A module that cannot be imported (vectorized.py without NumPy) is skipped.  If the
+    timers are already installed, they are only reset.
+    """
+    _STAGES.clear()
+    del _ACTIVE[:]
+    for name in STAGES:
+        _STAGES[name] = Stage(name)
+    if _ORIGINALS:
+        return
+    for name, module, attribute, rows in PROBES:
+        try:
+            owner = importlib.import_module(module)
+        except ImportError:
+            continue
+        path = attribute.split('.')
+        for part in path[:-1]:
+            owner = getattr(owner,part)
+        original = owner.__dict__[path[-1]]
+        if rows == 'items':
+            wrapper = probe_items(_STAGES[name],original)
+        else:
+            wrapper = probe(_STAGES[name],original,rows)
+        _ORIGINALS.append((owner,path[-1],original))
+        setattr(owner,path[-1],wrapper)
+
+
+def uninstall():
+    """
+    Restores every function replaced by install.
+    
+    The stages keep their times and counters, so they can still be reported.
+    """
+    while _ORIGINALS:
+        owner, attribute, original = _ORIGINALS.pop()
+        setattr(owner,attribute,original)
+
+
+def get_report(wall, datasets):
+    """
+    Returns the JSON report (a dictionary) of the stages.
+    
+    The report has the wall time of the audit in seconds, the datasets audited, and a
+    dictionary of stages (see Stage.to_json).  The stage 'other' is the time outside
+    of every stage.  The report also has the hits, misses, and evictions of every memo
+    (see memo.get_stats).
+    
+    Parameter wall: The wall time of the audit in nanoseconds
+    Precondition: wall is an int >= 0
+    
+    Parameter datasets: The datasets audited
+    Precondition: datasets is a list of strings
+    """
+    stages = {}
+    spent = 0
+    for name in STAGES:
+        stage = _STAGES.get(name,Stage(name))
+        stages[name] = stage.to_json()
+        spent += stage.own
+    other = max(0,wall-spent)/1e9
+    stages['other'] = {'calls': 0, 'rows': 0, 'total': round(other,6), 'self': round(other,6),
+                       'rows_per_sec': None}
+    return {'wall': round(wall/1e9,6), 'datasets': list(datasets), 'stages': stages,
+            'memos': memo.get_stats()}
+
+
+def frame_name(function):
+    """
+    Returns the name of a function in a collapsed stack (None for a wrapper).
+    
+    Parameter function: The function, as a key of pstats.Stats.stats
+    Precondition: function is a tuple (filename, line, name)
+    """
+    filename, line, name = function
+    if filename == PROBE_FILE:
+        return None
+    if filename == '~':
+        return name.replace(';',',')
+    return '%s:%d(%s)' % (os.path.basename(filename),line,name)
+
+
+def collapse_stats(stats):
+    """
+    Returns a dictionary mapping each call stack to its time in microseconds.
+    
+    A call stack is a string of frame names separated by semicolons, outermost first.
+    cProfile only records the time along each caller-callee edge, not whole stacks,
+    so the time of a function on a stack is its share of the edge time from its caller
+    (as the flamegraph tools for cProfile do).  Recursive calls are folded into the
+    first call on the stack.
+    
+    Parameter stats: The profile statistics
+    Precondition: stats is a pstats.Stats
+    """
+    table = stats.stats
+    callees = {}
+    roots = []
+    for function in table:
+        callers = table[function][4]
+        if not callers:
+            roots.append(function)
+        for caller in callers:
+            callees.setdefault(caller,[]).append((function,callers[caller][3]))
+
+    stacks = {}
+    pending = [((root,),table[root][3]) for root in roots]
+    while pending:
+        path, budget = pending.pop()
+        function = path[-1]
+        total = table[function][3]
+        if total <= 0:
+            continue
+        own = budget*table[function][2]/total
+        for callee, spent in callees.get(function,[]):
+            share = budget*spent/total
+            if callee in path:
+                own += share
+            elif share*1e6 >= MIN_STACK:
+                pending.append((path+(callee,),share))
+        micros = int(own*1e6)
+        if micros >= MIN_STACK:
+            names = [frame_name(frame) for frame in path]
+            key = ';'.join(name for name in names if name != None)
+            stacks[key] = stacks.get(key,0)+micros
+    return stacks
+
+
+def write_stacks(profiler, filename):
+    """
+    Writes the statistics of profiler to filename in the collapsed-stack format.
+    
+    Parameter profiler: The profiler
+    Precondition: profiler is a cProfile.Profile that has been run
+    
+    Parameter filename: The file to write
+    Precondition: filename is a string
+    """
+    stacks = collapse_stats(pstats.Stats(profiler))
+    with open(filename,'w') as file:
+        for key in sorted(stacks):
+            file.write('%s %d\n' % (key,stacks[key]))
+
+
+def run_profiled(function, report=None, stacks=None, datasets=()):
+    """
+    Calls function() with profiling, and writes the profiling results.
+    
+    If report is not None, the stage timers are installed (see install) for the call,
+    and the JSON report is written to the file report.  If stacks is not None, the call
+    is run under cProfile, and its collapsed stacks are written to the file stacks.  The
+    results are written even if the call raises an exception.
+    
+    Parameter function: The function to call
+    Precondition: function is callable with no arguments
+    
+    Parameter report: The file for the JSON report (OPTIONAL)
+    Precondition: report is None or a string
+    
+    Parameter stacks: The file for the collapsed stacks (OPTIONAL)
+    Precondition: stacks is None or a string
+    
+    Parameter datasets: The datasets audited by function (OPTIONAL)
+    Precondition: datasets is a list of strings
+    """
+    profiler = None if stacks == None else cProfile.Profile()
+    if report != None:
+        install()
+    start = time.perf_counter_ns()
+    try:
+        if profiler != None:
+            profiler.runcall(function)
+        else:
+            function()
+    finally:
+        wall = time.perf_counter_ns()-start
+        if report != None:
+            uninstall()
+            results = get_report(wall,datasets)
+            with open(report,'w') as file:
+                json.dump(results,file,indent=2)
+                file.write('\n')
+        if profiler != None:
+            write_stacks(profiler,stacks)
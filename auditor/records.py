@@ -0,0 +1,529 @@
+"""
+Module providing compact record types for the rows of the dataset files.
+
+The functions in this project were written for rows that are lists of strings, where
+every field is found by its position (so lesson[3] is the takeoff and student[6] is the
+date of 50 hours).  Every use of a field has to parse it again, and each row costs a
+list plus a separate string for every cell.
+
+The classes in this module are records with __slots__, one for each kind of row.  The
+fields are parsed ONCE when the record is created: times become ints of seconds, Yes/No
+columns become booleans, and the identifiers (which repeat on almost every row) are
+interned so that all of the rows share a single copy.  Each record can convert itself
+back into its original row with to_row, so the CSV output is unchanged.
+
+Dates without a time zone (the student milestones, the annual inspection, and the repair
+dates) are stored as wall-clock times (see pilots.wall_time), exactly as in a Timeline.
+A missing or invalid date is pilots.NEVER.
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import sys
+import datetime
+import utils
+import pilots
+
+
+# The width of a lesson timestamp, like '2019-01-02T12:00:00-05:00'
+ISO_WIDTH = 25
+# Seconds in a day
+DAY_SECONDS = 86400
+# The most timestamps to remember in parse_timestamp (the cache is cleared when full)
+TIMESTAMP_CACHE = 1 << 16
+
+# The parsed timestamps, by text (see parse_timestamp)
+_TIMESTAMPS = {}
+# The text of the canonical timestamps, by (epoch, offset) (see format_time)
+_TEXTS = {}
+# The shared wall-clock dates (see share_date)
+_DATES = {}
+
+
+def format_time(epoch, offset):
+    """
+    Returns the ISO timestamp for the given time (the reverse of utils.parse_iso).
+    
+    Timestamps seen by parse_timestamp are remembered, so they are not formatted again.
+    
+    Parameter epoch: The time in seconds since 1970-01-01 UTC
+    Precondition: epoch is an int
+    
+    Parameter offset: The UTC offset in seconds
+    Precondition: offset is an int
+    """
+    text = _TEXTS.get((epoch,offset))
+    if text == None:
+        text = utils.epoch_to_time(epoch,offset).isoformat()
+    return text
+
+
+def format_date(wall):
+    """
+    Returns the date string 'YYYY-MM-DD' for a wall-clock time (or '' for NEVER).
+    
+    Parameter wall: The wall-clock time (see pilots.wall_time)
+    Precondition: wall is an int
+    """
+    if wall == pilots.NEVER:
+        return ''
+    return datetime.date.fromordinal(utils.EPOCH_ORDINAL+wall//DAY_SECONDS).isoformat()
+
+
+def format_short_date(wall):
+    """
+    Returns the date string 'M/D/YY' for a wall-clock time (or '' for NEVER).
+    
+    This is the date format of the ANNUAL column of fleet.csv in KITH-2018 and KITH-2019.
+    Other datasets (such as KITH-2017) write that column as 'YYYY-MM-DD', so a Plane
+    keeps the original row whenever this format does not reproduce it.
+    
+    Parameter wall: The wall-clock time (see pilots.wall_time)
+    Precondition: wall is an int
+    """
+    if wall == pilots.NEVER:
+        return ''
+    date = datetime.date.fromordinal(utils.EPOCH_ORDINAL+wall//DAY_SECONDS)
+    return '%d/%d/%02d' % (date.month,date.day,date.year % 100)
+
+
+def format_hours(hours):
+    """
+    Returns the string for a number of hours, without a fraction if it is whole.
+    
+    Parameter hours: The number of hours
+    Precondition: hours is a float
+    """
+    if hours.is_integer():
+        return str(int(hours))
+    return repr(hours)
+
+
+def share_date(wall):
+    """
+    Returns the shared int object for the wall-clock time wall.
+    
+    Many students reach their milestones on the same days.  Sharing one int object per
+    distinct date keeps the records small.
+    
+    Parameter wall: The wall-clock time (see pilots.wall_time)
+    Precondition: wall is an int
+    """
+    return _DATES.setdefault(wall,wall)
+
+
+def parse_timestamp(timestamp):
+    """
+    Returns the tuple (epoch, offset, canonical) for a lesson timestamp.
+    
+    The values epoch and offset are those of utils.parse_iso (both None if the timestamp
+    is invalid).  The value canonical is True if format_time reproduces the timestamp
+    exactly, so that it does not need to be kept as text.
+    
+    Lessons start and end on a handful of distinct times (usually on the hour), so the
+    results are cached by timestamp.
+    
+    Parameter timestamp: The timestamp to parse
+    Precondition: timestamp is a string
+    """
+    parsed = _TIMESTAMPS.get(timestamp)
+    if parsed != None:
+        return parsed
+    
+    result = utils.parse_iso_fast(timestamp)
+    if (result != None and result[1] != None and len(timestamp) == ISO_WIDTH and
+        timestamp[19:] != '-00:00'):
+        parsed = (result[0],result[1],True)
+    else:
+        result = utils.parse_iso(timestamp)
+        parsed = (None,None,False) if result == None else (result[0],result[1],False)
+    
+    if len(_TIMESTAMPS) >= TIMESTAMP_CACHE:
+        _TIMESTAMPS.clear()
+        _TEXTS.clear()
+    _TIMESTAMPS[timestamp] = parsed
+    if parsed[2]:
+        _TEXTS[parsed[:2]] = timestamp
+    return parsed
+
+
+class Lesson(object):
+    """
+    A class representing a row of lessons.csv.
+    
+    The takeoff and landing are stored as ints of seconds since the epoch, together with
+    their UTC offsets (so takeoff+offset is the wall-clock time of takeoff).  A timestamp
+    that cannot be reproduced from those ints (because it is not in the standard form)
+    is kept as text, so that to_row still returns the original row.
+    
+    Attribute student: The student identifier
+    Invariant: student is a string
+    
+    Attribute plane: The tail number of the airplane
+    Invariant: plane is a string
+    
+    Attribute instructor: The instructor identifier
+    Invariant: instructor is a string ('' for a solo flight)
+    
+    Attribute takeoff: The time of takeoff
+    Invariant: takeoff is an int (seconds since the epoch), or None if invalid
+    
+    Attribute offset: The UTC offset of the takeoff
+    Invariant: offset is an int of seconds, or None if the takeoff has no time zone
+    
+    Attribute landing: The time of landing
+    Invariant: landing is an int (seconds since the epoch), or None if invalid
+    
+    Attribute landing_offset: The UTC offset of the landing
+    Invariant: landing_offset is an int of seconds, or None if the landing has no time zone
+    
+    Attribute filed: The flight plan
+    Invariant: filed is a string ('VFR' or 'IFR')
+    
+    Attribute area: The area of the flight
+    Invariant: area is a string ('Pattern', 'Practice Area', or 'Cross Country')
+    """
+    __slots__ = ('student','plane','instructor','takeoff','offset','landing','landing_offset',
+                 'filed','area','_text')
+
+    def __init__(self, row):
+        """
+        Initializes a lesson from the given row.
+        
+        Parameter row: The flight lesson
+        Precondition: row is a 7-element list of strings (a row of lessons.csv)
+        """
+        intern = sys.intern
+        self.student = intern(row[0])
+        self.plane = intern(row[1])
+        self.instructor = intern(row[2])
+        self.filed = intern(row[5])
+        self.area = intern(row[6])
+
+        self.takeoff, self.offset, canonical = parse_timestamp(row[3])
+        self.landing, self.landing_offset, landing = parse_timestamp(row[4])
+        self._text = None if canonical and landing else (row[3],row[4])
+
+    def __repr__(self):
+        """
+        Returns the unambiguous string representation of this lesson.
+        """
+        return 'Lesson(%r)' % self.to_row()
+
+    @property
+    def instructed(self):
+        """
+        True if there is an instructor on this flight (read-only).
+        """
+        return self.instructor != ''
+
+    @property
+    def vfr(self):
+        """
+        True if this flight was filed under VFR rules (read-only).
+        """
+        return self.filed == 'VFR'
+
+    def to_row(self):
+        """
+        Returns this lesson as a 7-element list of strings (the original row).
+        """
+        if self._text == None:
+            takeoff = format_time(self.takeoff,self.offset)
+            landing = format_time(self.landing,self.landing_offset)
+        else:
+            takeoff, landing = self._text
+        return [self.student,self.plane,self.instructor,takeoff,landing,self.filed,self.area]
+
+
+def make_lesson(student, plane, instructor, takeoff, offset, landing, landing_offset,
+                filed, area, texts=None):
+    """
+    Returns the Lesson with the given (already parsed) values.
+    
+    This builds the same lesson as Lesson(row) without parsing the timestamps again
+    (see database.py).  The values are those of the attributes of Lesson.
+    
+    Parameter texts: The original takeoff and landing timestamps (OPTIONAL)
+    Precondition: texts is None if format_time reproduces both timestamps exactly, and
+    otherwise the pair of the original timestamps
+    """
+    intern = sys.intern
+    lesson = Lesson.__new__(Lesson)
+    lesson.student = intern(student)
+    lesson.plane = intern(plane)
+    lesson.instructor = intern(instructor)
+    lesson.filed = intern(filed)
+    lesson.area = intern(area)
+    lesson.takeoff = takeoff
+    lesson.offset = offset
+    lesson.landing = landing
+    lesson.landing_offset = landing_offset
+    lesson._text = None if texts == None else tuple(texts)
+    return lesson
+
+
+class Student(pilots.Timeline):
+    """
+    A class representing a row of students.csv.
+    
+    A student is a Timeline (so every milestone is a wall-clock time, or NEVER), together
+    with the name of the student.  It can be used anywhere a Timeline can.
+    
+    Attribute last: The last name of the student
+    Invariant: last is a string
+    
+    Attribute first: The first name of the student
+    Invariant: first is a string
+    """
+    __slots__ = ('last','first','_row')
+
+    def __init__(self, row):
+        """
+        Initializes a student from the given row.
+        
+        Parameter row: The student pilot
+        Precondition: row is 10-element list of strings (a row of students.csv)
+        """
+        pilots.Timeline.__init__(self,row)
+        self.id = sys.intern(self.id)
+        for field in pilots.Timeline.__slots__[1:]:
+            setattr(self,field,share_date(getattr(self,field)))
+        self.last = sys.intern(row[1])
+        self.first = sys.intern(row[2])
+        self._row = None
+        if self.to_row() != row:
+            self._row = tuple(row)
+
+    def __repr__(self):
+        """
+        Returns the unambiguous string representation of this student.
+        """
+        return 'Student(%r)' % self.to_row()
+
+    def to_row(self):
+        """
+        Returns this student as a 10-element list of strings (the original row).
+        """
+        if self._row != None:
+            return list(self._row)
+        return [self.id,self.last,self.first,format_date(self.joined),format_date(self.solo),
+                format_date(self.license),format_date(self.hours50),format_date(self.instrument),
+                format_date(self.advanced),format_date(self.multiengine)]
+
+
+class Instructor(object):
+    """
+    A class representing a row of instructors.csv.
+    
+    Attribute id: The instructor identifier
+    Invariant: id is a string
+    
+    Attribute last: The last name of the instructor
+    Invariant: last is a string
+    
+    Attribute first: The first name of the instructor
+    Invariant: first is a string
+    
+    Attribute cfi, cfii, mei: Whether the instructor can teach VFR, IFR, and multiengine
+    Invariant: each is a boolean
+    """
+    __slots__ = ('id','last','first','cfi','cfii','mei','_row')
+
+    def __init__(self, row):
+        """
+        Initializes an instructor from the given row.
+        
+        Parameter row: The flight instructor
+        Precondition: row is a 6-element list of strings (a row of instructors.csv)
+        """
+        self.id = sys.intern(row[0])
+        self.last = row[1]
+        self.first = row[2]
+        self.cfi = row[3] == 'Yes'
+        self.cfii = row[4] == 'Yes'
+        self.mei = row[5] == 'Yes'
+        self._row = None
+        if self.to_row() != row:
+            self._row = tuple(row)
+
+    def __repr__(self):
+        """
+        Returns the unambiguous string representation of this instructor.
+        """
+        return 'Instructor(%r)' % self.to_row()
+
+    def to_row(self):
+        """
+        Returns this instructor as a 6-element list of strings (the original row).
+        """
+        if self._row != None:
+            return list(self._row)
+        return [self.id,self.last,self.first]+[yes_no(flag) for flag in (self.cfi,self.cfii,self.mei)]
+
+
+class Plane(object):
+    """
+    A class representing a row of fleet.csv.
+    
+    Attribute id: The tail number
+    Invariant: id is a string
+    
+    Attribute type: The make and model of the plane
+    Invariant: type is a string
+    
+    Attribute capability: The flight rules the plane is equipped for
+    Invariant: capability is a string ('VFR' or 'IFR')
+    
+    Attribute advanced, multiengine: Whether the plane requires these endorsements
+    Invariant: each is a boolean
+    
+    Attribute annual: The last annual inspection before the audit
+    Invariant: annual is an int (a wall-clock time, or NEVER if unknown)
+    
+    Attribute hours: The hours flown since the last 100 hour inspection, before the audit
+    Invariant: hours is a float >= 0
+    """
+    __slots__ = ('id','type','capability','advanced','multiengine','annual','hours','_row')
+
+    def __init__(self, row):
+        """
+        Initializes a plane from the given row.
+        
+        Parameter row: The school airplane
+        Precondition: row is a 7-element list of strings (a row of fleet.csv)
+        """
+        self.id = sys.intern(row[0])
+        self.type = row[1]
+        self.capability = row[2]
+        self.advanced = row[3] == 'Yes'
+        self.multiengine = row[4] == 'Yes'
+        self.annual = pilots.date_to_wall(row[5])
+        self.hours = float(row[6]) if row[6] != '' else 0.0
+        self._row = None
+        if self.to_row() != row:
+            self._row = tuple(row)
+
+    def __repr__(self):
+        """
+        Returns the unambiguous string representation of this plane.
+        """
+        return 'Plane(%r)' % self.to_row()
+
+    @property
+    def ifr_capable(self):
+        """
+        True if the plane is outfitted for IFR flight (read-only).
+        """
+        return self.capability == 'IFR'
+
+    def to_row(self):
+        """
+        Returns this plane as a 7-element list of strings (the original row).
+        """
+        if self._row != None:
+            return list(self._row)
+        return [self.id,self.type,self.capability,yes_no(self.advanced),yes_no(self.multiengine),
+                format_short_date(self.annual),format_hours(self.hours)]
+
+
+class Repair(object):
+    """
+    A class representing a row of repairs.csv.
+    
+    Attribute plane: The tail number of the plane
+    Invariant: plane is a string
+    
+    Attribute start: The day the plane entered the shop
+    Invariant: start is an int (a wall-clock time, or NEVER if unknown)
+    
+    Attribute end: The day the plane left the shop
+    Invariant: end is an int (a wall-clock time, or NEVER if unknown)
+    
+    Attribute description: The type of repair
+    Invariant: description is a string
+    """
+    __slots__ = ('plane','start','end','description','_row')
+
+    def __init__(self, row):
+        """
+        Initializes a repair from the given row.
+        
+        Parameter row: The repair
+        Precondition: row is a 4-element list of strings (a row of repairs.csv)
+        """
+        self.plane = sys.intern(row[0])
+        self.start = share_date(pilots.date_to_wall(row[1]))
+        self.end = share_date(pilots.date_to_wall(row[2]))
+        self.description = sys.intern(row[3])
+        self._row = None
+        if self.to_row() != row:
+            self._row = tuple(row)
+
+    def __repr__(self):
+        """
+        Returns the unambiguous string representation of this repair.
+        """
+        return 'Repair(%r)' % self.to_row()
+
+    def to_row(self):
+        """
+        Returns this repair as a 4-element list of strings (the original row).
+        """
+        if self._row != None:
+            return list(self._row)
+        return [self.plane,format_date(self.start),format_date(self.end),self.description]
+
+
+def yes_no(flag):
+    """
+    Returns 'Yes' if flag is True and 'No' otherwise.
+    
+    Parameter flag: The value to convert
+    Precondition: flag is a boolean
+    """
+    return 'Yes' if flag else 'No'
+
+
+def iter_records(filename, kind):
+    """
+    Generates the records of the CSV file filename, one at a time (skipping the header).
+    
+    Parameter filename: The file to read
+    Precondition: filename is a string naming a CSV file with a header
+    
+    Parameter kind: The record type
+    Precondition: kind is one of the record classes in this module
+    """
+    rows = utils.iter_csv(filename)
+    next(rows,None)
+    for row in rows:
+        yield kind(row)
+
+
+def read_records(filename, kind):
+    """
+    Returns the list of records in the CSV file filename (without the header).
+    
+    Parameter filename: The file to read
+    Precondition: filename is a string naming a CSV file with a header
+    
+    Parameter kind: The record type
+    Precondition: kind is one of the record classes in this module
+    """
+    return list(iter_records(filename,kind))
+
+
+def read_registry(filename, kind):
+    """
+    Returns a Registry of the records in the CSV file filename, keyed by their id.
+    
+    Parameter filename: The file to read
+    Precondition: filename is a string naming a CSV file with a header
+    
+    Parameter kind: The record type
+    Precondition: kind is Student, Instructor, or Plane
+    """
+    rows = utils.iter_csv(filename)
+    header = next(rows,[])
+    return utils.Registry([header]+[kind(row) for row in rows])
@@ -0,0 +1,820 @@
+"""
+Unit tests for the auditor.
+
+The tests audit a small synthetic dataset (see benchmarks/synthetic.py), written to
+a temporary folder that is removed when Python exits.  Most of the tests check that
+a faster way of auditing a dataset finds exactly the violations of the plain audit
+(the scalar engine, without a cache), row for row and in the same order.
+
+Run the tests with
+
+    python auditor --test
+
+Every test is also a function named test_*, so pytest can run this file directly.
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import os
+import os.path
+import sys
+import shutil
+import atexit
+import tempfile
+import calendar
+import datetime
+import threading
+import concurrent.futures
+import utils
+import pilots
+import endorsements
+import violations
+import vectorized
+import cache
+import checkpoint
+import database
+import records
+import inspections
+import memo
+import app
+
+# The synthetic dataset generator is part of the benchmark suite
+sys.path.insert(1,os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'benchmarks'))
+import synthetic
+
+
+# The number of lessons in the test dataset
+LESSONS = 2000
+# The seed of the test dataset, so that every run tests the same lessons
+SEED = 'tests'
+
+# The temporary folder with every test dataset (see make_dataset)
+_FOLDER = []
+
+
+def make_directory():
+    """
+    Returns a new empty directory in the temporary folder of the tests.
+    """
+    if len(_FOLDER) == 0:
+        _FOLDER.append(tempfile.mkdtemp(prefix='auditor-tests-'))
+        atexit.register(shutil.rmtree,_FOLDER[0],True)
+    return tempfile.mkdtemp(dir=_FOLDER[0])
+
+
+def make_dataset():
+    """
+    Returns a new directory with the test dataset.
+    
+    Every call writes a new copy of the dataset, so a test can change its files (or
+    leave a cache or checkpoint in it) without affecting the other tests.
+    """
+    directory = make_directory()
+    synthetic.generate_dataset(directory,LESSONS,seed=SEED)
+    return directory
+
+
+def append_lessons(directory, rows):
+    """
+    Appends rows to the lessons.csv of the dataset directory.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with a lessons.csv
+    
+    Parameter rows: The lessons to append
+    Precondition: rows is a list of 7-element lists of strings
+    """
+    with open(os.path.join(directory,violations.LESSONS),'a') as file:
+        for row in rows:
+            file.write(','.join(row)+'\n')
+
+
+def read_lessons(directory):
+    """
+    Returns the lessons of the dataset directory (without the header).
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with a lessons.csv
+    """
+    return utils.read_csv(os.path.join(directory,violations.LESSONS))[1:]
+
+
+def audit(directory, **options):
+    """
+    Returns the rows (header included) of the CSV file written by app.audit_dataset.
+    
+    Parameter directory: The dataset (or database) to audit
+    Precondition: directory is a string naming a dataset
+    
+    Parameter options: The other arguments of app.audit_dataset
+    Precondition: options are valid keyword arguments of app.audit_dataset
+    """
+    output = directory.rstrip(os.sep)+'-audit.csv'
+    app.audit_dataset(directory,output,**options)
+    return utils.read_csv(output)
+
+
+def strip_zone(row):
+    """
+    Returns a copy of the lesson row with the time zones removed from its timestamps.
+    
+    Parameter row: The lesson
+    Precondition: row is a lesson with strict ISO timestamps
+    """
+    return row[:3]+[row[3][:19],row[4][:19]]+row[5:]
+
+
+def odd_lessons(directory):
+    """
+    Returns lessons of directory with an invalid takeoff or a takeoff without a time zone.
+    
+    The result is a list of three rows: the first weather violation of the dataset
+    with an invalid takeoff, the same lesson without time zones, and the last lesson
+    without a weather violation, also without time zones.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory made by make_dataset
+    """
+    references = violations.load_weather_references(directory,use_cache=False)
+    lessons = read_lessons(directory)
+    bad = [row for row in lessons if violations.check_lesson(row,references) != '']
+    good = [row for row in lessons if violations.check_lesson(row,references) == '']
+    return [bad[0][:3]+['not-a-time']+bad[0][4:],strip_zone(bad[0]),strip_zone(good[-1])]
+
+
+def rollover_lessons(directory):
+    """
+    Returns lessons of directory whose takeoff is out of range, but only just.
+    
+    Each takeoff is a weather violation of the dataset with its day past the end of the
+    month, or its hour, minute, or second one past the largest value.  A parser that
+    only checks the form of a timestamp rolls it over into the next day or hour.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory made by make_dataset
+    """
+    references = violations.load_weather_references(directory,use_cache=False)
+    lessons = read_lessons(directory)
+    bad = [row for row in lessons if violations.check_lesson(row,references) != '']
+    result = []
+    for row in bad[:8]:
+        takeoff = row[3]
+        for changed in (takeoff[:5]+'02-30'+takeoff[10:],takeoff[:5]+'04-31'+takeoff[10:],
+                        takeoff[:5]+'02-29'+takeoff[10:],takeoff[:11]+'24'+takeoff[13:],
+                        takeoff[:14]+'60'+takeoff[16:],takeoff[:17]+'99'+takeoff[19:]):
+            result.append(row[:3]+[changed]+row[4:])
+    return result
+
+
+def test_odd_takeoffs():
+    """
+    Tests the weather audit of lessons with an invalid takeoff or no time zone.
+    
+    A takeoff without a time zone is in the time zone of the dataset, so it has the
+    same violation as the lesson with the time zone.  A lesson with an invalid takeoff
+    has no minimums, so it has no weather violation.
+    """
+    directory = make_dataset()
+    references = violations.load_weather_references(directory,use_cache=False)
+    for row in read_lessons(directory)[::20]:
+        assert violations.check_lesson(strip_zone(row),references) == \
+            violations.check_lesson(row,references)
+
+    invalid, naive, other = odd_lessons(directory)
+    violation = violations.check_lesson(naive,references)
+    assert violation != ''
+    assert violations.check_lesson(invalid,references) == ''
+    assert violations.check_lesson(other,references) == ''
+    
+    # The whole audit (which used to stop with a TypeError)
+    expected = audit(directory,use_cache=False)
+    append_lessons(directory,[invalid,naive,other])
+    result = audit(directory,use_cache=False)
+    assert len(result) > len(expected)
+    assert naive+[violation] in result
+    assert not invalid+[violation] in result
+
+
+def test_numpy_engine():
+    """
+    Tests that the numpy engine finds exactly the violations of the scalar engine.
+    
+    The lessons are checked in several chunks, and include the lessons of odd_lessons
+    and rollover_lessons.
+    """
+    if vectorized.numpy == None:
+        print('Skipping the numpy engine (NumPy is not installed).')
+        return
+    
+    directory = make_dataset()
+    append_lessons(directory,odd_lessons(directory)+rollover_lessons(directory))
+    expected = audit(directory,use_cache=False)
+    size = vectorized.CHUNK_SIZE
+    try:
+        vectorized.CHUNK_SIZE = 300
+        assert audit(directory,engine='numpy',use_cache=False) == expected
+    finally:
+        vectorized.CHUNK_SIZE = size
+
+
+def test_warm_cache():
+    """
+    Tests that an audit with a warm cache finds exactly the violations of a plain audit.
+    
+    The cache entries must load (not be rebuilt), and a damaged entry must be rebuilt
+    rather than loaded.
+    """
+    directory = make_dataset()
+    expected = audit(directory,use_cache=False)
+    assert audit(directory) == expected
+    folder = cache.cache_dir(directory)
+    entries = sorted(name for name in os.listdir(folder) if name.endswith(cache.DATA_SUFFIX))
+    assert entries == ['daycycle.data','minimums.data','timelines.data','weather.data']
+    assert audit(directory) == expected
+    
+    # Entries are data; a damaged one is ignored
+    path = os.path.join(folder,'timelines'+cache.DATA_SUFFIX)
+    with open(path,'rb') as file:
+        data = file.read()
+    assert data.startswith(b'{')
+    with open(path,'wb') as file:
+        file.write(data[:-1]+bytes([data[-1] ^ 1]))
+    assert audit(directory) == expected
+    with open(path,'rb') as file:
+        assert file.read() == data
+    
+    # Clearing removes the entries and stray temporary files, but not the checkpoint
+    audit(directory,incremental=True)
+    assert os.path.isfile(checkpoint.checkpoint_file(directory))
+    with open(os.path.join(folder,'weather.data.123.tmp'),'wb') as file:
+        file.write(b'partial')
+    assert cache.clear(directory) == 4
+    assert os.listdir(folder) == [checkpoint.CHECKPOINT]
+    assert cache.clear(directory) == 0
+    os.remove(checkpoint.checkpoint_file(directory))
+    audit(directory)
+    assert cache.clear(directory) == 4
+    assert not os.path.exists(folder)
+
+
+def test_incremental():
+    """
+    Tests that incremental audits find exactly the violations of a plain audit.
+    
+    The dataset is audited with its last lessons held back, then again after they are
+    appended, after lessons that take off too early are appended, and after a reference
+    file is edited.
+    """
+    directory = make_dataset()
+    lessons = read_lessons(directory)
+    filename = os.path.join(directory,violations.LESSONS)
+    with open(filename,'rb') as file:
+        lines = file.readlines()
+    with open(filename,'wb') as file:
+        file.writelines(lines[:-300])
+    
+    expected = audit(directory,use_cache=False)
+    assert audit(directory,incremental=True) == expected
+    assert audit(directory,incremental=True) == expected
+    assert checkpoint.load_checkpoint(directory)['rows'] == len(lessons)-300
+    
+    # The new lessons are checked from the checkpoint
+    append_lessons(directory,lessons[-300:])
+    expected = audit(directory,use_cache=False)
+    assert audit(directory,incremental=True) == expected
+    state = checkpoint.load_checkpoint(directory)
+    assert state['rows'] == len(lessons)
+    assert state['offset'] == os.path.getsize(filename)
+    
+    # These lessons force a full audit
+    append_lessons(directory,odd_lessons(directory))
+    expected = audit(directory,use_cache=False)
+    assert audit(directory,incremental=True) == expected
+    
+    # So does a change to the minimums
+    path = os.path.join(directory,violations.MINIMUMS)
+    with open(path) as file:
+        text = file.read()
+    with open(path,'w') as file:
+        file.write(text.replace('Student,VMC,Pattern,Day,2000,5,20,8',
+                                'Student,VMC,Pattern,Day,2000,5,20,1'))
+    result = audit(directory,use_cache=False)
+    assert result != expected
+    assert audit(directory,incremental=True) == result
+
+
+def test_database():
+    """
+    Tests that the audit of a database finds exactly the violations of a plain audit.
+    
+    With filters, the violations must be those of the plain audit for the lessons that
+    match the filters (the inspections still count the hours of the other lessons).
+    """
+    directory = make_dataset()
+    append_lessons(directory,odd_lessons(directory))
+    expected = audit(directory,use_cache=False)
+    assert len(expected) > 1
+    filename = directory+app.DATABASE_SUFFIX
+    assert database.import_dataset(directory,filename) == len(read_lessons(directory))
+    assert audit(filename) == expected
+    
+    lessons = read_lessons(directory)
+    student, plane = expected[1][:2]
+    timezone = utils.read_json(os.path.join(directory,violations.DAYCYCLE))['timezone']
+    period = {'from': lessons[len(lessons)//3][3][:10], 'to': lessons[2*len(lessons)//3][3][:10]}
+    start = utils.str_to_time(period['from'],timezone).timestamp()
+    end = utils.str_to_time(period['to'],timezone).timestamp()
+    
+    def during(row):
+        when = utils.parse_iso(row[3])
+        if when == None:
+            return False
+        epoch = when[0] if when[1] != None else utils.wall_to_epoch(when[0],timezone)
+        return start <= epoch < end
+    
+    cases = [({'student': student}, lambda row: row[0] == student),
+             ({'plane': plane, 'student': student}, lambda row: row[:2] == [student,plane]),
+             (period, during)]
+    for filters, matches in cases:
+        result = audit(filename,filters=filters)
+        assert result == expected[:1]+[row for row in expected[1:] if matches(row)]
+        assert len(result) > 1
+
+
+def test_repair_index():
+    """
+    Tests the queries of inspections.RepairIndex against a search of every repair.
+    
+    The repairs of the first plane overlap, nest, and run back to back.  The index must
+    also agree with the shop check of the inspection sweep on the test dataset.
+    """
+    timezone = 'America/New_York'
+    rows = [['N1','2019-01-01','2019-01-05','100 hour inspection'],
+            ['N1','2019-01-05','2019-01-07','minor repair'],
+            ['N1','2019-01-02','2019-01-20','annual inspection'],
+            ['N1','2019-01-03','2019-01-04','minor repair'],
+            ['N1','2019-02-01','2019-02-03','minor repair'],
+            ['N1','2019-03-01','2019-03-01','minor repair'],
+            ['N2','2019-01-10','2019-01-12','100 hour inspection']]
+    repairs = [records.Repair(row) for row in rows]
+    index = inspections.RepairIndex(repairs,timezone)
+    windows = []
+    for repair in repairs:
+        start = utils.wall_to_epoch(repair.start,timezone)
+        end = utils.wall_to_epoch(repair.end,timezone)
+        if start < end:
+            windows.append((start,end,repair))
+    windows.sort(key=lambda window: window[:2])
+    
+    first = int(utils.str_to_time('2018-12-31',timezone).timestamp())
+    times = [first+hours*3600 for hours in range(0,24*70,6)]
+    for tail in ('N1','N2','N3'):
+        for time in times:
+            expected = any(w[2].plane == tail and w[0] <= time < w[1] for w in windows)
+            assert index.is_grounded(tail,time) == expected
+        for start in times[::3]:
+            for end in times[::5]:
+                if start <= end:
+                    expected = [w[2] for w in windows if w[2].plane == tail and w[0] < end
+                                and w[1] > start]
+                    assert index.overlapping_repairs(tail,start,end) == expected
+    
+    # Many short repairs nested in a long one (the max tree skips the ones that ended)
+    days = [records.Repair(['N4','2019-01-01','2019-12-31','annual inspection'])]
+    for month in range(1,13):
+        for day in (1,10,20):
+            start = '2019-%02d-%02d' % (month,day)
+            end = '2019-%02d-%02d' % (month,day+5)
+            days.append(records.Repair(['N4',start,end,'minor repair']))
+    nested = inspections.RepairIndex(days,timezone)
+    for month in range(1,13):
+        for day in (3,12,26):
+            time = int(utils.str_to_time('2019-%02d-%02d' % (month,day),timezone).timestamp())
+            expected = [days[0]]+([] if day == 26 else [days[3*month-2+(day > 10)]])
+            expected.sort(key=lambda repair: (repair.start,repair.end))
+            assert nested.overlapping_repairs('N4',time,time+1) == expected
+    tree = inspections.build_max_tree([5,1,7,3,9,2])
+    assert inspections.search_max_tree(tree,6,2) == [0,2,3,4]
+    assert inspections.search_max_tree(tree,4,4) == [0,2]
+    assert inspections.search_max_tree(tree,6,9) == []
+    assert inspections.search_max_tree(inspections.build_max_tree([]),0,0) == []
+    
+    # Back to back repairs, and dates in the time zone of the index
+    assert index.is_grounded('N1',utils.str_to_time('2019-01-19T23:59'))
+    assert not index.is_grounded('N1',utils.str_to_time('2019-01-20T00:00'))
+    assert index.overlapping_repairs('N1',times[0],utils.str_to_time('2019-01-02')) == \
+        repairs[:1]
+    
+    # The sweep of the test dataset, and list_repairs
+    directory = make_dataset()
+    index = inspections.read_repair_index(directory)
+    lessons = [records.Lesson(row) for row in read_lessons(directory)]
+    planes = records.read_registry(os.path.join(directory,inspections.PLANES),records.Plane)
+    repairs = records.read_records(os.path.join(directory,inspections.REPAIRS),records.Repair)
+    found = dict(inspections.sweep_inspections(lessons,repairs,planes,index.timezone))
+    for pos in range(len(lessons)):
+        grounded = found.get(pos,0) & inspections.GROUNDED != 0
+        assert index.is_grounded(lessons[pos].plane,lessons[pos].takeoff) == grounded
+    
+    plane = repairs[0].plane
+    start = repairs[0].to_row()[1]
+    grounded, result = inspections.list_repairs(directory,plane,start)
+    assert grounded and repairs[0].to_row() in result
+    grounded, result = inspections.list_repairs(directory,plane,'2000-01-01',start)
+    assert not grounded and result == []
+
+
+def inspect(fleet, repairs, lessons):
+    """
+    Returns the inspection violations of a small dataset with the given files.
+    
+    The time zone of the dataset is America/New_York.
+    
+    Parameter fleet: The rows of fleet.csv (without the header)
+    Precondition: fleet is a list of 7-element lists of strings
+    
+    Parameter repairs: The rows of repairs.csv (without the header)
+    Precondition: repairs is a list of 4-element lists of strings
+    
+    Parameter lessons: The rows of lessons.csv (without the header)
+    Precondition: lessons is a list of 7-element lists of strings
+    """
+    directory = make_directory()
+    utils.write_csv([['TAIL NO','TYPE','CAPABILITY','ADVANCED','MULTIENGINE','ANNUAL','HOURS']]+
+                    fleet,os.path.join(directory,inspections.PLANES))
+    utils.write_csv([['TAIL NO','IN DATE','OUT DATE','DESCRIPTION']]+repairs,
+                    os.path.join(directory,inspections.REPAIRS))
+    utils.write_csv([['STUDENT','AIRPLANE','INSTRUCTOR','TAKEOFF','LANDING','FILED','AREA']]+
+                    lessons,os.path.join(directory,inspections.LESSONS))
+    with open(os.path.join(directory,inspections.DAYCYCLE),'w') as file:
+        file.write('{"timezone": "America/New_York"}')
+    return inspections.list_inspection_violations(directory)
+
+
+def flight(plane, takeoff, landing):
+    """
+    Returns a lesson row for the plane, from takeoff to landing (in Eastern Standard Time).
+    
+    Parameter plane: The tail number
+    Precondition: plane is a string
+    
+    Parameter takeoff: The takeoff, as 'YYYY-MM-DDTHH:MM'
+    Precondition: takeoff is a string
+    
+    Parameter landing: The landing, as 'YYYY-MM-DDTHH:MM'
+    Precondition: landing is a string
+    """
+    return ['S00001',plane,'I001',takeoff+':00-05:00',landing+':00-05:00','VFR','Pattern']
+
+
+def test_inspections():
+    """
+    Tests the inspection audit at the limits of each rule.
+    
+    The hours and the annual start from fleet.csv.  Exactly 100 hours and exactly 365
+    days are allowed.  A plane is in the shop from the start of the IN DATE until the
+    start of the OUT DATE, and leaving the shop resets the hours (and the annual, for an
+    annual inspection).  The lessons are also audited in reverse order, which the sweep
+    must put back in time order.
+    """
+    fleet = [['N100','Cessna 152','VFR','No','No','2016-01-22','98'],
+             ['N200','Cessna 152','VFR','No','No','2016-06-01','150'],
+             ['N300','Cessna 152','VFR','No','No','2016-06-01','0']]
+    # The hours: 98 + 2 is exactly 100, and one more hour is over
+    lessons = [flight('N100','2017-01-02T08:00','2017-01-02T10:00'),
+               flight('N100','2017-01-03T08:00','2017-01-03T09:00')]
+    assert inspect(fleet,[],lessons) == [lessons[1]+['Inspection']]
+    
+    # The annual: 2017-01-21 is 365 days after 2016-01-22 (a leap year), 2017-01-22 is 366
+    lessons = [flight('N300','2017-01-21T08:00','2017-01-21T09:00'),
+               flight('N300','2017-01-22T08:00','2017-01-22T09:00')]
+    fleet[2][5] = '2016-01-22'
+    assert inspect(fleet,[],lessons) == [lessons[1]+['Annual']]
+    fleet[2][5] = '2016-06-01'
+    
+    # Lessons just before, inside, and just after a repair window, and back to back repairs
+    repairs = [['N300','2017-02-10','2017-02-12','minor repair'],
+               ['N300','2017-02-12','2017-02-14','minor repair'],
+               ['N200','2017-02-10','2017-02-12','minor repair']]
+    lessons = [flight('N300','2017-02-09T23:00','2017-02-09T23:30'),
+               flight('N300','2017-02-10T00:00','2017-02-10T01:00'),
+               flight('N300','2017-02-12T00:00','2017-02-12T01:00'),
+               flight('N300','2017-02-13T23:00','2017-02-13T23:30'),
+               flight('N300','2017-02-14T00:00','2017-02-14T01:00'),
+               flight('N200','2017-02-09T12:00','2017-02-09T13:00'),
+               flight('N200','2017-02-11T12:00','2017-02-11T13:00'),
+               flight('N200','2017-02-12T12:00','2017-02-12T13:00')]
+    expected = [lessons[1]+['Grounded'],lessons[2]+['Grounded'],lessons[3]+['Grounded'],
+                lessons[5]+['Inspection'],lessons[6]+['Maintenance']]
+    assert inspect(fleet,repairs,lessons) == expected
+    assert inspect(fleet,repairs,lessons[::-1]) == expected[::-1]
+    
+    # An annual inspection resets the annual: 2018-02-01 is 365 days after 2017-02-01
+    repairs = [['N300','2017-01-30','2017-02-01','annual inspection']]
+    lessons = [flight('N300','2017-05-31T08:00','2017-05-31T09:00'),
+               flight('N300','2018-02-01T08:00','2018-02-01T09:00'),
+               flight('N300','2018-02-02T08:00','2018-02-02T09:00')]
+    assert inspect(fleet,repairs,lessons) == [lessons[2]+['Annual']]
+    
+    # The stream gives the same violations as the sweep, even with a small window
+    directory = make_dataset()
+    lessons = records.read_records(os.path.join(directory,inspections.LESSONS),records.Lesson)
+    planes = records.read_registry(os.path.join(directory,inspections.PLANES),records.Plane)
+    repairs = records.read_records(os.path.join(directory,inspections.REPAIRS),records.Repair)
+    timezone = utils.read_json(os.path.join(directory,inspections.DAYCYCLE))['timezone']
+    expected = [lessons[pos].to_row()+[inspections.get_label(problems)] for pos, problems
+                in inspections.sweep_inspections(lessons,repairs,planes,timezone)]
+    assert len(expected) > 0
+    assert inspections.list_inspection_violations(directory) == expected
+    window = inspections.REORDER_WINDOW
+    try:
+        inspections.REORDER_WINDOW = 5
+        assert inspections.stream_inspections(lessons,repairs,planes,timezone) == expected
+        assert inspections.stream_inspections(lessons[::-1],repairs,planes,timezone) == None
+        
+        # So the audit falls back to the sweep
+        rows = read_lessons(directory)
+        utils.write_csv([['STUDENT','AIRPLANE','INSTRUCTOR','TAKEOFF','LANDING','FILED','AREA']]+
+                        rows[::-1],os.path.join(directory,inspections.LESSONS))
+        reverse = records.read_records(os.path.join(directory,inspections.LESSONS),records.Lesson)
+        expected = [reverse[pos].to_row()+[inspections.get_label(problems)] for pos, problems
+                    in inspections.sweep_inspections(reverse,repairs,planes,timezone)]
+        assert inspections.list_inspection_violations(directory) == expected
+    finally:
+        inspections.REORDER_WINDOW = window
+
+
+def test_credential_times():
+    """
+    Tests a takeoff at exactly the time of an instrument rating or an endorsement.
+    
+    The rating and the endorsements only count after that time, in pilots and in the
+    credential bits of endorsements.
+    """
+    student = ['S00001','Doe','Jane','2015-01-01','2015-02-01','2015-03-01','2015-04-01',
+               '2016-05-01','2016-05-01','2016-05-01']
+    timeline = pilots.Timeline(student)
+    zone = datetime.timezone(datetime.timedelta(hours=-4))
+    exact = datetime.datetime(2016,5,1,tzinfo=zone)
+    for takeoff, expected in ((exact-datetime.timedelta(minutes=1),False),(exact,False),
+                              (exact+datetime.timedelta(minutes=1),True)):
+        for check in (pilots.has_instrument_rating,pilots.has_advanced_endorsement,
+                      pilots.has_multiengine_endorsement):
+            assert check(takeoff,student) == expected
+            assert check(takeoff,timeline) == expected
+        bits = endorsements.get_student_bits(timeline,pilots.wall_time(takeoff))
+        everything = endorsements.ADVANCED | endorsements.MULTIENGINE | endorsements.INSTRUMENT
+        assert bits == (everything if expected else 0)
+
+
+def test_memo():
+    """
+    Tests the least-recently-used memos of memo.py, and the memo of weather violations.
+    
+    A memo must evict the result used least recently (not the one added first), keep
+    its counters, shrink when resized, do nothing at size 0, and give the right results
+    to many threads at once.  An audit with the weather memo on must find exactly the
+    violations of an audit with it off (the default).
+    """
+    calls = []
+    def square(x):
+        calls.append(x)
+        return x*x
+    
+    # A hit moves the key to the end, so the least recently used key is evicted
+    squares = memo.Memo('test_squares',3)
+    assert [squares.lookup(x,square,x) for x in (1,2,3)] == [1,4,9]
+    assert squares.lookup(1,square,1) == 1
+    assert squares.lookup(4,square,4) == 16
+    assert list(squares._results) == [3,1,4]
+    assert squares.lookup(2,square,2) == 4
+    assert calls == [1,2,3,4,2]
+    assert (squares.hits,squares.misses,squares.evictions,len(squares)) == (1,5,2,3)
+    assert squares.to_json() == {'size': 3, 'entries': 3, 'hits': 1, 'misses': 5,
+                                 'evictions': 2, 'hit_rate': 0.1667}
+    
+    # Shrinking forgets the least recently used results; growing forgets nothing
+    squares.lookup(1,square,1)
+    squares.resize(1)
+    assert list(squares._results) == [1]
+    assert squares.evictions == 4
+    squares.resize(5)
+    assert list(squares._results) == [1] and squares.evictions == 4
+    squares.clear()
+    assert squares.to_json() == {'size': 5, 'entries': 0, 'hits': 0, 'misses': 0,
+                                 'evictions': 0, 'hit_rate': None}
+    
+    # Size 0 computes every result and keeps none
+    del calls[:]
+    squares.resize(0)
+    assert [squares.lookup(2,square,2) for x in range(3)] == [4,4,4]
+    assert calls == [2,2,2] and len(squares) == 0
+    assert (squares.hits,squares.misses,squares.evictions) == (0,3,0)
+    
+    # Memos are shared by name, and get_memo resizes an existing memo
+    shared = memo.get_memo('test_shared',2)
+    assert memo.get_memo('test_shared') is shared and shared.size == 2
+    assert memo.get_memo('test_shared',7) is shared and shared.size == 7
+    assert memo.get_stats()['test_shared'] == shared.to_json()
+    
+    # Concurrent lookups get the right results, and the counters add up
+    lock = threading.Lock()
+    computed = []
+    def cube(x):
+        with lock:
+            computed.append(x)
+        return x*x*x
+    for size in (16,200):
+        cubes = memo.Memo('test_cubes',size)
+        del computed[:]
+        keys = [(x*7919) % 100 for x in range(4000)]
+        with concurrent.futures.ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda x: cubes.lookup(x,cube,x),keys))
+        assert results == [x*x*x for x in keys]
+        assert cubes.hits+cubes.misses == len(keys)
+        assert cubes.misses == len(computed) and len(cubes) == min(size,100)
+        # Every result kept was computed by a miss, and a result is kept at most once
+        assert len(cubes)+cubes.evictions <= cubes.misses
+        assert cubes.evictions > 0 if size < 100 else cubes.evictions == 0
+        assert all(cubes._results[key] == key*key*key for key in cubes._results)
+    
+    # The weather memo is off by default, and does not change the violations
+    directory = make_dataset()
+    weather = memo.get_memo(violations.WEATHER_MEMO)
+    assert violations.WEATHER_MEMO_SIZE == 0 and weather.size == 0
+    expected = audit(directory,use_cache=False)
+    assert len(weather) == 0 and weather.hits == 0
+    try:
+        assert audit(directory,use_cache=False,memo_size=64) == expected
+        assert weather.size == 64 and 0 < len(weather) <= 64
+        assert weather.hits > 0 and weather.evictions > 0
+    finally:
+        weather.resize(violations.WEATHER_MEMO_SIZE)
+        weather.clear()
+
+
+def test_minimums_table():
+    """
+    Tests that pilots.MinimumsTable gives the answers of pilots.get_minimums.
+    
+    Every certification, area, and condition is compared, for the minimums of a
+    dataset and for a table with every kind of row (so some queries match no row).
+    Queries that are not compiled (an unusual area, or daytime None) must fall back to
+    get_minimums and be remembered.
+    """
+    header = ['CATEGORY','CONDITIONS','AREA','TIME','CEILING','VISIBILITY','WIND','CROSSWIND']
+    every = [header,
+             ['Dual','VMC','Any','Day',1000,3,30,15],
+             ['Student','VMC','Local','Day',2000,5,20,8],
+             ['Student','IMC','Cross Country','Day',800,2,25,10],
+             ['Certified','VMC','Local','Night',2500,5,20,10],
+             ['Certified','VMC','Pattern','Day',1500,4,22,12],
+             ['50 Hours','VMC','Any','Night',1800,4,25,12],
+             ['50 Hours','IMC','Practice Area','Day',600,1,30,15]]
+    tables = [utils.read_csv(os.path.join(make_dataset(),violations.MINIMUMS)),every]
+    for minimums in tables:
+        table = pilots.MinimumsTable(minimums)
+        restored = cache.make_value(pilots.MinimumsTable,cache.get_state(table))
+        for cert in range(pilots.PILOT_INVALID,pilots.PILOT_50_HOURS+1):
+            for area in pilots.AREAS+('Local','Any'):
+                for instructed in (True,False):
+                    for vfr in (True,False):
+                        for daytime in (True,False,None):
+                            expected = pilots.get_minimums(cert,area,instructed,vfr,daytime,
+                                                           minimums)
+                            key = (cert,area,instructed,vfr,daytime)
+                            compiled = key in table.table
+                            assert compiled == (area in pilots.AREAS and daytime != None)
+                            assert table.get(*key) == expected
+                            assert key in table.table and table.table[key] == expected
+                            assert restored.get(*key) == expected
+    
+    # The table with every kind of row has answers and misses (None) alike
+    table = pilots.MinimumsTable(every)
+    assert table.get(pilots.PILOT_NOVICE,'Pattern',False,True,True) == None
+    assert table.get(pilots.PILOT_NOVICE,'Pattern',True,True,True) == [1000,3,30,15]
+    assert table.get(pilots.PILOT_50_HOURS,'Pattern',False,True,False) == [1800,4,25,12]
+
+
+def test_registry():
+    """
+    Tests that utils.Registry finds the rows that utils.get_for_id finds.
+    
+    A students table with repeated identifiers is read as rows and as records.  The
+    first row of each identifier must win, the repeated identifiers must be listed once
+    each in order of first repetition, and get_many must give None for missing ids.
+    """
+    directory = make_dataset()
+    filename = os.path.join(directory,violations.STUDENTS)
+    table = utils.read_csv(filename)
+    first, second, third = table[1], table[2], table[3]
+    repeats = [[second[0],'Second']+second[2:],[first[0],'First']+first[2:],
+               [second[0],'Third']+second[2:]]
+    utils.write_csv(table+repeats,filename)
+    table = utils.read_csv(filename)
+    
+    rows = utils.read_registry(filename)
+    students = records.read_registry(filename,records.Student)
+    assert rows.header == table[0] and students.header == table[0]
+    assert rows.duplicates == [second[0],first[0]]
+    assert students.duplicates == rows.duplicates
+    assert len(rows) == len(table)-1-len(repeats) and len(students) == len(rows)
+    for row in table[1:]:
+        expected = utils.get_for_id(row[0],table)
+        assert row[0] in rows and rows.get(row[0]) == expected
+        assert row[0] in students and students.get(row[0]).last == expected[1]
+    assert rows.get(second[0])[1] == second[1] and rows.get(first[0])[1] == first[1]
+    
+    # Missing identifiers give None, in place
+    ids = [third[0],'S99999',first[0],'',third[0]]
+    assert rows.get_many(ids) == [third,None,first,None,third]
+    assert [None if row == None else row.id for row in students.get_many(ids)] == [
+            third[0],None,first[0],None,third[0]]
+    assert not 'S99999' in rows and rows.get('S99999') == None
+    assert utils.get_for_id('S99999',table) == None
+    assert rows.get_many([]) == []
+
+
+def test_daycycle_table():
+    """
+    Tests that utils.DaycycleTable gives the answers of the original utils.daytime.
+    
+    Times every few minutes (and exactly at sunrise and sunset) are checked on the days
+    that daylight savings begins and ends, the days around them, and days that have no
+    daycycle entry.  Each time is checked without a time zone, in the daycycle time
+    zone, in UTC, and with a fixed offset from another zone.
+    """
+    directory = make_dataset()
+    daycycle = utils.read_json(os.path.join(directory,violations.DAYCYCLE))
+    timezone = daycycle['timezone']
+    years = sorted(int(year) for year in daycycle if year.isdecimal())
+    
+    # The days on which the offset at noon changes (daylight savings begins or ends)
+    def noon_offset(date):
+        return utils.localize(datetime.datetime.combine(date,datetime.time(12)),timezone).utcoffset()
+    changes = []
+    date = datetime.date(years[0],1,2)
+    while date.year <= years[-1]:
+        if noon_offset(date) != noon_offset(date-datetime.timedelta(days=1)):
+            changes.append(date)
+        date += datetime.timedelta(days=1)
+    assert len(changes) == 2*len(years)
+    
+    # Remove a few entries, including a change day, so that those days are missing
+    removed = [changes[2],changes[3]+datetime.timedelta(days=1),datetime.date(years[1],7,4)]
+    for date in removed:
+        del daycycle[str(date.year)][date.strftime('%m-%d')]
+    table = utils.DaycycleTable(daycycle)
+    
+    one = datetime.timedelta(days=1)
+    days = set(removed)
+    for date in changes:
+        days.update([date-one,date,date+one])
+    days.update([datetime.date(years[0]-1,12,31),datetime.date(years[0],1,1),
+                 datetime.date(years[-1],12,31),datetime.date(years[-1]+1,1,1)])
+    utc = datetime.timezone.utc
+    other = datetime.timezone(datetime.timedelta(hours=-8))
+    codes = {True: utils.DAY, False: utils.NIGHT, None: utils.NO_DAYCYCLE}
+    checked = {True: 0, False: 0, None: 0}
+    for date in sorted(days):
+        start = datetime.datetime.combine(date,datetime.time())
+        times = [start+datetime.timedelta(minutes=minutes) for minutes in range(0,1440,7)]
+        entry = daycycle.get(str(date.year),{}).get(date.strftime('%m-%d'))
+        if entry != None:
+            for key in ('sunrise','sunset'):
+                exact = datetime.datetime.combine(date,datetime.time(int(entry[key][:2]),
+                                                                     int(entry[key][3:])))
+                times.extend([exact-datetime.timedelta(minutes=1),exact,
+                              exact+datetime.timedelta(minutes=1)])
+        for local in times:
+            aware = utils.localize(local,timezone)
+            for time in (local,aware,aware.astimezone(utc),aware.astimezone(other)):
+                expected = utils.daytime(time,daycycle)
+                assert utils.daytime(time,table) == expected, time
+                checked[expected] += 1
+            epoch = calendar.timegm(aware.utctimetuple())
+            offset = int(aware.utcoffset().total_seconds())
+            expected = utils.daytime(aware,daycycle)
+            assert table.is_daytime(epoch,offset) == expected
+            assert utils.daytimes([epoch],[offset],table)[0] == codes[expected]
+    assert all(count > 0 for count in checked.values())
+
+
+def test_all():
+    """
+    Runs every test of the auditor.
+    """
+    test_odd_takeoffs()
+    test_numpy_engine()
+    test_warm_cache()
+    test_incremental()
+    test_database()
+    test_repair_index()
+    test_inspections()
+    test_credential_times()
+    test_memo()
+    test_minimums_table()
+    test_registry()
+    test_daycycle_table()
+    print('All tests passed.')
@@ -15,9 +15,30 @@ Date: 2/1/23
 """
 import csv
 import json
-from dateutil.parser import parse
 import datetime
-import pytz
+import calendar
+import array
+import zoneinfo
+
+# NumPy is optional; the batch functions fall back to plain Python without it.  It is
+# slow to import, so it is only imported when a batch function first needs it.
+_NUMPY = []
+
+
+def load_numpy():
+    """
+    Returns the numpy module, or None if NumPy is not installed.
+    
+    NumPy is imported the first time this function is called, so that the application
+    does not pay for it unless a batch function (or the numpy engine) is used.
+    """
+    if not _NUMPY:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _NUMPY.append(numpy)
+    return _NUMPY[0]
 
 
 def read_csv(filename):
@@ -43,6 +64,26 @@ def read_csv(filename):
     return contents
 
 
+def iter_csv(filename):
+    """
+    Generates the rows of the CSV file filename, one at a time.
+    
+    This is the streaming form of read_csv.  It produces the same rows (starting with
+    the header), but only one row is in memory at a time.  The file is closed when
+    the generator is exhausted or closed.
+    
+    Parameter filename: The file to read
+    Precondition: filename is a string, referring to a file that exists, and that file 
+    is a valid CSV file
+    """
+    handle = open(filename, 'r')
+    try:
+        for row in csv.reader(handle):
+            yield row
+    finally:
+        handle.close()
+
+
 def write_csv(data,filename):
     """
     Writes the given data out as a CSV file filename.
@@ -69,6 +110,38 @@ def write_csv(data,filename):
     file.close()
 
 
+def stream_csv(rows,filename,header=None):
+    """
+    Writes the rows out as a CSV file filename as they are produced, returning the count.
+    
+    This is the streaming form of write_csv.  The rows may come from a generator, and
+    each row is written as soon as it is produced, so they are never all in memory at
+    once.  The header (if not None) is written first, but is not included in the count.
+    
+    Parameter rows: The rows to write
+    Precondition: rows is an iterable of lists
+    
+    Parameter filename: The file to write
+    Precondition: filename is a string representing a path to a file with extension
+    .csv or .CSV.  The file may or may not exist.
+    
+    Parameter header: The header row (OPTIONAL)
+    Precondition: header is None or a list of strings
+    """
+    count = 0
+    file = open(filename, 'w')
+    try:
+        wrapper = csv.writer(file)
+        if header != None:
+            wrapper.writerow(header)
+        for row in rows:
+            wrapper.writerow(row)
+            count += 1
+    finally:
+        file.close()
+    return count
+
+
 def read_json(filename):
     """
     Returns the contents read from the JSON file filename.
@@ -117,10 +190,15 @@ def str_to_time(timestamp,tzsource=None):
     """
     # HINT: Use the code from the previous exercise and add time zone handling.
     # Use localize if tzsource is a string; otherwise replace the time zone if not None
-    try:
-        d = parse(timestamp)
-    except:
-        return None
+    # Strict ISO timestamps do not need the general parser
+    fast = parse_iso_fast(timestamp)
+    if fast != None:
+        d = epoch_to_time(fast[0],fast[1])
+    else:
+        try:
+            d = parse_general(timestamp)
+        except:
+            return None
 
     if d.tzinfo != None:
         return d
@@ -129,14 +207,206 @@ def str_to_time(timestamp,tzsource=None):
         return d
 
     if type(tzsource) == str:
-        tz = pytz.timezone(tzsource)
-        d = tz.localize(d)
+        d = localize(d,tzsource)
     elif isinstance(tzsource, datetime.datetime):
         tz = tzsource.tzinfo
         d = d.replace(tzinfo = tz)
 
     return d
 
+# FAST TIMESTAMPS
+# The ordinal of the first day of the epoch (1970-01-01)
+EPOCH_ORDINAL = datetime.date(1970,1,1).toordinal()
+
+# Caches for parse_iso, mapping 'YYYY-MM-DD' to days since the epoch, and an offset
+# suffix (like '-05:00') to seconds.  There are only a few hundred of each per year.
+_DAYS = {}
+_OFFSETS = {'': None, 'Z': 0, '+00:00': 0}
+# Cached time zones for epoch_to_time, by offset in seconds
+_ZONES = {}
+# Cached time zones for get_zone, by name
+_NAMED_ZONES = {}
+
+
+def parse_general(timestamp):
+    """
+    Returns the datetime object for timestamp, using the general purpose parser.
+    
+    This is the parse function in dateutil.parser, which understands far more formats
+    than parse_iso_fast.  It is only imported the first time it is needed, since most
+    timestamps never get here.  The parser raises an exception on an invalid timestamp.
+    
+    Parameter timestamp: The time stamp to convert
+    Precondition: timestamp is a string
+    """
+    from dateutil.parser import parse
+    return parse(timestamp)
+
+
+def get_zone(timezone):
+    """
+    Returns the time zone object for the given name.
+    
+    The time zones are zoneinfo.ZoneInfo objects, cached so that there is one per name.
+    
+    Parameter timezone: The time zone
+    Precondition: timezone is a string naming a valid time zone
+    """
+    zone = _NAMED_ZONES.get(timezone)
+    if zone == None:
+        zone = zoneinfo.ZoneInfo(timezone)
+        _NAMED_ZONES[timezone] = zone
+    return zone
+
+
+def localize(local,timezone):
+    """
+    Returns the datetime object local (which has no time zone) in the given time zone.
+    
+    A wall-clock time that is skipped or repeated by a daylight savings change is read
+    as standard time.  This is the rule of localize in pytz (with is_dst False), which
+    earlier versions of this module used, so the results have not changed.
+    
+    Parameter local: The time to localize
+    Precondition: local is a datetime object without a time zone
+    
+    Parameter timezone: The time zone
+    Precondition: timezone is a string naming a valid time zone
+    """
+    result = local.replace(tzinfo=get_zone(timezone),fold=0)
+    if result.dst():
+        other = result.replace(fold=1)
+        if other.utcoffset() != result.utcoffset():
+            return other
+    return result
+
+
+def parse_iso_fast(timestamp):
+    """
+    Returns the tuple (epoch, offset) for a strict ISO-8601 timestamp, or None.
+    
+    This is the fast path of parse_iso.  It only understands timestamps of the form
+    'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM:SS', optionally followed by 'Z' or an offset
+    '+HH:MM'/'-HH:MM'.  It returns None for anything else (including invalid dates),
+    so that the caller can fall back to a general purpose parser.
+    
+    Parameter timestamp: The time stamp to convert
+    Precondition: timestamp is a string
+    """
+    date = timestamp[:10]
+    days = _DAYS.get(date)
+    if days == None:
+        if len(date) != 10 or date[4] != '-' or date[7] != '-' or not date[:4].isdecimal():
+            return None
+        try:
+            days = datetime.date(int(date[:4]),int(date[5:7]),int(date[8:])).toordinal()-EPOCH_ORDINAL
+        except ValueError:
+            return None
+        _DAYS[date] = days
+    
+    size = len(timestamp)
+    if size == 10:
+        return (days*86400,None)
+    if size < 19 or timestamp[10] != 'T' or timestamp[13] != ':' or timestamp[16] != ':':
+        return None
+    
+    clock = timestamp[11:13]+timestamp[14:16]+timestamp[17:19]
+    if not clock.isdecimal():
+        return None
+    hour = int(clock[:2])
+    mins = int(clock[2:4])
+    secs = int(clock[4:])
+    if hour > 23 or mins > 59 or secs > 59:
+        return None
+    
+    suffix = timestamp[19:]
+    if suffix in _OFFSETS:
+        offset = _OFFSETS[suffix]
+    elif (len(suffix) == 6 and suffix[0] in '+-' and suffix[3] == ':' and
+          suffix[1:3].isdecimal() and suffix[4:].isdecimal()):
+        offset = int(suffix[1:3])*3600+int(suffix[4:])*60
+        if suffix[0] == '-':
+            offset = -offset
+        _OFFSETS[suffix] = offset
+    else:
+        return None
+    
+    wall = days*86400+hour*3600+mins*60+secs
+    if offset == None:
+        return (wall,None)
+    return (wall-offset,offset)
+
+
+def parse_iso(timestamp):
+    """
+    Returns the tuple (epoch, offset) for the given timestamp (or None if it is invalid).
+    
+    The value epoch is the time as an int of seconds since 1970-01-01 UTC.  The value
+    offset is the UTC offset of the timestamp as an int of seconds, so epoch+offset is
+    the wall-clock time in the timestamp's own time zone.  If the timestamp has no time
+    zone, offset is None and epoch is the wall-clock time (as if it were UTC).
+    
+    Lesson timestamps are strict ISO-8601 (e.g. '2019-01-02T12:00:00-05:00'), and these
+    are converted with string slicing and cached lookups.  Anything else falls back to
+    the general purpose parser in dateutil.  Fractions of a second are dropped.
+    
+    Parameter timestamp: The time stamp to convert
+    Precondition: timestamp is a string
+    """
+    result = parse_iso_fast(timestamp)
+    if result != None:
+        return result
+    
+    try:
+        d = parse_general(timestamp)
+    except:
+        return None
+    
+    if d.tzinfo == None or d.utcoffset() == None:
+        return (calendar.timegm(d.timetuple()),None)
+    return (calendar.timegm(d.utctimetuple()),int(d.utcoffset().total_seconds()))
+
+
+def epoch_to_time(epoch,offset=None):
+    """
+    Returns the datetime object for the given epoch time and UTC offset.
+    
+    This reverses parse_iso.  If offset is None, the result has no time zone.  The
+    time zone objects are cached, so there is one per distinct offset.
+    
+    Parameter epoch: The time in seconds since 1970-01-01 UTC
+    Precondition: epoch is an int
+    
+    Parameter offset: The UTC offset in seconds (OPTIONAL)
+    Precondition: offset is None or an int
+    """
+    if offset == None:
+        return datetime.datetime(1970,1,1)+datetime.timedelta(seconds=epoch)
+    zone = _ZONES.get(offset)
+    if zone == None:
+        zone = datetime.timezone(datetime.timedelta(seconds=offset))
+        _ZONES[offset] = zone
+    return datetime.datetime.fromtimestamp(epoch,zone)
+
+
+def wall_to_epoch(wall,timezone):
+    """
+    Returns the epoch time for a wall-clock time in the given time zone.
+    
+    The wall-clock time is the number of seconds since 1970-01-01 00:00 in the time zone
+    (see pilots.wall_time), and so this localizes a time without a time zone, like the 
+    dates in repairs.csv.  Daylight savings is applied as in str_to_time.
+    
+    Parameter wall: The wall-clock time
+    Precondition: wall is an int
+    
+    Parameter timezone: The time zone
+    Precondition: timezone is a string naming a valid time zone
+    """
+    local = datetime.datetime(1970,1,1)+datetime.timedelta(seconds=wall)
+    return wall-int(localize(local,timezone).utcoffset().total_seconds())
+
+
 def daytime(time,daycycle):
     """
     Returns true if the time takes place during the day.
@@ -169,19 +439,28 @@ def daytime(time,daycycle):
     datetime objects from this set.  If the time parameter does not have a timezone,
     we assume that it is in the same timezone as the daycycle dictionary
     
+    The daycycle may also be a DaycycleTable compiled from the dictionary, which gives
+    the same answers without building any datetime objects.
+    
     Parameter time: The time to check
     Precondition: time is a datetime object
     
     Parameter daycycle: The daycycle dictionary
-    Precondition: daycycle is a valid daycycle dictionary, as described above
+    Precondition: daycycle is a valid daycycle dictionary, as described above, or a
+    DaycycleTable
     """
+    if isinstance(daycycle,DaycycleTable):
+        offset = time.utcoffset()
+        if offset == None:
+            return daycycle.is_daytime(calendar.timegm(time.timetuple()))
+        return daycycle.is_daytime(calendar.timegm(time.utctimetuple()),int(offset.total_seconds()))
+    
     # HINT: Use the code from the previous exercise to get sunset AND sunrise
     # Add a timezone to time if one is missing (the one from the daycycle)
     y = time.year
     md = time.strftime('%m')+'-'+time.strftime('%d')
     month = int(md[:2])
     day = int(md[3:])
-    dctz = pytz.timezone(daycycle['timezone'])    # grab daycycyle tz string and make it comparable
     #Get sunset and sunrise
     try:    
         sunset_str = daycycle[str(y)][md]["sunset"]
@@ -194,14 +473,160 @@ def daytime(time,daycycle):
 
     #check for tz and append, accordingly
     if time.tzinfo != None:                             # If time value includes a time zone
-        sunrise_t = dctz.localize(sunrise_t)
-        sunset_t= dctz.localize(sunset_t)    
+        sunrise_t = localize(sunrise_t,daycycle['timezone'])
+        sunset_t= localize(sunset_t,daycycle['timezone'])
     #check if time is between sunrise and sunset
     if time>sunrise_t and time<sunset_t:
         return True
     else:
         return False
 
+# The result codes of daytimes
+# The time is after sunrise and before sunset
+DAY = 1
+# The time is before sunrise or after sunset
+NIGHT = 0
+# There is no daycycle entry for the day of the time
+NO_DAYCYCLE = -1
+
+# Marks a day with no entry in a DaycycleTable
+MISSING_DAY = -2**62
+
+
+class DaycycleTable(object):
+    """
+    A class holding the sunrise and sunset of every day as integers.
+    
+    The table is compiled once from a daycycle dictionary (see daytime).  Every day is
+    numbered by its days since 1970-01-01, and the sunrise and sunset for day d are
+    stored at position d-first of flat arrays covering every year in the dictionary.
+    The times are seconds since the epoch, with the daycycle time zone (and so
+    daylight savings) already applied.  A day with no entry has MISSING_DAY.
+    
+    Checking a time is then one index and two integer comparisons.
+    
+    Attribute timezone: The name of the daycycle time zone
+    Invariant: timezone is a string
+    
+    Attribute first: The day number of the first position in the arrays
+    Invariant: first is an int
+    
+    Attribute sunrise, sunset: The sunrise and sunset of each day, in UTC
+    Invariant: sunrise and sunset are arrays of ints (seconds since the epoch)
+    
+    Attribute wall_sunrise, wall_sunset: The sunrise and sunset of each day, in local time
+    Invariant: wall_sunrise and wall_sunset are arrays of ints (wall-clock seconds)
+    """
+    
+    def __init__(self, daycycle):
+        """
+        Initializes the table for the given daycycle dictionary.
+        
+        Parameter daycycle: The daycycle dictionary
+        Precondition: daycycle is a valid daycycle dictionary (see daytime)
+        """
+        self.timezone = daycycle['timezone']
+        
+        entries = {}
+        for year in daycycle:
+            if not year.isdecimal():
+                continue
+            for md in daycycle[year]:
+                try:
+                    date = datetime.date(int(year),int(md[:2]),int(md[3:]))
+                    times = []
+                    for key in ('sunrise','sunset'):
+                        text = daycycle[year][md][key]
+                        local = datetime.datetime.combine(date,datetime.time(int(text[:2]),int(text[3:])))
+                        times.append(calendar.timegm(local.timetuple()))
+                        times.append(int(localize(local,self.timezone).timestamp()))
+                except:
+                    continue
+                entries[date.toordinal()-EPOCH_ORDINAL] = times
+        
+        self.first = min(entries) if entries else 0
+        size = max(entries)-self.first+1 if entries else 0
+        self.wall_sunrise = array.array('q',[MISSING_DAY])*size
+        self.sunrise = array.array('q',[MISSING_DAY])*size
+        self.wall_sunset = array.array('q',[MISSING_DAY])*size
+        self.sunset = array.array('q',[MISSING_DAY])*size
+        for day in entries:
+            pos = day-self.first
+            times = entries[day]
+            self.wall_sunrise[pos] = times[0]
+            self.sunrise[pos] = times[1]
+            self.wall_sunset[pos] = times[2]
+            self.sunset[pos] = times[3]
+    
+    def is_daytime(self, epoch, offset=None):
+        """
+        Returns True if the time takes place during the day (None if there is no entry).
+        
+        The day is the one on the wall clock of the time itself, as in daytime.  If
+        offset is None, the time has no time zone; epoch is then its wall-clock time
+        and it is compared against the local sunrise and sunset.
+        
+        Parameter epoch: The time in seconds since 1970-01-01 UTC
+        Precondition: epoch is an int
+        
+        Parameter offset: The UTC offset of the time in seconds (OPTIONAL)
+        Precondition: offset is None or an int
+        """
+        if offset == None:
+            pos = epoch//86400-self.first
+            if pos < 0 or pos >= len(self.sunrise) or self.sunrise[pos] == MISSING_DAY:
+                return None
+            return self.wall_sunrise[pos] < epoch < self.wall_sunset[pos]
+        
+        pos = (epoch+offset)//86400-self.first
+        if pos < 0 or pos >= len(self.sunrise):
+            return None
+        sunrise = self.sunrise[pos]
+        if sunrise == MISSING_DAY:
+            return None
+        return sunrise < epoch < self.sunset[pos]
+
+
+def daytimes(epochs,offsets,table):
+    """
+    Returns the day or night classification of many times at once.
+    
+    This is the batch form of daytime.  Element i of the result is DAY, NIGHT, or 
+    NO_DAYCYCLE (where daytime would return True, False, or None) for the time
+    epochs[i] with UTC offset offsets[i].
+    
+    If NumPy is installed, the result is a NumPy array computed without a Python loop.
+    Otherwise it is a list of ints.
+    
+    Parameter epochs: The times in seconds since 1970-01-01 UTC
+    Precondition: epochs is a sequence of ints
+    
+    Parameter offsets: The UTC offsets of the times in seconds
+    Precondition: offsets is a sequence of ints, the same length as epochs
+    
+    Parameter table: The compiled daycycle
+    Precondition: table is a DaycycleTable
+    """
+    numpy = load_numpy()
+    if numpy == None:
+        codes = {True: DAY, False: NIGHT, None: NO_DAYCYCLE}
+        return [codes[table.is_daytime(epoch,offset)] for epoch, offset in zip(epochs,offsets)]
+    
+    epochs = numpy.asarray(epochs,dtype=numpy.int64)
+    if len(table.sunrise) == 0:
+        return numpy.full(len(epochs),NO_DAYCYCLE,dtype=numpy.int8)
+    
+    pos = (epochs+numpy.asarray(offsets,dtype=numpy.int64))//86400-table.first
+    valid = (pos >= 0) & (pos < len(table.sunrise))
+    pos = numpy.where(valid,pos,0)
+    sunrise = numpy.frombuffer(table.sunrise,dtype=numpy.int64)[pos]
+    sunset = numpy.frombuffer(table.sunset,dtype=numpy.int64)[pos]
+    valid &= sunrise != MISSING_DAY
+    result = numpy.where((sunrise < epochs) & (epochs < sunset),DAY,NIGHT).astype(numpy.int8)
+    result[~valid] = NO_DAYCYCLE
+    return result
+
+
 def get_for_id(id,table):
     """
     Returns (a copy of) a row of the table with the given id.
@@ -216,9 +641,105 @@ def get_for_id(id,table):
     Parameter id: The id of the student or instructor
     Precondition: id is a string
     
+    If table is a Registry, this function uses its index instead of searching.
+    
     Parameter table: The 2-dimensional table of data
-    Precondition: table is a non-empty 2-dimension list of strings
+    Precondition: table is a non-empty 2-dimension list of strings, or a Registry
     """
+    if isinstance(table,Registry):
+        return table.get(id)
+    
     for row in range(len(table)):
         if id == table[row][0]:
             return table[row]
+
+
+class Registry(object):
+    """
+    A class providing lookup by identifier for a table of students, instructors, or planes.
+    
+    The function get_for_id searches the table from the top on every call.  A registry is
+    built once from the same table and stores every row in a dictionary keyed by the
+    identifier (the first element of the row), so that each lookup takes constant time.
+    
+    If an identifier appears more than once, the FIRST row wins (as with get_for_id) and
+    the identifier is recorded in the attribute duplicates.
+    
+    The rows may also be records (see records.py), which are keyed by their id attribute.
+    
+    Attribute header: The header row of the table
+    Invariant: header is a list of strings
+    
+    Attribute rows: The rows of the table by identifier
+    Invariant: rows is a dictionary whose keys are strings and whose values are rows
+    (lists of strings) whose first element is the key, or records whose id is the key
+    
+    Attribute duplicates: The identifiers that appear in more than one row
+    Invariant: duplicates is a list of strings, in order of first repetition
+    """
+    
+    def __init__(self, table):
+        """
+        Initializes a registry for the given table.
+        
+        Parameter table: The 2-dimensional table of data, including the header
+        Precondition: table is a non-empty list whose first element is the header, and
+        whose other elements are lists of strings or records with an id attribute
+        """
+        self.header = table[0]
+        self.rows = {}
+        self.duplicates = []
+        for row in table[1:]:
+            id = row[0] if isinstance(row,list) else row.id
+            if id in self.rows:
+                if not id in self.duplicates:
+                    self.duplicates.append(id)
+            else:
+                self.rows[id] = row
+    
+    def __len__(self):
+        """
+        Returns the number of distinct identifiers in this registry.
+        """
+        return len(self.rows)
+    
+    def __contains__(self, id):
+        """
+        Returns True if there is a row with the given identifier.
+        
+        Parameter id: The id of the student, instructor, or plane
+        Precondition: id is a string
+        """
+        return id in self.rows
+    
+    def get(self, id):
+        """
+        Returns the row with the given identifier, or None if there is no match.
+        
+        Parameter id: The id of the student, instructor, or plane
+        Precondition: id is a string
+        """
+        return self.rows.get(id)
+    
+    def get_many(self, ids):
+        """
+        Returns the rows for a sequence of identifiers, in the same order.
+        
+        Identifiers with no match produce None in the result.
+        
+        Parameter ids: The ids of the students, instructors, or planes
+        Precondition: ids is an iterable of strings
+        """
+        rows = self.rows
+        return [rows.get(id) for id in ids]
+
+
+def read_registry(filename):
+    """
+    Returns a Registry for the contents of the CSV file filename.
+    
+    Parameter filename: The file to read
+    Precondition: filename is a string, referring to a file that exists, and that file 
+    is a valid CSV file whose first column is an identifier
+    """
+    return Registry(read_csv(filename))
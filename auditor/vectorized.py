@@ -0,0 +1,340 @@
+"""
+Module to check weather violations for many lessons at once with arrays (OPTIONAL ENGINE)
+
+The function list_weather_violations in violations.py evaluates one lesson at a time,
+calling bad_visibility, bad_winds and bad_ceiling on the raw weather dictionaries.
+This module computes exactly the same result with NumPy.  The lessons, the weather
+observations and the compiled minimums are all loaded into arrays, and every step
+(parsing takeoffs, certifications, daytime, minimums, weather lookup, and the checks
+themselves) is an array operation.
+
+The lessons are streamed from lessons.csv CHUNK_SIZE at a time, and each chunk is
+checked on its own.  So the memory used does not grow with the size of the file (only
+the violations are kept), and the per-lesson work in Python is limited to reading the
+CSV rows and picking out their columns.
+
+This engine requires NumPy, which is not needed anywhere else in the auditor.  It
+is selected by passing engine='numpy' to app.discover_violations.
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import os.path
+import itertools
+import utils
+import pilots
+import violations
+import weatherstore
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# VIOLATION CODES
+# The violation labels, indexed by the codes computed in get_violation_codes
+LABELS = ('','Visibility','Winds','Ceiling','Weather','Unknown')
+# The lesson has no violation
+CODE_NONE = 0
+# The lesson violates more than one minimum
+CODE_WEATHER = 4
+# There is no weather report for the lesson
+CODE_UNKNOWN = 5
+
+# The width of a strict ISO timestamp with offset, like '2019-01-02T12:00:00-05:00'
+ISO_WIDTH = 25
+
+# The number of lessons checked at once (see list_weather_violations)
+CHUNK_SIZE = 4096
+# The number of days in each month of a common year (January is position 1)
+MONTH_DAYS = (0,31,28,31,30,31,30,31,31,30,31,30,31)
+
+# The NumPy layout of a weatherstore.RECORD
+if numpy != None:
+    RECORD_DTYPE = numpy.dtype([('time','<i8'),('visibility','<f8'),('wind','<f8'),
+                                ('gusts','<f8'),('crosswind','<f8'),('ceiling','<f8'),
+                                ('flags','u1'),('pad','V7')])
+    # The epoch of a timestamp that cannot be parsed (before any weather report)
+    INVALID_TIME = numpy.iinfo(numpy.int64).min
+
+
+def parse_iso_array(timestamps, timezone=None):
+    """
+    Returns the tuple (epochs, offsets) of NumPy arrays for a sequence of timestamps.
+    
+    This is the batch form of utils.parse_iso.  Strict ISO timestamps with an offset
+    are decoded arithmetically from their bytes, without a Python loop.  The dates and
+    clock times are checked as strictly as utils.parse_iso checks them (a real day of
+    the month, hours up to 23, minutes and seconds up to 59), so no timestamp rolls over
+    into the next day or hour.  Anything else is handed to utils.parse_iso one at a time.
+    A timestamp that cannot be parsed at all has offset 0 and epoch INVALID_TIME.
+    
+    A timestamp without a time zone is localized to timezone, as in violations.get_takeoff.
+    If timezone is None, it is read as UTC instead.
+    
+    Parameter timestamps: The time stamps to convert
+    Precondition: timestamps is a list of strings
+    
+    Parameter timezone: The time zone of timestamps without one (OPTIONAL)
+    Precondition: timezone is None or a string naming a valid time zone
+    """
+    count = len(timestamps)
+    lengths = numpy.fromiter(map(len,timestamps),dtype=numpy.int64,count=count)
+    strict = lengths == ISO_WIDTH
+    try:
+        raw = numpy.array(timestamps,dtype='S%d' % ISO_WIDTH)
+    except UnicodeEncodeError:
+        raw = numpy.array([text.encode('ascii','replace') for text in timestamps],dtype='S%d' % ISO_WIDTH)
+    data = raw.view(numpy.uint8).reshape(count,ISO_WIDTH).astype(numpy.int64)
+    digit = data-ord('0')
+
+    # Check the punctuation and the digits
+    for pos, char in ((4,'-'),(7,'-'),(10,'T'),(13,':'),(16,':'),(22,':')):
+        strict &= data[:,pos] == ord(char)
+    strict &= (data[:,19] == ord('+')) | (data[:,19] == ord('-'))
+    for pos in (0,1,2,3,5,6,8,9,11,12,14,15,17,18,20,21,23,24):
+        strict &= (digit[:,pos] >= 0) & (digit[:,pos] <= 9)
+
+    def number(start,width):
+        value = numpy.zeros(count,dtype=numpy.int64)
+        for pos in range(start,start+width):
+            value = value*10+digit[:,pos]
+        return value
+
+    year = number(0,4)
+    month = number(5,2)
+    day = number(8,2)
+    hour = number(11,2)
+    mins = number(14,2)
+    secs = number(17,2)
+    strict &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+    strict &= (hour <= 23) & (mins <= 59) & (secs <= 59)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    length = numpy.array(MONTH_DAYS,dtype=numpy.int64)[numpy.clip(month,0,12)]
+    strict &= day <= length+(leap & (month == 2))
+
+    # Days since the epoch (the days_from_civil algorithm)
+    shifted = year-(month <= 2)
+    era = shifted//400
+    yoe = shifted-era*400
+    doy = (153*numpy.where(month > 2,month-3,month+9)+2)//5+day-1
+    doe = yoe*365+yoe//4-yoe//100+doy
+    days = era*146097+doe-719468
+
+    offsets = number(20,2)*3600+number(23,2)*60
+    offsets = numpy.where(data[:,19] == ord('-'),-offsets,offsets)
+    wall = days*86400+hour*3600+mins*60+secs
+    epochs = wall-offsets
+
+    # Anything unusual goes through the scalar parser
+    for pos in numpy.flatnonzero(~strict):
+        result = utils.parse_iso(timestamps[pos])
+        if result == None:
+            epochs[pos] = INVALID_TIME
+            offsets[pos] = 0
+        elif result[1] == None and timezone != None:
+            epochs[pos] = utils.wall_to_epoch(result[0],timezone)
+            offsets[pos] = result[0]-epochs[pos]
+        else:
+            epochs[pos] = result[0]
+            offsets[pos] = 0 if result[1] == None else result[1]
+    return (epochs,offsets)
+
+
+def encode(values):
+    """
+    Returns the tuple (keys, codes) for a sequence of strings.
+    
+    The list keys contains the distinct strings (in order of first appearance), and
+    codes is a NumPy array with values[i] == keys[codes[i]].  This lets us do any
+    per-string work once for each distinct string instead of once per lesson.
+    
+    Parameter values: The strings to encode
+    Precondition: values is a list of strings
+    """
+    keys = list(dict.fromkeys(values))
+    positions = dict(zip(keys,range(len(keys))))
+    codes = numpy.fromiter(map(positions.__getitem__,values),dtype=numpy.int64,count=len(values))
+    return (keys,codes)
+
+
+def compile_weather(index):
+    """
+    Returns the observations of a WeatherIndex as a dictionary of NumPy arrays.
+    
+    The dictionary has keys 'times', 'visibility', 'wind', 'crosswind', and 'ceiling'.
+    These are the normalized observations of the index (see weather.Observation), with
+    every measurement in the units of minimums.csv.
+    
+    If index is a WeatherStore, the arrays are read straight from the mapped records.
+    
+    Parameter index: The weather index
+    Precondition: index is a WeatherIndex or a WeatherStore
+    """
+    if isinstance(index,weatherstore.WeatherStore):
+        records = numpy.frombuffer(index.buffer(),dtype=RECORD_DTYPE)
+        gusts = records['gusts']
+        return {'times': numpy.array(index.times,dtype=numpy.int64),
+                'visibility': records['visibility'],
+                'wind': numpy.where(numpy.isnan(gusts),records['wind'],gusts),
+                'crosswind': records['crosswind'],
+                'ceiling': records['ceiling']}
+    
+    observations = index.observations
+    visibility = [obs.visibility for obs in observations]
+    wind = [obs.wind for obs in observations]
+    crosswind = [obs.crosswind for obs in observations]
+    ceiling = [obs.ceiling for obs in observations]
+    
+    return {'times': numpy.array(index.times,dtype=numpy.int64),
+            'visibility': numpy.array(visibility,dtype=numpy.float64),
+            'wind': numpy.array(wind,dtype=numpy.float64),
+            'crosswind': numpy.array(crosswind,dtype=numpy.float64),
+            'ceiling': numpy.array(ceiling,dtype=numpy.float64)}
+
+
+def compile_minimums(table, areas):
+    """
+    Returns the minimums for every flight category as a NumPy array.
+    
+    The result has shape (5, len(areas), 2, 2, 3, 4).  The first five indices are the
+    certification (plus 1), the area position, instructed, vfr, and the daytime code
+    (utils.DAY, utils.NIGHT, or utils.NO_DAYCYCLE, which is -1 and so the last position).
+    The last axis is the ceiling, visibility, wind, and crosswind.  Categories with no
+    minimums (None in get_minimums) are NaN.
+    
+    Parameter table: The compiled minimums
+    Precondition: table is a pilots.MinimumsTable
+    
+    Parameter areas: The distinct areas of the lessons
+    Precondition: areas is a list of strings
+    """
+    result = numpy.full((5,len(areas),2,2,3,4),numpy.nan)
+    daytimes = {utils.DAY: True, utils.NIGHT: False, utils.NO_DAYCYCLE: None}
+    for cert in range(pilots.PILOT_INVALID,pilots.PILOT_50_HOURS+1):
+        for pos in range(len(areas)):
+            for instructed in (0,1):
+                for vfr in (0,1):
+                    for code in daytimes:
+                        mins = table.get(cert,areas[pos],bool(instructed),bool(vfr),daytimes[code])
+                        if mins != None:
+                            result[cert+1,pos,instructed,vfr,code] = mins
+    return result
+
+
+def get_violation_codes(bad_visibility, bad_winds, bad_ceiling, reported, applies):
+    """
+    Returns the violation codes (positions in LABELS) for arrays of check results.
+    
+    This is the array form of violations.get_weather_violation.
+    
+    Parameter bad_visibility, bad_winds, bad_ceiling: The results of the three checks
+    Precondition: each is a boolean NumPy array of the same length
+    
+    Parameter reported: Whether there is a weather report for the lesson
+    Precondition: reported is a boolean NumPy array of the same length
+    
+    Parameter applies: Whether there are minimums for the lesson
+    Precondition: applies is a boolean NumPy array of the same length
+    """
+    problems = bad_visibility.astype(numpy.int8)+bad_winds+bad_ceiling
+    codes = numpy.select([problems > 1, bad_visibility, bad_winds, bad_ceiling],
+                         [CODE_WEATHER, 1, 2, 3], CODE_NONE)
+    codes = numpy.where(reported,codes,CODE_UNKNOWN)
+    return numpy.where(applies,codes,CODE_NONE)
+
+
+def check_chunk(lessons, references, weather):
+    """
+    Returns the violation codes (positions in LABELS) of the lessons, as a NumPy array.
+    
+    Element i of the result is the code of violations.check_lesson(lessons[i],references).
+    A lesson with an invalid takeoff has no minimums, and so no violation.
+    
+    Parameter lessons: The lessons to check
+    Precondition: lessons is a nonempty list of 7-element lists of strings (rows of
+    lessons.csv)
+    
+    Parameter references: The compiled reference data
+    Precondition: references is a dictionary returned by violations.load_weather_references
+    
+    Parameter weather: The weather observations
+    Precondition: weather is a dictionary returned by compile_weather for references
+    """
+    timelines = references['timelines']
+    daycycle = references['daycycle']
+    maxage = references['weather'].maxage
+    
+    # The lessons as arrays
+    count = len(lessons)
+    takeoffs, offsets = parse_iso_array([row[3] for row in lessons],daycycle.timezone)
+    positions = numpy.fromiter(map(timelines.index.get,[row[0] for row in lessons],
+                                   itertools.repeat(-1)),dtype=numpy.int64,count=count)
+    instructed = numpy.fromiter(map(bool,[row[2] for row in lessons]),dtype=bool,count=count)
+    vfr = numpy.fromiter(map('VFR'.__eq__,[row[5] for row in lessons]),dtype=bool,count=count)
+    areas, area_codes = encode([row[6] for row in lessons])
+    
+    # The flight category of each lesson
+    certs = pilots.get_certifications(takeoffs+offsets,positions,timelines)
+    daytime = utils.daytimes(takeoffs,offsets,daycycle)
+    table = compile_minimums(references['minimums'],areas)
+    minimums = table[certs+1,area_codes,instructed.astype(int),vfr.astype(int),daytime]
+    applies = ~numpy.isnan(minimums[:,0]) & (takeoffs != INVALID_TIME)
+    
+    # The weather report for each lesson
+    times = weather['times']
+    if len(times) == 0:
+        reported = numpy.zeros(count,dtype=bool)
+        return get_violation_codes(reported,reported,reported,reported,applies)
+    
+    report = numpy.searchsorted(times,takeoffs,side='right')-1
+    reported = report >= 0
+    report = numpy.where(reported,report,0)
+    if maxage != None:
+        reported &= takeoffs-times[report] <= maxage
+    
+    with numpy.errstate(invalid='ignore'):
+        bad_visibility = weather['visibility'][report] < minimums[:,1]
+        bad_winds = ((weather['wind'][report] > minimums[:,2]) |
+                     (weather['crosswind'][report] > minimums[:,3]))
+        bad_ceiling = weather['ceiling'][report] < minimums[:,0]
+    return get_violation_codes(bad_visibility,bad_winds,bad_ceiling,reported,applies)
+
+
+def list_weather_violations(directory,maxage=None,use_cache=True):
+    """
+    Returns the (annotated) list of flight reservations that violate weather minimums.
+    
+    The result is exactly the same as violations.list_weather_violations (whose
+    docstring you should read first), but it is computed with array operations.  The
+    lessons are read CHUNK_SIZE at a time, and each chunk is checked by check_chunk.
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the files 'daycycle.json',
+    'weather.json', 'minimums.csv', 'students.csv', and 'lessons.csv'
+    
+    Parameter maxage: The oldest a weather report may be to be used (OPTIONAL)
+    Precondition: maxage is None or an int of seconds >= 0
+    
+    Parameter use_cache: Whether to use the dataset cache (OPTIONAL)
+    Precondition: use_cache is a boolean
+    """
+    if numpy == None:
+        raise ImportError('the numpy engine requires NumPy')
+
+    # Load in all of the files
+    references = violations.load_weather_references(directory,maxage,use_cache)
+    weather = compile_weather(references['weather'])
+    lessons = utils.iter_csv(os.path.join(directory,violations.LESSONS))
+    
+    #skip the header
+    next(lessons,None)
+    violations_table = []
+    while True:
+        chunk = list(itertools.islice(lessons,CHUNK_SIZE))
+        if len(chunk) == 0:
+            return violations_table
+        codes = check_chunk(chunk,references,weather)
+        for pos in numpy.flatnonzero(codes):
+            violations_table.append(chunk[pos]+[LABELS[codes[pos]]])
@@ -33,9 +33,16 @@ Date: 2/1/23
 """
 import utils
 import pilots
+import weather as wx
+import cache
+import weatherstore
+import records
+import memo
 import os.path
-from dateutil.parser import parse
-import pytz
+import io
+import csv
+import itertools
+import weakref
 
 
 # WEATHER FUNCTIONS
@@ -73,36 +80,8 @@ def bad_visibility(visibility,minimum):
     Parameter minimum: The minimum allowed visibility (in statute miles)
     Precondition: minimum is a float or int
     """
-    if visibility == 'unavailable':
-        return True
-    # Compare dict viz min to "min" parameter
-    elif visibility['units'] == 'SM':
-        if 'minimum' in visibility.keys():
-            if visibility['minimum']< minimum:
-                return True
-            else:
-                return False            
-            #if no "minimum" in dict
-        elif 'minimum' not in visibility.keys():
-            if visibility["prevailing"]< minimum:
-                return True
-            else:
-                return False
-    
-    # Translate FT to SM, if necessary
-    elif visibility['units'] == 'FT':
-        if 'minimum' in visibility.keys():
-            miles = visibility['minimum']/5280
-            if miles< minimum:
-                return True
-            else:
-                return False
-        #if no "minimum" in dict
-        elif 'minimum' not in visibility.keys():
-            if visibility["prevailing"]< minimum:
-                return True
-            else:
-                return False
+    # Normalize to statute miles ('unavailable' is -infinity, less than any minimum)
+    return wx.visibility_miles(visibility) < minimum
 
 
 def bad_winds(winds,maxwind,maxcross):
@@ -147,40 +126,10 @@ def bad_winds(winds,maxwind,maxcross):
     Parameter maxcross: The maximum allowable crosswind speed (in knots)
     Precondition: maxcross is a float or int
     """
-    if winds == 'unavailable':
-        return True
-    elif winds == 'calm':
-        return False
-    elif winds['units'] == 'KT':
-        #if 'gusts' exists in dict, use that in place of 'speed'
-        if 'gusts' in winds.keys():
-            if winds['gusts'] > maxwind or winds['crosswind'] > maxcross:
-                return True
-            else:
-                return False            
-            #if no "gust" in dict
-        elif 'gusts' not in winds.keys():
-            if winds['speed'] > maxwind or winds['crosswind'] > maxcross:
-                return True
-            else:
-                return False
-    # Translate MPS to KT, if necessary
-    elif winds['units'] == 'MPS':
-        if 'gusts' in winds.keys():
-            gknots = winds['gusts']*1.94384
-            cknots = winds['crosswind']*1.94384
-            if gknots > maxwind or cknots > maxcross:
-                return True
-            else:
-                return False
-        #if no "minimum" in dict
-        elif 'gusts' not in visibility.keys():
-            gknots = winds['speed']*1.94384
-            cknots = winds['crosswind']*1.94384
-            if gknots > maxwind or cknots > maxcross:
-                return True
-            else:
-                return False
+    # Normalize to knots ('unavailable' is infinity, more than any maximum)
+    speeds = wx.wind_knots(winds)
+    return speeds[0] > maxwind or speeds[1] > maxcross
+
 
 def bad_ceiling(ceiling,minimum):
     """
@@ -223,36 +172,8 @@ def bad_ceiling(ceiling,minimum):
     Parameter minimum: The minimum allowed ceiling (in feet)
     Precondition: minimum is a float or int
     """
-    for m in range(len(ceiling)):
-        if ceiling == 'unavailable':
-            return True
-        elif ceiling == 'clear':
-            return False
-        
-        elif (ceiling[m]['type'] == 'a few' or ceiling[m]['type'] == 'scattered'):
-            if len(ceiling) ==1:
-                return False
-            elif (m+1)<len(ceiling):
-                m+=1
-            else:
-                return False
-        elif ceiling[m]['type'] == 'broken':
-            if ceiling[m]['height']<minimum:
-                return True
-            else:
-                return False
-        elif ceiling[m]['type'] == 'overcast':
-            if ceiling[m]['height']<minimum:
-                return True
-            else:
-                return False
-        elif ceiling[m]['type'] == 'indefinite ceiling':
-            if ceiling[m]['height']<minimum:
-                return True
-            else:
-                return False
-        else:
-            return False
+    # Normalize to feet ('clear' is infinity, 'unavailable' is -infinity)
+    return wx.ceiling_feet(ceiling) < minimum
 
 
 def get_weather_report(takeoff,weather):
@@ -327,7 +248,8 @@ def get_weather_report(takeoff,weather):
     Precondition: takeoff is a datetime object
     
     Paramater weather: The weather report dictionary 
-    Precondition: weather is a dictionary formatted as described above
+    Precondition: weather is a dictionary formatted as described above, or a
+    WeatherIndex built from such a dictionary
     """
     # HINT: Looping through the dictionary is VERY slow because it is so large
     # You should convert the takeoff time to an ISO string and search for that first.
@@ -336,8 +258,14 @@ def get_weather_report(takeoff,weather):
     # Search for time in dictionary
     # As fall back, find the closest time before takeoff
     
+    # An index answers the same question with a binary search
+    if isinstance(weather,wx.WeatherIndex):
+        return weather.get_report(takeoff)
+
     # convert the takeoff time to an ISO string and search for that first.
     takeoff_iso = takeoff.isoformat()
+    if takeoff_iso in weather:
+        return weather[takeoff_iso]
 
     for i in weather:
         for j in weather[i]:
@@ -400,36 +328,89 @@ def get_weather_violation(weather,minimums):
     available (e.g. weather is None).  Finally, it returns '' (the empty string) if 
     the weather is fine and there are no violations.
     
+    The weather may also be an Observation (a report already normalized by the module
+    weather.py), in which case no conversion is necessary.
+    
     Parameter weather: The weather measure
     Precondition: weather is dictionary containing a visibility, wind, and ceiling measurement,
-    or None if no weather reading is available.
+    an Observation, or None if no weather reading is available.
     
     Parameter minimums: The safety minimums for ceiling, visibility, wind, and crosswind
     Precondition: minimums is a list of four floats
     """
     if weather == None:
         return "Unknown"
-    elif bad_visibility(weather["visibility"],minimums[1]) == True:
-        if bad_winds(weather['wind'],minimums[2],minimums[3]) == True or bad_ceiling(weather['sky'],minimums[0]) == True:
+    # Normalize the report once, so each check is a numeric comparison
+    if not isinstance(weather,wx.Observation):
+        weather = wx.normalize(weather)
+    
+    if weather.bad_visibility(minimums[1]):
+        if weather.bad_winds(minimums[2],minimums[3]) or weather.bad_ceiling(minimums[0]):
             return "Weather"
         else:
             return "Visibility"
-    elif bad_winds(weather['wind'],minimums[2],minimums[3]) == True:
-        if bad_ceiling(weather['sky'],minimums[0]) == True:
+    elif weather.bad_winds(minimums[2],minimums[3]):
+        if weather.bad_ceiling(minimums[0]):
             return "Weather"
         else:
             return "Winds"
-    elif bad_ceiling(weather['sky'],minimums[0]) == True:
+    elif weather.bad_ceiling(minimums[0]):
         return "Ceiling"
     else:
         return ''
 
 
+# The name of the memo of weather violations (see memo.py)
+WEATHER_MEMO = 'weather_violations'
+# The size of that memo until it is changed (see app.py); 0 turns the memo off, since
+# check_batch already checks each takeoff once and a lookup costs more than the check
+WEATHER_MEMO_SIZE = 0
+# The memo itself (memo.get_memo always returns this object for WEATHER_MEMO)
+_weather_memo = memo.get_memo(WEATHER_MEMO,WEATHER_MEMO_SIZE)
+# A serial number for each source of observations, as they are first used by the memo
+_weather_sources = weakref.WeakKeyDictionary()
+_weather_serials = itertools.count()
+
+
+def lookup_weather_violation(weather,minimums,source):
+    """
+    Returns get_weather_violation(weather,minimums), remembering recent results.
+    
+    The results are kept in the memo WEATHER_MEMO (see memo.py), with least-recently-used
+    eviction.  The memo is off (size 0) unless it is resized, as with the --memo-size
+    option of app.py.  Then the key of a result is the triple (source serial, observation
+    time, minimums tuple).  The time of an observation is an int that is unique within
+    its source (its key in weather.json, weather.bin, or a database), so the first two
+    parts identify the observation, even when several datasets are audited in one
+    process.  A missing observation is always 'Unknown', so it is not remembered.
+    
+    This function is safe to call from several threads at once.
+    
+    Parameter weather: The weather observation
+    Precondition: weather is an Observation, or None if no weather reading is available
+    
+    Parameter minimums: The safety minimums for ceiling, visibility, wind, and crosswind
+    Precondition: minimums is a list of four floats
+    
+    Parameter source: The source of the observation
+    Precondition: source is the object (such as a WeatherIndex) that returned weather
+    """
+    if weather == None or _weather_memo.size == 0:
+        return get_weather_violation(weather,minimums)
+    serial = _weather_sources.get(source)
+    if serial == None:
+        serial = _weather_sources.setdefault(source,next(_weather_serials))
+    key = (serial,weather.time,tuple(minimums))
+    return _weather_memo.lookup(key,get_weather_violation,weather,minimums)
+
+
 # FILES TO AUDIT
 # Sunrise and sunset
 DAYCYCLE = 'daycycle.json'
 # Hourly weather observations
 WEATHER  = 'weather.json'
+# Hourly weather observations, converted to fixed-size records (see weatherstore.py)
+WEATHER_STORE = 'weather.bin'
 # The list of insurance-mandated minimums
 MINIMUMS = 'minimums.csv'
 # The list of all registered students in the flight school
@@ -437,8 +418,13 @@ STUDENTS = 'students.csv'
 # The list of all take-offs (and landings)
 LESSONS  = 'lessons.csv'
 
+# The number of lessons that check_lessons passes to check_batch at a time.  Lessons are
+# in takeoff order, so this covers several hours; larger batches keep enough objects
+# alive to set off full garbage collections, which costs more than the shared checks save
+BATCH_SIZE = 512
+
 
-def list_weather_violations(directory):
+def list_weather_violations(directory,maxage=None,jobs=1,use_cache=True):
     """
     Returns the (annotated) list of flight reservations that violate weather minimums.
     
@@ -472,69 +458,414 @@ def list_weather_violations(directory):
     then it is possible it is no longer a visibility violation because it is subject to
     a different set of minimums.
     
+    Weather reports are found with a WeatherIndex, so each lesson costs a binary search
+    rather than a scan of weather.json.  If maxage is not None, a report more than maxage
+    seconds older than the takeoff is treated as missing (so the violation is 'Unknown').
+    
     Parameter directory: The directory of files to audit
     Precondition: directory is the name of a directory containing the files 'daycycle.json',
     'weather.json', 'minimums.csv', 'students.csv', and 'lessons.csv'
+    
+    Parameter maxage: The oldest a weather report may be to be used (OPTIONAL)
+    Precondition: maxage is None or an int of seconds >= 0
+    
+    Parameter jobs: The number of worker processes (OPTIONAL)
+    Precondition: jobs is an int > 0; if it is more than 1, the lessons are checked in
+    shards by iter_sharded_violations
+    
+    Parameter use_cache: Whether to use the dataset cache (OPTIONAL)
+    Precondition: use_cache is a boolean
     """
-    # For each of the lessons
-        # Get the takeoff time
-        # Get the pilot credentials
-        # Get the pilot minimums
-        # Get the weather conditions
-        # Check for a violation and add to result if so
+    if jobs > 1:
+        return list(iter_sharded_violations(directory,jobs,maxage,use_cache=use_cache))
+    return list(iter_weather_violations(directory,maxage,use_cache))
+
 
+def load_weather_references(directory,maxage=None,use_cache=True):
+    """
+    Returns the compiled reference data needed to check lessons for weather violations.
+    
+    The result is a dictionary with the following keys:
+    
+        'timelines': the Timelines for students.csv
+        'minimums':  the MinimumsTable for minimums.csv
+        'daycycle':  the DaycycleTable for daycycle.json
+        'weather':   the WeatherIndex for weather.json (or a WeatherStore)
+    
+    Everything is loaded and compiled once, so that check_lesson does no parsing.
+    
+    Each compiled reference is saved in the dataset cache (see cache.py), so later
+    audits of the same directory skip parsing entirely until one of the files changes.
+    The cached WeatherIndex does not depend on maxage, which is set after loading.
+    
+    If the directory has a current weather.bin (see weatherstore.py), the weather is
+    read from that file through mmap instead, and weather.json is never loaded.
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the files 'daycycle.json',
+    'weather.json', 'minimums.csv', and 'students.csv'
+    
+    Parameter maxage: The oldest a weather report may be to be used (OPTIONAL)
+    Precondition: maxage is None or an int of seconds >= 0
+    
+    Parameter use_cache: Whether to use the dataset cache (OPTIONAL)
+    Precondition: use_cache is a boolean
+    """
+    def path(name):
+        return os.path.join(directory,name)
+    
+    def build_timelines():
+        return pilots.Timelines(records.read_registry(path(STUDENTS),records.Student))
+    
+    def build_minimums():
+        return pilots.MinimumsTable(utils.read_csv(path(MINIMUMS)))
+    
+    def build_daycycle():
+        return utils.DaycycleTable(utils.read_json(path(DAYCYCLE)))
+    
+    def build_weather():
+        return wx.WeatherIndex(utils.read_json(path(WEATHER)),reports=False)
+    
     # Load in all of the files
-    students = os.path.join(directory,STUDENTS)
-    students = utils.read_csv(students)
-    mins = os.path.join(directory,MINIMUMS)   
-    mins = utils.read_csv(mins)
-    lessons = os.path.join(directory,LESSONS)  
-    lessons = utils.read_csv(lessons)
-    daycycle_file = os.path.join(directory,DAYCYCLE)
-    day_data = utils.read_json(daycycle_file)
-    weather_file = os.path.join(directory,WEATHER) 
-    weather = utils.read_json(weather_file)
-    
-    violations_table = []
-    #loop through the lessons file
-    for row in range(1,len(lessons)):
-    #extract the parameters from the 'lessons' file row that will be used in helper functions to evaluate each line
-        student_id = lessons[row][0] #this references the particular student in question to associate them with other lists
-        lesson_info_row = lessons[row] #this is the lesson data that triggers the violation
-        instructed = True #whether or not an instructor is present
-        takeoff = parse(lessons[row][3]) # this is a datetime object
-        vfr = True #whether or not the lesson is subject to vmc minimums
-        area = lessons[row][6] #where the lesson occurred
-
-        if lessons[row][2] == "": #If no instructor listed...
-            instructed = False
-        #if the lesson is not filed as VFR, the pilot is not subject to VMC minimums, aka variable should be "false".
-        if lessons[row][5] != 'VFR':
-            vfr = False
+    timelines = cache.cached(directory,'timelines',[STUDENTS],pilots.Timelines,build_timelines,
+                             use_cache)
+    mins = cache.cached(directory,'minimums',[MINIMUMS],pilots.MinimumsTable,build_minimums,
+                        use_cache)
+    daycycle = cache.cached(directory,'daycycle',[DAYCYCLE],utils.DaycycleTable,build_daycycle,
+                            use_cache)
+    weather = weatherstore.open_store(path(WEATHER),path(WEATHER_STORE))
+    if weather == None:
+        weather = cache.cached(directory,'weather',[WEATHER],wx.WeatherIndex,build_weather,
+                               use_cache)
+    weather.maxage = maxage
+    
+    return {'timelines': timelines,
+            'minimums':  mins,
+            'daycycle':  daycycle,
+            'weather':   weather}
+
 
+def get_takeoff(lesson,references):
+    """
+    Returns the takeoff of a lesson as the tuple (epoch, offset), or None if it is invalid.
+    
+    A takeoff without a time zone is a wall-clock time in the time zone of daycycle.json,
+    so it is localized to that time zone (like the dates in repairs.csv).
+    
+    Parameter lesson: The flight lesson
+    Precondition: lesson is a records.Lesson
+    
+    Parameter references: The compiled reference data
+    Precondition: references is a dictionary returned by load_weather_references
+    """
+    if lesson.takeoff == None:
+        return None
+    if lesson.offset != None:
+        return (lesson.takeoff,lesson.offset)
+    epoch = utils.wall_to_epoch(lesson.takeoff,references['daycycle'].timezone)
+    return (epoch,lesson.takeoff-epoch)
+
+
+def get_lesson_minimums(lesson,references):
+    """
+    Returns the minimums that apply to a single lesson (None if no minimums apply)
+    
+    The minimums depend on the certification of the pilot at takeoff, the area of the
+    flight, whether an instructor is present, the flight plan, and whether the takeoff
+    is during the day (see pilots.get_minimums).  A lesson with an invalid takeoff has
+    no minimums, since none of these can be known.
+    
+    Parameter lesson: The flight lesson
+    Precondition: lesson is a records.Lesson
+    
+    Parameter references: The compiled reference data
+    Precondition: references is a dictionary returned by load_weather_references
+    """
+    takeoff = lesson.takeoff
+    offset = lesson.offset
+    if offset == None:
+        if takeoff == None:
+            return None
+        takeoff, offset = get_takeoff(lesson,references)
+    
     #populate the helper functions with relevant information for the row being evaluated
-        student_cert_dates = utils.get_for_id(student_id,students)
-        
-        #helper functions used in "get minimums"
-        daytime_var = utils.daytime(takeoff, day_data)
-        cert_designation = pilots.get_certification(takeoff, student_cert_dates)
+    student_cert_dates = references['timelines'].get(lesson.student)
+    
+    #helper functions used in "get minimums"
+    daytime_var = references['daycycle'].is_daytime(takeoff,offset)
+    cert_designation = student_cert_dates.get_certification(takeoff+offset)
+    return references['minimums'].get(cert_designation, lesson.area, lesson.instructed,
+                                      lesson.vfr, daytime_var)
+
+
+def check_lesson(lesson,references):
+    """
+    Returns the weather violation for a single lesson (empty string if flight is ok)
+    
+    The result is the value of get_weather_violation for the weather at takeoff and the
+    minimums that apply to the pilot.  If no minimums apply, the result is the empty string.
+    
+    Parameter lesson: The flight lesson
+    Precondition: lesson is a records.Lesson, or a 7-element list of strings (a row of 
+    lessons.csv)
+    
+    Parameter references: The compiled reference data
+    Precondition: references is a dictionary returned by load_weather_references
+    """
+    if not isinstance(lesson,records.Lesson):
+        lesson = records.Lesson(lesson)
+    minimums_results = get_lesson_minimums(lesson,references)
+    
+    #since it's possible for "get minimums" to return None, account for that possibility
+    #(there are no minimums to violate, so the weather cannot be a violation)
+    if minimums_results == None:
+        return ''
     
-        #helper functions used in "get weather violation"
-        minimums_results = pilots.get_minimums(cert_designation, area, instructed, vfr, daytime_var, mins)
-        
-        #since it's possible for "get minimums" to return None, account for that possibility
-        if minimums_results != None:
-            weather_report = get_weather_report(takeoff,weather)
-        
     #main actions of "list weather violations"
-            violation = get_weather_violation(weather_report,minimums_results)
+    weather = references['weather']
+    weather_report = weather.get_observation(get_takeoff(lesson,references)[0])
+    return lookup_weather_violation(weather_report,minimums_results,weather)
+
+
+def check_batch(lessons,references):
+    """
+    Returns the list of weather violations for the lessons, in the same order.
+    
+    Element i of the result is check_lesson(lessons[i],references).  However, the
+    weather is not checked one lesson at a time.  Many lessons take off at the same
+    time (several departures at noon every day), and they all use the same weather
+    observation.  So the lessons are grouped by takeoff time.  The observation of each
+    group is found once, and the violation is looked up once for each distinct minimums
+    in the group (see lookup_weather_violation).  With hourly departures, the number of
+    weather checks is the number of distinct (hour, minimums) pairs rather than the
+    number of lessons.
+    
+    Parameter lessons: The flight lessons
+    Precondition: lessons is a list of records.Lesson
+    
+    Parameter references: The compiled reference data
+    Precondition: references is a dictionary returned by load_weather_references
+    """
+    result = ['']*len(lessons)
+    groups = {}
+    for pos in range(len(lessons)):
+        lesson = lessons[pos]
+        minimums = get_lesson_minimums(lesson,references)
+        if minimums != None:
+            takeoff = lesson.takeoff if lesson.offset != None else get_takeoff(lesson,references)[0]
+            group = groups.get(takeoff)
+            if group == None:
+                group = []
+                groups[takeoff] = group
+            group.append((pos,minimums))
+    
+    weather = references['weather']
+    for takeoff in groups:
+        observation = weather.get_observation(takeoff)
+        checked = {}
+        for pos, minimums in groups[takeoff]:
+            key = tuple(minimums)
+            violation = checked.get(key)
+            if violation == None:
+                violation = lookup_weather_violation(observation,minimums,weather)
+                checked[key] = violation
+            result[pos] = violation
+    return result
+
+
+def iter_weather_violations(directory,maxage=None,use_cache=True):
+    """
+    Returns a generator of the (annotated) flight reservations that violate weather minimums.
+    
+    The generator produces the same rows as list_weather_violations, in the same
+    order, but it streams lessons.csv one row at a time.  Only the reference files
+    are kept in memory, so memory stays flat no matter how many lessons there are.
+    
+    The reference files are loaded before this function returns, so any problem with
+    them is reported immediately (and not when the first row is requested).
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the files 'daycycle.json',
+    'weather.json', 'minimums.csv', 'students.csv', and 'lessons.csv'
+    
+    Parameter maxage: The oldest a weather report may be to be used (OPTIONAL)
+    Precondition: maxage is None or an int of seconds >= 0
+    
+    Parameter use_cache: Whether to use the dataset cache (OPTIONAL)
+    Precondition: use_cache is a boolean
+    """
+    references = load_weather_references(directory,maxage,use_cache)
+    lessons = utils.iter_csv(os.path.join(directory,LESSONS))
+    
+    #skip the header
+    next(lessons,None)
+    return check_lessons(lessons,references)
+
+
+def check_lessons(lessons,references):
+    """
+    Generates the (annotated) lessons that violate weather minimums.
+    
+    Each lesson with a violation is produced as a row with the violation appended to it
+    (a record is converted back with records.Lesson.to_row).  Lessons without a violation
+    are skipped.
+    
+    The lessons are checked BATCH_SIZE at a time by check_batch, so that lessons with
+    the same takeoff share their weather checks.  Only one batch is in memory at once.
+    
+    Parameter lessons: The flight lessons to check
+    Precondition: lessons is an iterable of records.Lesson or of 7-element lists of 
+    strings (rows of lessons.csv, without the header)
+    
+    Parameter references: The compiled reference data
+    Precondition: references is a dictionary returned by load_weather_references
+    """
+    lessons = iter(lessons)
+    while True:
+        batch = list(itertools.islice(lessons,BATCH_SIZE))
+        if len(batch) == 0:
+            return
+        lesson_records = [lesson if isinstance(lesson,records.Lesson) else records.Lesson(lesson)
+                          for lesson in batch]
+        found = check_batch(lesson_records,references)
+        for pos in range(len(batch)):
+            #Was there a violation of some sort for this flight?
+            if found[pos] != '':
+                lesson = batch[pos]
+                if isinstance(lesson,records.Lesson):
+                    lesson = lesson.to_row()
+                yield lesson+[found[pos]]
+
+
+# SHARDED EXECUTION
+# The compiled reference data in a worker process (see install_references)
+WORKER_REFERENCES = None
+
+
+def install_references(references):
+    """
+    Installs the compiled reference data for check_shard in this (worker) process.
+    
+    This is the initializer of the process pool in iter_sharded_violations.  Each
+    worker receives one copy of the reference data when it starts (with the 'fork'
+    start method, the copy is shared with the parent until written).  The workers
+    only ever read it.
+    
+    Parameter references: The compiled reference data
+    Precondition: references is a dictionary returned by load_weather_references
+    """
+    global WORKER_REFERENCES
+    WORKER_REFERENCES = references
+
+
+def shard_lessons(filename,count):
+    """
+    Returns a list of (start,end) byte ranges that split the lessons file into shards.
+    
+    The ranges skip the header, cover every other line exactly once, and begin and end
+    on line boundaries.  There are at most count ranges (fewer if the file is small).
+    
+    Parameter filename: The lessons file
+    Precondition: filename is a string naming a CSV file in which no field contains
+    a line break (this is true of lessons.csv)
+    
+    Parameter count: The number of shards
+    Precondition: count is an int > 0
+    """
+    with open(filename,'rb') as file:
+        file.readline()
+        start = file.tell()
+        file.seek(0,io.SEEK_END)
+        size = file.tell()
         
-    #Was there a violation of some sort for this flight?
-        if violation != '':
-    #add it to table of violations
-                violations_table.append(lesson_info_row)
-                rsize = len(violations_table)
-                location = rsize-1
-                violations_table[location].append(violation)
-
-    return violations_table
\ No newline at end of file
+        bounds = [start]
+        for shard in range(1,count):
+            file.seek(start+(size-start)*shard//count)
+            file.readline()
+            pos = file.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+        bounds.append(size)
+    return [(bounds[pos],bounds[pos+1]) for pos in range(len(bounds)-1) if bounds[pos] < bounds[pos+1]]
+
+
+def check_shard(filename,start,end):
+    """
+    Returns the (annotated) lessons in a byte range of filename that violate weather minimums.
+    
+    This is the work done by a worker process.  It uses the reference data installed by
+    install_references.  The result is in the same order as the lessons in the file.
+    
+    Parameter filename: The lessons file
+    Precondition: filename is a string naming a CSV file
+    
+    Parameter start: The byte offset of the first line of the shard
+    Precondition: start is an int on a line boundary
+    
+    Parameter end: The byte offset just past the last line of the shard
+    Precondition: end is an int >= start on a line boundary
+    """
+    with open(filename,'rb') as file:
+        file.seek(start)
+        data = file.read(end-start)
+    lessons = csv.reader(io.TextIOWrapper(io.BytesIO(data)))
+    return list(check_lessons(lessons,WORKER_REFERENCES))
+
+
+def iter_sharded_violations(directory,jobs,maxage=None,shards=None,use_cache=True):
+    """
+    Returns a generator of the (annotated) flight reservations that violate weather minimums.
+    
+    This produces exactly the same rows, in the same order, as iter_weather_violations.
+    But the lessons are split into shards by row range (see shard_lessons) and checked
+    by a pool of jobs worker processes.  The reference data is compiled once in this
+    process and given to each worker (see install_references).  Each worker reads its
+    own shard of lessons.csv, and the results are merged back in shard order.
+    
+    By default there are two shards per worker, so that one slow shard does not hold up
+    the others.  Only the violations are sent back from the workers.
+    
+    Parameter directory: The directory of files to audit
+    Precondition: directory is the name of a directory containing the files 'daycycle.json',
+    'weather.json', 'minimums.csv', 'students.csv', and 'lessons.csv'
+    
+    Parameter jobs: The number of worker processes
+    Precondition: jobs is an int > 0
+    
+    Parameter maxage: The oldest a weather report may be to be used (OPTIONAL)
+    Precondition: maxage is None or an int of seconds >= 0
+    
+    Parameter shards: The number of shards (OPTIONAL)
+    Precondition: shards is None or an int > 0
+    
+    Parameter use_cache: Whether to use the dataset cache (OPTIONAL)
+    Precondition: use_cache is a boolean
+    """
+    references = load_weather_references(directory,maxage,use_cache)
+    filename = os.path.join(directory,LESSONS)
+    if shards == None:
+        shards = 2*jobs
+    ranges = shard_lessons(filename,shards)
+    import concurrent.futures
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=jobs,initializer=install_references,
+                                                  initargs=(references,))
+    futures = [pool.submit(check_shard,filename,start,end) for (start,end) in ranges]
+    return merge_shards(pool,futures)
+
+
+def merge_shards(pool,futures):
+    """
+    Generates the rows of each shard result in order, then shuts down the pool.
+    
+    Parameter pool: The process pool computing the shards
+    Precondition: pool is a concurrent.futures.ProcessPoolExecutor
+    
+    Parameter futures: The shard results, in order
+    Precondition: futures is a list of futures for check_shard
+    """
+    try:
+        for future in futures:
+            for row in future.result():
+                yield row
+    finally:
+        pool.shutdown(cancel_futures=True)
@@ -0,0 +1,397 @@
+"""
+Module providing fast access to the hourly weather observations.
+
+The file weather.json is a dictionary whose keys are ISO formatted timestamps and whose
+values are weather reports (see get_weather_report in violations.py for the format).
+Searching that dictionary for the report before a takeoff means looking at every key,
+which is far too slow once we audit thousands of lessons against several years of
+hourly weather.
+
+The class WeatherIndex solves this by converting the keys ONCE to integer timestamps
+(seconds since the epoch) and storing them in sorted order.  Finding the report for a
+takeoff is then a binary search with the bisect module.
+
+This module also normalizes each report ONCE into an Observation: a compact record with
+every measurement reduced to a single number in the units of minimums.csv (visibility in
+SM, wind and crosswind in KT, and the ceiling in FT).  The checks in violations.py then
+become numeric comparisons.  A measurement that is 'unavailable' becomes an infinite
+value that fails every check, so the comparisons need no special cases.
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import bisect
+import datetime
+import array
+import utils
+
+# Feet in a statute mile
+FEET_PER_MILE = 5280
+# Knots in a meter per second
+KNOTS_PER_MPS = 1.94384
+# Infinity (a ceiling for a clear sky, or wind that is not available)
+INFINITY = float('inf')
+
+# OBSERVATION FLAGS
+# The visibility is 'unavailable'
+NO_VISIBILITY = 1
+# The wind is 'unavailable'
+NO_WIND = 2
+# The sky is 'unavailable'
+NO_SKY = 4
+# The wind is 'calm'
+CALM = 8
+# The sky is 'clear' (or has no ceiling layer)
+CLEAR = 16
+
+
+def to_epoch(time):
+    """
+    Returns the given time as an int of seconds since the epoch (1970-01-01 UTC).
+    
+    Parameter time: The time to convert
+    Precondition: time is a datetime object with a time zone, or an int
+    """
+    if isinstance(time, datetime.datetime):
+        return int(time.timestamp())
+    return time
+
+
+def visibility_miles(visibility):
+    """
+    Returns the visibility measurement in statute miles.
+    
+    The result is the 'minimum' visibility if present, and the 'prevailing' visibility
+    otherwise (see bad_visibility in violations.py).  If the visibility is 'unavailable',
+    the result is -INFINITY, which is less than any minimum.
+    
+    Parameter visibility: The visibility information
+    Precondition: visibility is a valid visibility measurement (a dictionary or the
+    string 'unavailable')
+    """
+    if visibility == 'unavailable':
+        return -INFINITY
+    if 'minimum' in visibility:
+        value = visibility['minimum']
+    else:
+        value = visibility['prevailing']
+    if visibility['units'] == 'FT':
+        return value/FEET_PER_MILE
+    return value
+
+
+def wind_knots(winds):
+    """
+    Returns the tuple (wind, crosswind) for the wind measurement in knots.
+    
+    The wind is the 'gusts' if present, and the 'speed' otherwise (see bad_winds in
+    violations.py).  A missing crosswind is 0.  If the winds are 'calm', both values
+    are 0.  If they are 'unavailable', both values are INFINITY, which is more than
+    any maximum.
+    
+    Parameter winds: The wind speed information
+    Precondition: winds is a valid wind measurement (a dictionary, the string 'calm',
+    or the string 'unavailable')
+    """
+    if winds == 'unavailable':
+        return (INFINITY,INFINITY)
+    elif winds == 'calm':
+        return (0.0,0.0)
+    
+    if 'gusts' in winds:
+        speed = winds['gusts']
+    else:
+        speed = winds['speed']
+    cross = winds.get('crosswind',0.0)
+    if winds['units'] == 'MPS':
+        return (speed*KNOTS_PER_MPS,cross*KNOTS_PER_MPS)
+    return (speed,cross)
+
+
+def ceiling_feet(ceiling):
+    """
+    Returns the height of the ceiling measurement in feet.
+    
+    The ceiling is the first cloud layer that is 'broken', 'overcast', or 'indefinite
+    ceiling' (see bad_ceiling in violations.py).  If there is no such layer, or the sky
+    is 'clear', the result is INFINITY.  If the ceiling is 'unavailable', the result is
+    -INFINITY, which is less than any minimum.
+    
+    Parameter ceiling: The ceiling information
+    Precondition: ceiling is a valid ceiling measurement (a list of cloud layers, the
+    string 'clear', or the string 'unavailable')
+    """
+    if ceiling == 'unavailable':
+        return -INFINITY
+    elif ceiling == 'clear':
+        return INFINITY
+    
+    for layer in ceiling:
+        if layer['type'] in ('broken','overcast','indefinite ceiling'):
+            return layer['height']
+        elif not layer['type'] in ('a few','scattered'):
+            return INFINITY
+    return INFINITY
+
+
+class Observation(object):
+    """
+    A class representing a normalized weather report.
+    
+    Every measurement is a float in the units of minimums.csv.  Measurements that are
+    'unavailable' are infinite in the direction that fails the checks, and the flags
+    record which special cases applied.
+    
+    Attribute time: The time of the observation
+    Invariant: time is an int (seconds since the epoch), or None if unknown
+    
+    Attribute visibility: The visibility in statute miles (see visibility_miles)
+    Invariant: visibility is a float (-INFINITY if unavailable)
+    
+    Attribute wind: The wind speed (or gusts) in knots (see wind_knots)
+    Invariant: wind is a float >= 0 (INFINITY if unavailable)
+    
+    Attribute crosswind: The crosswind speed in knots (see wind_knots)
+    Invariant: crosswind is a float >= 0 (INFINITY if unavailable)
+    
+    Attribute ceiling: The height of the ceiling in feet (see ceiling_feet)
+    Invariant: ceiling is a float (INFINITY if clear, -INFINITY if unavailable)
+    
+    Attribute flags: The special cases of this observation
+    Invariant: flags is an int combining NO_VISIBILITY, NO_WIND, NO_SKY, CALM, and CLEAR
+    """
+    __slots__ = ('time','visibility','wind','crosswind','ceiling','flags')
+    
+    def __init__(self, time, visibility, wind, crosswind, ceiling, flags):
+        """
+        Initializes an observation with the given (already normalized) values.
+        
+        Parameter time: The time of the observation
+        Precondition: time is an int (seconds since the epoch), or None
+        
+        Parameter visibility: The visibility in statute miles
+        Precondition: visibility is a float
+        
+        Parameter wind: The wind speed in knots
+        Precondition: wind is a float
+        
+        Parameter crosswind: The crosswind speed in knots
+        Precondition: crosswind is a float
+        
+        Parameter ceiling: The height of the ceiling in feet
+        Precondition: ceiling is a float
+        
+        Parameter flags: The special cases of this observation
+        Precondition: flags is an int
+        """
+        self.time = time
+        self.visibility = visibility
+        self.wind = wind
+        self.crosswind = crosswind
+        self.ceiling = ceiling
+        self.flags = flags
+    
+    def __repr__(self):
+        """
+        Returns the unambiguous string representation of this observation.
+        """
+        return ('Observation(%r, %r, %r, %r, %r, %r)' %
+                (self.time,self.visibility,self.wind,self.crosswind,self.ceiling,self.flags))
+    
+    def bad_visibility(self, minimum):
+        """
+        Returns True if the visibility violates the minimum, False otherwise
+        
+        Parameter minimum: The minimum allowed visibility (in statute miles)
+        Precondition: minimum is a float or int
+        """
+        return self.visibility < minimum
+    
+    def bad_winds(self, maxwind, maxcross):
+        """
+        Returns True if the wind violates the maximums, False otherwise
+        
+        Parameter maxwind: The maximum allowable wind speed (in knots)
+        Precondition: maxwind is a float or int
+        
+        Parameter maxcross: The maximum allowable crosswind speed (in knots)
+        Precondition: maxcross is a float or int
+        """
+        return self.wind > maxwind or self.crosswind > maxcross
+    
+    def bad_ceiling(self, minimum):
+        """
+        Returns True if the ceiling violates the minimum, False otherwise
+        
+        Parameter minimum: The minimum allowed ceiling (in feet)
+        Precondition: minimum is a float or int
+        """
+        return self.ceiling < minimum
+
+
+def normalize(report, time=None):
+    """
+    Returns the Observation for the given weather report.
+    
+    Parameter report: The weather report
+    Precondition: report is a dictionary containing a visibility, wind, and ceiling 
+    measurement (see get_weather_violation in violations.py)
+    
+    Parameter time: The time of the report (OPTIONAL)
+    Precondition: time is an int (seconds since the epoch), or None
+    """
+    flags = 0
+    if report['visibility'] == 'unavailable':
+        flags |= NO_VISIBILITY
+    if report['wind'] == 'unavailable':
+        flags |= NO_WIND
+    elif report['wind'] == 'calm':
+        flags |= CALM
+    if report['sky'] == 'unavailable':
+        flags |= NO_SKY
+    
+    speeds = wind_knots(report['wind'])
+    ceiling = ceiling_feet(report['sky'])
+    if ceiling == INFINITY:
+        flags |= CLEAR
+    return Observation(time,visibility_miles(report['visibility']),speeds[0],speeds[1],ceiling,flags)
+
+
+class WeatherIndex(object):
+    """
+    A class providing binary-search lookup of weather reports.
+    
+    The index is built once for a weather dictionary.  The observations are stored
+    in parallel lists ordered by time, so that reports[i] is the report that was
+    observed at times[i], and observations[i] is that report normalized.
+    
+    Attribute times: The observation times, in ascending order
+    Invariant: times is a sorted list of ints (seconds since the epoch)
+    
+    Attribute reports: The weather reports
+    Invariant: reports is a list of weather reports the same length as times, or None
+    if the index does not keep the reports
+    
+    Attribute observations: The normalized weather reports
+    Invariant: observations is a list of Observation objects the same length as times
+    
+    Attribute maxage: The oldest a report may be (relative to takeoff) to be used
+    Invariant: maxage is None (no limit) or an int of seconds >= 0
+    """
+
+    def __init__(self, weather, maxage=None, reports=True):
+        """
+        Initializes a new index for the given weather dictionary.
+        
+        Keys that are not valid timestamps are ignored.  Keys without a time zone are
+        treated as UTC.
+        
+        The raw reports are only needed by get_report.  An index that only answers
+        get_observation can drop them (reports=False), which makes it much smaller.
+        
+        Parameter weather: The weather report dictionary
+        Precondition: weather is a dictionary formatted as in weather.json
+        
+        Parameter maxage: The oldest a report may be to be used (OPTIONAL)
+        Precondition: maxage is None or an int of seconds >= 0
+        
+        Parameter reports: Whether to keep the raw reports (OPTIONAL)
+        Precondition: reports is a boolean
+        """
+        pairs = []
+        for key in weather:
+            when = utils.parse_iso(key)
+            if when != None:
+                pairs.append((when[0],key))
+        pairs.sort()
+
+        self.times = [pair[0] for pair in pairs]
+        self.observations = [normalize(weather[pair[1]],pair[0]) for pair in pairs]
+        self.reports = [weather[pair[1]] for pair in pairs] if reports else None
+        self.maxage = maxage
+    
+    def __getstate__(self):
+        """
+        Returns the state of this index (for the cache).
+        
+        The observations are stored column by column in compact arrays, which are much
+        faster to save and load than a list of objects.
+        """
+        observations = self.observations
+        return {'times': array.array('q',self.times),
+                'visibility': array.array('d',[obs.visibility for obs in observations]),
+                'wind': array.array('d',[obs.wind for obs in observations]),
+                'crosswind': array.array('d',[obs.crosswind for obs in observations]),
+                'ceiling': array.array('d',[obs.ceiling for obs in observations]),
+                'flags': array.array('B',[obs.flags for obs in observations]),
+                'reports': self.reports,
+                'maxage': self.maxage}
+    
+    def __setstate__(self, state):
+        """
+        Restores this index from the state returned by __getstate__.
+        
+        Parameter state: The cached state
+        Precondition: state is a dictionary returned by __getstate__
+        """
+        self.times = state['times'].tolist()
+        self.observations = list(map(Observation,self.times,state['visibility'],state['wind'],
+                                     state['crosswind'],state['ceiling'],state['flags']))
+        self.reports = state['reports']
+        self.maxage = state['maxage']
+
+    def __len__(self):
+        """
+        Returns the number of observations in this index.
+        """
+        return len(self.times)
+
+    def find(self, takeoff):
+        """
+        Returns the position of the report to use for takeoff, or -1 if there is none.
+        
+        This is the position of the observation at exactly takeoff if there is one.
+        Otherwise it is the position of the most recent observation before takeoff.
+        If that observation is older than maxage, this method returns -1.
+        
+        Parameter takeoff: The takeoff time
+        Precondition: takeoff is a datetime object with a time zone, or an int
+        """
+        takeoff = to_epoch(takeoff)
+        pos = bisect.bisect_right(self.times,takeoff)-1
+        if pos < 0:
+            return -1
+        if self.maxage != None and takeoff-self.times[pos] > self.maxage:
+            return -1
+        return pos
+
+    def get_report(self, takeoff):
+        """
+        Returns the most recent weather report at or before takeoff.
+        
+        If there is no such report (or it is older than maxage), this method
+        returns None.  This method requires an index that keeps its reports.
+        
+        Parameter takeoff: The takeoff time
+        Precondition: takeoff is a datetime object with a time zone, or an int
+        """
+        assert self.reports != None, 'this index does not keep the weather reports'
+        pos = self.find(takeoff)
+        if pos == -1:
+            return None
+        return self.reports[pos]
+
+    def get_observation(self, takeoff):
+        """
+        Returns the normalized weather report to use for takeoff.
+        
+        If there is no such report (or it is older than maxage), this method
+        returns None.
+        
+        Parameter takeoff: The takeoff time
+        Precondition: takeoff is a datetime object with a time zone, or an int
+        """
+        pos = self.find(takeoff)
+        if pos == -1:
+            return None
+        return self.observations[pos]
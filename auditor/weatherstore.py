@@ -0,0 +1,285 @@
+"""
+Module providing a compact binary form of weather.json that is read through mmap.
+
+Loading weather.json with utils.read_json creates a nested dictionary for every hour,
+which for several years of hourly weather is hundreds of megabytes of dictionaries and
+strings.  Yet a normalized weather report (see weather.Observation) is just a handful
+of numbers.  This module converts weather.json ONCE into a file of fixed-size records,
+stored next to it as weather.bin (see violations.py).  The file has three parts:
+
+    header:   the magic bytes, the number of records, and the size and modification
+              time of the weather.json it was converted from
+    index:    the observation times (int64 seconds since the epoch), in ascending order
+    records:  one RECORD per observation time, in the same order
+
+A WeatherStore opens this file with mmap and answers the same queries as a WeatherIndex.
+A lookup is a binary search of the index followed by unpacking a single record, so the
+operating system only pages in the parts of the file that the lessons actually touch.
+The pages are shared by every process that audits the same dataset.
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import os
+import os.path
+import mmap
+import bisect
+import struct
+import utils
+import weather as wx
+
+
+# The first bytes of every binary weather file (the last byte is the format version)
+MAGIC = b'WXSTORE1'
+# The header: magic bytes, record count, source size, source modification time (ns)
+HEADER = struct.Struct('<8sqqq')
+# An observation time in the index
+TIME = struct.Struct('<q')
+# A record: time, visibility, wind, gusts, crosswind, ceiling, flags (padded to 56 bytes)
+RECORD = struct.Struct('<qdddddB7x')
+# The gusts of a record without gusts (NaN)
+NO_GUSTS = float('nan')
+
+
+def source_stamp(source):
+    """
+    Returns the tuple (size, mtime) identifying a version of the file source.
+    
+    The modification time is in nanoseconds.
+    
+    Parameter source: The file name
+    Precondition: source is a string naming a file that exists
+    """
+    info = os.stat(source)
+    return (info.st_size,info.st_mtime_ns)
+
+
+def wind_record(winds):
+    """
+    Returns the tuple (wind, gusts, crosswind) for the wind measurement in knots.
+    
+    The wind is the sustained speed and gusts is NO_GUSTS if there are none.  Otherwise
+    this is the same as weather.wind_knots: 'calm' is all zero and 'unavailable' is
+    INFINITY (with no gusts).
+    
+    Parameter winds: The wind speed information
+    Precondition: winds is a valid wind measurement (a dictionary, the string 'calm',
+    or the string 'unavailable')
+    """
+    if winds == 'unavailable':
+        return (wx.INFINITY,NO_GUSTS,wx.INFINITY)
+    elif winds == 'calm':
+        return (0.0,NO_GUSTS,0.0)
+
+    scale = wx.KNOTS_PER_MPS if winds['units'] == 'MPS' else 1
+    gusts = winds['gusts']*scale if 'gusts' in winds else NO_GUSTS
+    return (winds['speed']*scale,gusts,winds.get('crosswind',0.0)*scale)
+
+
+def convert_weather(source, target):
+    """
+    Converts the weather file source to the binary weather file target.
+    
+    Keys that are not valid timestamps are ignored, and keys without a time zone are
+    treated as UTC (exactly as in WeatherIndex).  The target is written to a temporary
+    file and renamed into place, so a running audit never sees a partial file.  This
+    function returns the number of records written.
+    
+    Parameter source: The weather file to convert
+    Precondition: source is a string naming a file formatted as in weather.json
+    
+    Parameter target: The binary weather file to write
+    Precondition: target is a string that is a valid file name
+    """
+    stamp = source_stamp(source)
+    weather = utils.read_json(source)
+    pairs = []
+    for key in weather:
+        when = utils.parse_iso(key)
+        if when != None:
+            pairs.append((when[0],key))
+    pairs.sort()
+
+    temp = '%s.%d.tmp' % (target,os.getpid())
+    with open(temp,'wb') as file:
+        file.write(HEADER.pack(MAGIC,len(pairs),stamp[0],stamp[1]))
+        for pair in pairs:
+            file.write(TIME.pack(pair[0]))
+        for pair in pairs:
+            report = weather[pair[1]]
+            obs = wx.normalize(report,pair[0])
+            winds = wind_record(report['wind'])
+            file.write(RECORD.pack(pair[0],obs.visibility,winds[0],winds[1],winds[2],
+                                   obs.ceiling,obs.flags))
+    os.replace(temp,target)
+    return len(pairs)
+
+
+def is_current(source, target):
+    """
+    Returns True if target is a binary weather file converted from the current source.
+    
+    If source does not exist, any valid target is current.
+    
+    Parameter source: The weather file
+    Precondition: source is a string that is a valid file name
+    
+    Parameter target: The binary weather file
+    Precondition: target is a string that is a valid file name
+    """
+    try:
+        with open(target,'rb') as file:
+            header = HEADER.unpack(file.read(HEADER.size))
+    except (OSError,struct.error):
+        return False
+    if header[0] != MAGIC:
+        return False
+    if not os.path.exists(source):
+        return True
+    return source_stamp(source) == header[2:]
+
+
+class WeatherStore(object):
+    """
+    A class providing binary-search lookup of a binary weather file.
+    
+    This has the same interface as weather.WeatherIndex for get_observation (it does
+    not keep the raw reports).  The file is mapped into memory, and an Observation is
+    only created for a record when it is requested.
+    
+    A WeatherStore pickles as its file name, so a worker process that receives one
+    maps the same file (and shares its pages) instead of copying the observations.
+    
+    Attribute filename: The binary weather file
+    Invariant: filename is a string naming a file written by convert_weather
+    
+    Attribute times: The observation times, in ascending order
+    Invariant: times is a sequence of ints (a memoryview of the mapped index)
+    
+    Attribute maxage: The oldest a report may be to be used
+    Invariant: maxage is None (no limit) or an int of seconds >= 0
+    """
+
+    def __init__(self, filename, maxage=None):
+        """
+        Initializes a new store for the given binary weather file.
+        
+        Parameter filename: The binary weather file
+        Precondition: filename is a string naming a file written by convert_weather
+        
+        Parameter maxage: The oldest a report may be to be used (OPTIONAL)
+        Precondition: maxage is None or an int of seconds >= 0
+        """
+        self.filename = filename
+        self.maxage = maxage
+        with open(filename,'rb') as file:
+            self._map = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+
+        header = HEADER.unpack_from(self._map,0)
+        assert header[0] == MAGIC, '%s is not a binary weather file' % repr(filename)
+        self._count = header[1]
+        self._records = HEADER.size+self._count*TIME.size
+        assert len(self._map) == self._records+self._count*RECORD.size, \
+            '%s is truncated' % repr(filename)
+        self.times = memoryview(self._map)[HEADER.size:self._records].cast('q')
+
+    def __getstate__(self):
+        """
+        Returns the state of this store for pickling (the file name and maxage).
+        """
+        return {'filename': self.filename, 'maxage': self.maxage}
+
+    def __setstate__(self, state):
+        """
+        Restores this store by mapping the file again.
+        
+        Parameter state: The pickled state
+        Precondition: state is a dictionary returned by __getstate__
+        """
+        self.__init__(state['filename'],state['maxage'])
+
+    def __len__(self):
+        """
+        Returns the number of observations in this store.
+        """
+        return self._count
+
+    def close(self):
+        """
+        Unmaps the file.  The store cannot be used afterwards.
+        """
+        self.times.release()
+        self._map.close()
+
+    def buffer(self):
+        """
+        Returns the records of this store as a read-only memoryview.
+        
+        The view holds len(self) records in the RECORD format, in time order.
+        """
+        return memoryview(self._map)[self._records:]
+
+    def find(self, takeoff):
+        """
+        Returns the position of the report to use for takeoff, or -1 if there is none.
+        
+        This is the same as WeatherIndex.find.
+        
+        Parameter takeoff: The takeoff time
+        Precondition: takeoff is a datetime object with a time zone, or an int
+        """
+        takeoff = wx.to_epoch(takeoff)
+        pos = bisect.bisect_right(self.times,takeoff)-1
+        if pos < 0:
+            return -1
+        if self.maxage != None and takeoff-self.times[pos] > self.maxage:
+            return -1
+        return pos
+
+    def get_record(self, pos):
+        """
+        Returns the record at position pos as a tuple (see RECORD).
+        
+        Parameter pos: The record position
+        Precondition: pos is an int with 0 <= pos < len(self)
+        """
+        return RECORD.unpack_from(self._map,self._records+pos*RECORD.size)
+
+    def get_observation(self, takeoff):
+        """
+        Returns the normalized weather report to use for takeoff.
+        
+        If there is no such report (or it is older than maxage), this method
+        returns None.
+        
+        Parameter takeoff: The takeoff time
+        Precondition: takeoff is a datetime object with a time zone, or an int
+        """
+        pos = self.find(takeoff)
+        if pos == -1:
+            return None
+        time, visibility, wind, gusts, crosswind, ceiling, flags = self.get_record(pos)
+        if gusts == gusts:
+            wind = gusts
+        return wx.Observation(time,visibility,wind,crosswind,ceiling,flags)
+
+
+def open_store(source, target, maxage=None):
+    """
+    Returns the WeatherStore for the binary weather file target, or None if not current.
+    
+    The store is only used if target was converted from the current version of the
+    weather file source (see is_current).
+    
+    Parameter source: The weather file
+    Precondition: source is a string that is a valid file name
+    
+    Parameter target: The binary weather file
+    Precondition: target is a string that is a valid file name
+    
+    Parameter maxage: The oldest a report may be to be used (OPTIONAL)
+    Precondition: maxage is None or an int of seconds >= 0
+    """
+    if not is_current(source,target):
+        return None
+    return WeatherStore(target,maxage)
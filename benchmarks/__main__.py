@@ -0,0 +1,20 @@
+"""
+The script code for the benchmark suite.
+
+The suite times the auditor, so the auditor folder is added to the module search path
+before the harness is imported.  Run it from the repository as
+
+    python benchmarks run [dataset ...] [--out results.json]
+    python benchmarks compare baseline.json results.json
+    python benchmarks generate directory [--lessons N]
+
+(see harness.execute for all of the options).
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import sys, os.path
+sys.path.insert(1,os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'auditor'))
+import harness
+if __name__ == '__main__':      # Worker processes import this file too
+    sys.exit(harness.execute(sys.argv[1:]))
@@ -0,0 +1,461 @@
+"""
+Module that runs the benchmark suite and compares its results.
+
+Each benchmark (see stages.py) is timed one call at a time with time.perf_counter_ns,
+so the results include the latency percentiles and not just the average.  The calls are
+repeated to smooth out noise.  The peak memory is measured with tracemalloc in one extra
+pass, since tracing every allocation slows the calls down too much to time them.
+
+The results are saved as JSON, like this (the times are in seconds and the memory is
+in bytes):
+
+    {
+        "format": 1,
+        "created": "2026-10-18T14:30:00",
+        "environment": {"python": "3.11.4", "platform": "Linux-...", "numpy": true, ...},
+        "settings": {"sample": 1000, "repeat": 5, "scale": 10},
+        "benchmarks": {
+            "KITH-2017/get_minimums": {"calls": 5000, "total": 0.41, "ops_per_sec": 12195.1,
+                                       "mean": 8.2e-05, "p50": 7.9e-05, "p90": 9.1e-05,
+                                       "p99": 0.00014, "max": 0.0009, "peak_memory": 2048},
+            "KITH-2017/read_json/weather": {"skipped": "missing weather.json"},
+            ...
+        }
+    }
+
+A saved result can be used as a baseline.  The compare command lists every benchmark in
+both files and flags it as a regression if it lost more than a threshold of its ops/sec,
+or grew its peak memory by more than that threshold.
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import os
+import os.path
+import gc
+import json
+import shutil
+import time
+import datetime
+import platform
+import tracemalloc
+import stages
+import synthetic
+
+
+# The version of the JSON results
+FORMAT = 1
+# The number of times each benchmark is run
+REPEAT = 5
+# The number of times each pipeline benchmark is run (each run is a whole audit)
+PIPELINE_REPEAT = 3
+# The fraction of ops/sec (or of peak memory) that may be lost before it is a regression
+THRESHOLD = 0.10
+# Differences in peak memory below this many bytes are never a regression
+MEMORY_SLACK = 64*1024
+# The latency percentiles in the results
+PERCENTILES = (50,90,99)
+# The datasets to benchmark by default (next to the benchmarks folder)
+DATASETS = ['KITH-2017','KITH-2018','KITH-2019']
+# The synthetic dataset also benchmarked by default, as the KITH datasets have no weather.json
+GENERATED = 'synthetic'
+# The number of lessons in the generated dataset (as many as KITH-2017)
+GENERATED_LESSONS = synthetic.LESSONS//10
+
+# The usage message for a malformed command line
+USAGE = ('Usage: python benchmarks run [dataset ...] [--out results.json] [--sample N] [--repeat N]\n'+
+         '                             [--scale N] [--only TEXT]\n'+
+         '       python benchmarks compare baseline.json results.json [--threshold PERCENT]\n'+
+         '       python benchmarks generate directory [--lessons N] [--years N] [--start YEAR]\n'+
+         '                             [--fleet N] [--rate PERCENT] [--seed N]')
+
+# The command line options (which all take a value) and their default values
+OPTIONS = {'--out': 'benchmarks.json', '--sample': str(stages.SAMPLE), '--repeat': str(REPEAT),
+           '--scale': '0', '--only': '', '--threshold': str(round(THRESHOLD*100)),
+           '--lessons': str(synthetic.LESSONS), '--years': '1', '--start': str(synthetic.START),
+           '--fleet': '0', '--rate': str(round(synthetic.RATE*100)), '--seed': '0'}
+
+
+def percentile(values, percent):
+    """
+    Returns the given percentile of values (by the nearest-rank method).
+    
+    Parameter values: The values
+    Precondition: values is a non-empty list of numbers, sorted in ascending order
+    
+    Parameter percent: The percentile
+    Precondition: percent is a number with 0 < percent <= 100
+    """
+    rank = -(-len(values)*percent//100)
+    return values[max(0,int(rank)-1)]
+
+
+def measure(function, inputs, repeat=REPEAT):
+    """
+    Returns the statistics of calling function(x) for every x in inputs.
+    
+    The calls are made repeat times over all of inputs, and every call is timed.  The
+    result is a dictionary with the number of calls, the total time, the ops/sec, the
+    mean, percentile, and maximum latency (in seconds), and the peak memory allocated
+    by one pass over the inputs (in bytes, see the module docstring).
+    
+    Parameter function: The function to time
+    Precondition: function is a function of one argument
+    
+    Parameter inputs: The arguments of the calls
+    Precondition: inputs is a non-empty list
+    
+    Parameter repeat: The number of passes over inputs
+    Precondition: repeat is an int > 0
+    """
+    clock = time.perf_counter_ns
+    latencies = []
+    gc.collect()
+    for run in range(repeat):
+        for value in inputs:
+            start = clock()
+            function(value)
+            latencies.append(clock()-start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for value in inputs:
+            function(value)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    total = sum(latencies)/1e9
+    result = {'calls': len(latencies), 'total': total,
+              'ops_per_sec': len(latencies)/total if total > 0 else float('inf'),
+              'mean': total/len(latencies)}
+    for percent in PERCENTILES:
+        result['p%d' % percent] = percentile(latencies,percent)/1e9
+    result['max'] = latencies[-1]/1e9
+    result['peak_memory'] = peak
+    return result
+
+
+def run_benchmark(directory, entry, sample, repeat):
+    """
+    Returns the statistics of one benchmark on the dataset directory.
+    
+    If the dataset is missing a file the benchmark requires, or the workload is empty,
+    the result is a dictionary with the single key 'skipped' giving the reason.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory
+    
+    Parameter entry: The benchmark
+    Precondition: entry is a triple (name, requires, setup) as in stages.py
+    
+    Parameter sample: The number of lessons for the stage benchmarks
+    Precondition: sample is an int > 0
+    
+    Parameter repeat: The number of passes over the workload
+    Precondition: repeat is an int > 0
+    """
+    name, requires, setup = entry
+    missing = stages.missing_files(directory,requires)
+    if missing:
+        return {'skipped': 'missing '+', '.join(missing)}
+    function, inputs = setup(directory,sample)
+    if len(inputs) == 0:
+        return {'skipped': 'no input'}
+    return measure(function,inputs,repeat)
+
+
+def environment():
+    """
+    Returns a dictionary describing the machine and Python running the benchmarks.
+    """
+    try:
+        import numpy
+        has_numpy = True
+    except ImportError:
+        has_numpy = False
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'numpy': has_numpy}
+
+
+def run_suite(datasets, sample=stages.SAMPLE, repeat=REPEAT, scale=0, only='', report=None):
+    """
+    Returns the results (as a dictionary, see the module docstring) of the whole suite.
+    
+    Every stage and pipeline benchmark is run on every dataset, under the name
+    'dataset/benchmark' (where dataset is the name of the directory).  If scale is
+    greater than 1, the pipeline benchmarks are also run on a copy of each dataset with
+    scale times the lessons (named 'datasetxN'; see stages.scale_dataset).  The copies
+    are made in a folder .benchmark-data next to the dataset, and removed afterwards.
+    
+    Parameter datasets: The dataset directories
+    Precondition: datasets is a list of strings naming directories
+    
+    Parameter sample: The number of lessons for the stage benchmarks (OPTIONAL)
+    Precondition: sample is an int > 0
+    
+    Parameter repeat: The number of passes over each workload (OPTIONAL)
+    Precondition: repeat is an int > 0
+    
+    Parameter scale: The factor for the scaled datasets, or 0 for none (OPTIONAL)
+    Precondition: scale is an int >= 0
+    
+    Parameter only: Only run the benchmarks whose name contains this text (OPTIONAL)
+    Precondition: only is a string
+    
+    Parameter report: The function to call with each result as it finishes (OPTIONAL)
+    Precondition: report is None or a function of two arguments (name, statistics)
+    """
+    plan = []
+    for directory in datasets:
+        label = os.path.basename(os.path.normpath(directory))
+        for entry in stages.STAGES:
+            plan.append((label+'/'+entry[0],directory,entry,repeat,None))
+        for entry in stages.PIPELINE:
+            plan.append((label+'/'+entry[0],directory,entry,min(repeat,PIPELINE_REPEAT),None))
+        if scale > 1:
+            scaled = os.path.join(os.path.dirname(os.path.abspath(directory)),'.benchmark-data',
+                                  '%sx%d' % (label,scale))
+            for entry in stages.PIPELINE:
+                plan.append(('%sx%d/%s' % (label,scale,entry[0]),scaled,entry,1,directory))
+    
+    results = {}
+    made = []
+    try:
+        for name, directory, entry, count, source in plan:
+            if not only in name:
+                continue
+            if source != None and not directory in made:
+                stages.scale_dataset(source,scale,directory)
+                made.append(directory)
+            results[name] = run_benchmark(directory,entry,sample,count)
+            if report != None:
+                report(name,results[name])
+    finally:
+        for directory in made:
+            shutil.rmtree(directory,ignore_errors=True)
+            try:
+                os.rmdir(os.path.dirname(directory))
+            except OSError:
+                pass
+    
+    return {'format': FORMAT, 'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'environment': environment(),
+            'settings': {'sample': sample, 'repeat': repeat, 'scale': scale},
+            'benchmarks': results}
+
+
+def format_time(seconds):
+    """
+    Returns a short string for a duration, in the most readable unit.
+    
+    Parameter seconds: The duration
+    Precondition: seconds is a number >= 0
+    """
+    if seconds >= 1:
+        return '%.2fs' % seconds
+    elif seconds >= 1e-3:
+        return '%.2fms' % (seconds*1e3)
+    return '%.1fus' % (seconds*1e6)
+
+
+def format_memory(size):
+    """
+    Returns a short string for a number of bytes.
+    
+    Parameter size: The number of bytes
+    Precondition: size is an int >= 0
+    """
+    if size >= 1 << 20:
+        return '%.1fMB' % (size/(1 << 20))
+    return '%.1fKB' % (size/(1 << 10))
+
+
+def summarize(name, stats):
+    """
+    Returns a one-line summary of the statistics of a benchmark.
+    
+    Parameter name: The name of the benchmark
+    Precondition: name is a string
+    
+    Parameter stats: The statistics of the benchmark
+    Precondition: stats is a dictionary returned by run_benchmark
+    """
+    if 'skipped' in stats:
+        return '%-44s skipped (%s)' % (name,stats['skipped'])
+    return '%-44s %12.1f ops/s  p50 %9s  p99 %9s  peak %9s' % (name,stats['ops_per_sec'],
+        format_time(stats['p50']),format_time(stats['p99']),format_memory(stats['peak_memory']))
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """
+    Returns the list of comparisons between two benchmark results.
+    
+    Every comparison is a tuple (name, speed, memory, regressed).  The values speed and
+    memory are the relative change in ops/sec and in peak memory (so -0.25 is 25% fewer
+    ops/sec).  The value regressed is True if the benchmark lost more than threshold of
+    its ops/sec, or gained more than threshold of its peak memory (and more than
+    MEMORY_SLACK bytes).  Benchmarks that are missing or skipped in either result are
+    left out.
+    
+    Parameter baseline: The saved results
+    Precondition: baseline is a dictionary returned by run_suite
+    
+    Parameter current: The new results
+    Precondition: current is a dictionary returned by run_suite
+    
+    Parameter threshold: The fraction that may be lost before it is a regression (OPTIONAL)
+    Precondition: threshold is a number >= 0
+    """
+    result = []
+    for name in sorted(current['benchmarks']):
+        new = current['benchmarks'][name]
+        old = baseline['benchmarks'].get(name)
+        if old == None or 'skipped' in old or 'skipped' in new:
+            continue
+        speed = new['ops_per_sec']/old['ops_per_sec']-1
+        grown = new['peak_memory']-old['peak_memory']
+        memory = grown/old['peak_memory'] if old['peak_memory'] > 0 else 0.0
+        regressed = speed < -threshold or (memory > threshold and grown > MEMORY_SLACK)
+        result.append((name,speed,memory,regressed))
+    return result
+
+
+def read_results(filename):
+    """
+    Returns the benchmark results saved in filename.
+    
+    Parameter filename: The JSON file to read
+    Precondition: filename is a string naming a file written by write_results
+    """
+    with open(filename) as file:
+        results = json.load(file)
+    assert results.get('format') == FORMAT, '%s is not a benchmark result' % repr(filename)
+    return results
+
+
+def write_results(results, filename):
+    """
+    Saves the benchmark results in the JSON file filename.
+    
+    Parameter results: The benchmark results
+    Precondition: results is a dictionary returned by run_suite
+    
+    Parameter filename: The JSON file to write
+    Precondition: filename is a string that is a valid file name
+    """
+    with open(filename,'w') as file:
+        json.dump(results,file,indent=2,sort_keys=True)
+        file.write('\n')
+
+
+def parse_arguments(args):
+    """
+    Returns the pair (positional, options) for the command line arguments, or None.
+    
+    The value positional is the list of arguments that are not options.  The value
+    options is a dictionary with a value for every option in OPTIONS (the default if
+    the option was not given).  If an option is missing its value, or is not in OPTIONS,
+    this function returns None.
+    
+    Parameter args: The command line arguments (minus the command)
+    Precondition: args is a list of strings
+    """
+    positional = []
+    options = dict(OPTIONS)
+    pos = 0
+    while pos < len(args):
+        if args[pos].startswith('--'):
+            if not args[pos] in OPTIONS or pos+1 == len(args):
+                return None
+            options[args[pos]] = args[pos+1]
+            pos += 2
+        else:
+            positional.append(args[pos])
+            pos += 1
+    return (positional,options)
+
+
+def execute(args):
+    """
+    Executes the benchmark command line, returning the exit status.
+    
+    The command 'run' runs the suite on the given datasets, printing a summary of every
+    benchmark as it finishes, and saves the results to the --out file.  By default, the
+    datasets are the KITH datasets next to the benchmarks folder and a synthetic dataset
+    of GENERATED_LESSONS lessons (with seed 0), which is written to .benchmark-data and
+    removed afterwards.  The KITH datasets have no weather.json, so without it the
+    weather and pipeline benchmarks would all be skipped.  The command 'compare' prints the change of
+    every benchmark between two saved results.  Its exit status is 1 if any benchmark
+    regressed (so it can fail a build), and 0 otherwise.  The command 'generate' writes a
+    synthetic dataset (see synthetic.py) to the given directory, which can then be given
+    to 'run'.
+    
+    Parameter args: The command line arguments (minus the application name)
+    Precondition: args is a list of strings
+    """
+    parsed = None if len(args) == 0 else parse_arguments(args[1:])
+    if parsed == None:
+        print(USAGE)
+        return 2
+    positional, options = parsed
+    try:
+        sample = int(options['--sample'])
+        repeat = int(options['--repeat'])
+        scale = int(options['--scale'])
+        threshold = float(options['--threshold'])/100
+        assert sample > 0 and repeat > 0 and scale >= 0 and threshold >= 0
+    except (ValueError,AssertionError):
+        print(USAGE)
+        return 2
+
+    if args[0] == 'run':
+        generated = None
+        if len(positional) == 0:
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            generated = os.path.join(root,'.benchmark-data',GENERATED)
+            synthetic.generate_dataset(generated,GENERATED_LESSONS)
+            positional = [os.path.join(root,name) for name in DATASETS]+[generated]
+        try:
+            results = run_suite(positional,sample,repeat,scale,options['--only'],
+                                lambda name, stats: print(summarize(name,stats),flush=True))
+        finally:
+            if generated != None:
+                shutil.rmtree(generated,ignore_errors=True)
+                try:
+                    os.rmdir(os.path.dirname(generated))
+                except OSError:
+                    pass
+        write_results(results,options['--out'])
+        print('Results written to %s.' % options['--out'])
+        return 0
+
+    if args[0] == 'compare' and len(positional) == 2:
+        comparisons = compare(read_results(positional[0]),read_results(positional[1]),threshold)
+        regressions = 0
+        for name, speed, memory, regressed in comparisons:
+            print('%-44s %+8.1f%% ops/s  %+8.1f%% peak%s' % (name,speed*100,memory*100,
+                                                           '  REGRESSION' if regressed else ''))
+            regressions += regressed
+        print('%d of %d benchmarks regressed.' % (regressions,len(comparisons)))
+        return 1 if regressions else 0
+
+    if args[0] == 'generate' and len(positional) == 1:
+        try:
+            lessons = int(options['--lessons'])
+            years = int(options['--years'])
+            start = int(options['--start'])
+            fleet = int(options['--fleet'])
+            rate = float(options['--rate'])/100
+            assert lessons >= 0 and years > 0 and fleet >= 0 and 0 <= rate <= 1
+        except (ValueError,AssertionError):
+            print(USAGE)
+            return 2
+        synthetic.generate_dataset(positional[0],lessons,years,start,fleet,rate,options['--seed'])
+        print('Wrote %d lessons to %s.' % (lessons,positional[0]))
+        return 0
+
+    print(USAGE)
+    return 2
@@ -0,0 +1,396 @@
+"""
+Module defining the workloads of the benchmark suite.
+
+Every benchmark is a triple (name, requires, setup).  The value requires is the list of
+dataset files the benchmark reads; a dataset without one of them skips the benchmark.
+The function setup(directory, sample) prepares the workload OUTSIDE of the timed region
+and returns a pair (function, inputs).  The suite then times function(x) for every x
+in inputs (see harness.measure).
+
+There are two kinds of benchmarks.  The stage benchmarks time the hot paths one call at
+a time on a sample of the lessons: reading the files, get_weather_report, get_minimums,
+get_certification, and daytime.  Each stage is timed twice, once with the raw rows and
+dictionaries of the dataset files and once with the compiled form the audit actually
+uses (a WeatherIndex, a MinimumsTable, a Timeline, a DaycycleTable).  The pipeline
+benchmarks time a whole audit of the dataset (app.audit_dataset), with the cache of
+compiled reference files cold and warm.
+
+The startup benchmarks run the application in a new interpreter, as a user would, so
+they include the time to start Python and import the modules.  One prints the usage
+message and the other audits the dataset with a warm cache.  The memory of the new
+interpreter is not measured.
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import os
+import os.path
+import sys
+import shutil
+import subprocess
+import utils
+import pilots
+import weather as wx
+import violations
+import app
+
+
+# The number of lessons sampled for the stage benchmarks
+SAMPLE = 1000
+# The number of times the usage message is printed by the startup benchmark
+LAUNCHES = 20
+# The application directory (run as 'python auditor')
+APPLICATION = os.path.dirname(os.path.abspath(app.__file__))
+
+# FILENAMES (see violations.py)
+DAYCYCLE = violations.DAYCYCLE
+WEATHER  = violations.WEATHER
+MINIMUMS = violations.MINIMUMS
+STUDENTS = violations.STUDENTS
+LESSONS  = violations.LESSONS
+# Every file read by a full audit
+DATASET  = [DAYCYCLE,WEATHER,MINIMUMS,STUDENTS,LESSONS,'instructors.csv','fleet.csv','repairs.csv']
+
+
+def sample_lessons(directory, sample):
+    """
+    Returns up to sample lesson rows of the dataset, spread evenly over the year.
+    
+    Lessons without a valid takeoff are left out.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with a lessons.csv
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    rows = utils.read_csv(os.path.join(directory,LESSONS))[1:]
+    step = max(1,len(rows)//sample)
+    result = []
+    for row in rows[::step][:sample]:
+        if utils.str_to_time(row[3]) != None:
+            result.append(row)
+    return result
+
+
+def sample_takeoffs(directory, sample):
+    """
+    Returns the takeoff times (as datetime objects) of sample_lessons.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with a lessons.csv
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    return [utils.str_to_time(row[3]) for row in sample_lessons(directory,sample)]
+
+
+def read_file(reader, name):
+    """
+    Returns a setup function for timing reader on the dataset file name.
+    
+    Parameter reader: The function to read the file
+    Precondition: reader is utils.read_csv or utils.read_json
+    
+    Parameter name: The dataset file
+    Precondition: name is a string
+    """
+    def setup(directory, sample):
+        return (reader,[os.path.join(directory,name)])
+    return setup
+
+
+def setup_weather_report(directory, sample):
+    """
+    Returns the workload for get_weather_report on the weather dictionary.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    weather = utils.read_json(os.path.join(directory,WEATHER))
+    return (lambda takeoff: violations.get_weather_report(takeoff,weather),
+            sample_takeoffs(directory,sample))
+
+
+def setup_weather_index(directory, sample):
+    """
+    Returns the workload for get_weather_report on a WeatherIndex.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    index = wx.WeatherIndex(utils.read_json(os.path.join(directory,WEATHER)))
+    return (lambda takeoff: violations.get_weather_report(takeoff,index),
+            sample_takeoffs(directory,sample))
+
+
+def minimums_queries(directory, sample):
+    """
+    Returns the get_minimums arguments (minus the table) for the sampled lessons.
+    
+    Each query is the tuple (cert, area, instructed, vfr, daytime) for one lesson.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    timelines = pilots.Timelines(utils.read_registry(os.path.join(directory,STUDENTS)))
+    daycycle = utils.DaycycleTable(utils.read_json(os.path.join(directory,DAYCYCLE)))
+    queries = []
+    for row in sample_lessons(directory,sample):
+        takeoff = utils.str_to_time(row[3])
+        cert = pilots.get_certification(takeoff,timelines.get(row[0]))
+        queries.append((cert,row[6],row[2] != '',row[5] == 'VFR',utils.daytime(takeoff,daycycle)))
+    return queries
+
+
+def setup_minimums(directory, sample):
+    """
+    Returns the workload for get_minimums on the minimums table.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    minimums = utils.read_csv(os.path.join(directory,MINIMUMS))
+    return (lambda query: pilots.get_minimums(*query,minimums),
+            minimums_queries(directory,sample))
+
+
+def setup_minimums_table(directory, sample):
+    """
+    Returns the workload for a compiled MinimumsTable.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    table = pilots.MinimumsTable(utils.read_csv(os.path.join(directory,MINIMUMS)))
+    return (lambda query: table.get(*query),minimums_queries(directory,sample))
+
+
+def setup_certification(directory, sample):
+    """
+    Returns the workload for get_certification on the student rows.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    students = utils.read_registry(os.path.join(directory,STUDENTS))
+    pairs = []
+    for row in sample_lessons(directory,sample):
+        if row[0] in students:
+            pairs.append((utils.str_to_time(row[3]),students.get(row[0])))
+    return (lambda pair: pilots.get_certification(*pair),pairs)
+
+
+def setup_timeline(directory, sample):
+    """
+    Returns the workload for get_certification on pre-parsed Timelines.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    timelines = pilots.Timelines(utils.read_registry(os.path.join(directory,STUDENTS)))
+    pairs = []
+    for row in sample_lessons(directory,sample):
+        pairs.append((utils.str_to_time(row[3]),timelines.get(row[0])))
+    return (lambda pair: pilots.get_certification(*pair),pairs)
+
+
+def setup_daytime(directory, sample):
+    """
+    Returns the workload for daytime on the daycycle dictionary.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    daycycle = utils.read_json(os.path.join(directory,DAYCYCLE))
+    return (lambda takeoff: utils.daytime(takeoff,daycycle),sample_takeoffs(directory,sample))
+
+
+def setup_daycycle_table(directory, sample):
+    """
+    Returns the workload for daytime on a DaycycleTable.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons
+    Precondition: sample is an int > 0
+    """
+    table = utils.DaycycleTable(utils.read_json(os.path.join(directory,DAYCYCLE)))
+    return (lambda takeoff: utils.daytime(takeoff,table),sample_takeoffs(directory,sample))
+
+
+def setup_cold_audit(directory, sample):
+    """
+    Returns the workload for a full audit that compiles every reference file.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons (ignored; the audit checks them all)
+    Precondition: sample is an int > 0
+    """
+    return (lambda path: app.audit_dataset(path,use_cache=False),[directory])
+
+
+def setup_warm_audit(directory, sample):
+    """
+    Returns the workload for a full audit with a current cache of reference files.
+    
+    The cache is filled here, so that it is warm for every timed run.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons (ignored; the audit checks them all)
+    Precondition: sample is an int > 0
+    """
+    violations.load_weather_references(directory)
+    return (lambda path: app.audit_dataset(path),[directory])
+
+
+def launch(args):
+    """
+    Runs the application in a new interpreter with the given command line arguments.
+    
+    The output of the application is thrown away.
+    
+    Parameter args: The command line arguments (minus the application name)
+    Precondition: args is a list of strings
+    """
+    subprocess.run([sys.executable,APPLICATION]+args,stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+
+
+def setup_usage(directory, sample):
+    """
+    Returns the workload for starting the application with no arguments.
+    
+    The application just prints its usage message, so this is the cost of starting
+    Python and importing the application.
+    
+    Parameter directory: The dataset directory (ignored)
+    Precondition: directory is a string
+    
+    Parameter sample: The number of lessons (ignored)
+    Precondition: sample is an int > 0
+    """
+    return (launch,[[]]*LAUNCHES)
+
+
+def setup_launch_audit(directory, sample):
+    """
+    Returns the workload for auditing the dataset in a new interpreter.
+    
+    The cache is filled here, so that it is warm for every timed run.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with the dataset files
+    
+    Parameter sample: The number of lessons (ignored; the audit checks them all)
+    Precondition: sample is an int > 0
+    """
+    violations.load_weather_references(directory)
+    return (launch,[[os.path.abspath(directory)]])
+
+
+# The stage benchmarks (see the module docstring)
+STAGES = [
+    ('read_csv',                    [LESSONS],                  read_file(utils.read_csv,LESSONS)),
+    ('read_json/daycycle',          [DAYCYCLE],                 read_file(utils.read_json,DAYCYCLE)),
+    ('read_json/weather',           [WEATHER],                  read_file(utils.read_json,WEATHER)),
+    ('get_weather_report',          [WEATHER,LESSONS],          setup_weather_report),
+    ('get_weather_report/index',    [WEATHER,LESSONS],          setup_weather_index),
+    ('get_minimums',                [MINIMUMS,STUDENTS,DAYCYCLE,LESSONS],setup_minimums),
+    ('get_minimums/table',          [MINIMUMS,STUDENTS,DAYCYCLE,LESSONS],setup_minimums_table),
+    ('get_certification',           [STUDENTS,LESSONS],         setup_certification),
+    ('get_certification/timeline',  [STUDENTS,LESSONS],         setup_timeline),
+    ('daytime',                     [DAYCYCLE,LESSONS],         setup_daytime),
+    ('daytime/table',               [DAYCYCLE,LESSONS],         setup_daycycle_table),
+    ('startup/usage',               [],                         setup_usage),
+]
+
+# The pipeline benchmarks (see the module docstring)
+PIPELINE = [
+    ('discover_violations/cold',    DATASET,                    setup_cold_audit),
+    ('discover_violations/warm',    DATASET,                    setup_warm_audit),
+    ('startup/audit',               DATASET,                    setup_launch_audit),
+]
+
+
+def missing_files(directory, requires):
+    """
+    Returns the list of files in requires that are not in the dataset directory.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string
+    
+    Parameter requires: The names of the required files
+    Precondition: requires is a list of strings
+    """
+    return [name for name in requires if not os.path.exists(os.path.join(directory,name))]
+
+
+def scale_dataset(directory, factor, target):
+    """
+    Creates a copy of the dataset directory in target with factor times the lessons.
+    
+    The lessons of the copy are the lessons of directory repeated factor times.  The
+    other files are linked (or copied, where links are not supported).  If target
+    already exists, it is replaced.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory with a lessons.csv
+    
+    Parameter factor: The number of copies of the lessons
+    Precondition: factor is an int > 0
+    
+    Parameter target: The directory to create
+    Precondition: target is a string that is a valid directory name
+    """
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.makedirs(target)
+    for name in os.listdir(directory):
+        source = os.path.abspath(os.path.join(directory,name))
+        if name == LESSONS or not os.path.isfile(source):
+            continue
+        try:
+            os.symlink(source,os.path.join(target,name))
+        except OSError:
+            shutil.copyfile(source,os.path.join(target,name))
+
+    with open(os.path.join(directory,LESSONS),'rb') as file:
+        header = file.readline()
+        body = file.read()
+    if body != b'' and not body.endswith(b'\n'):
+        body += b'\n'
+    with open(os.path.join(target,LESSONS),'wb') as file:
+        file.write(header)
+        for copy in range(factor):
+            file.write(body)
@@ -0,0 +1,930 @@
+"""
+Module that generates synthetic datasets for testing the auditor at scale.
+
+The KITH datasets have only a few thousand lessons.  This module writes a complete
+dataset directory of any size, with the same eight files and the same formats:
+
+    daycycle.json:    sunrise and sunset for every day (computed for Ithaca, NY)
+    weather.json:     an hourly report for every hour of the audit, newest first
+    minimums.csv:     the minimums of the KITH datasets
+    students.csv:     the students and the dates of their milestones
+    instructors.csv:  the instructors and their ratings
+    fleet.csv:        the planes, in the same mix of models as KITH
+    repairs.csv:      the repairs, in order of the IN DATE
+    lessons.csv:      the lessons, in order of takeoff
+
+The data is self-consistent.  Planes go to the shop for their 100 hour and annual
+inspections before they are due, lessons only use planes that are not in the shop, and
+every lesson has the credentials it needs.  Violations are then added on purpose, so
+that about rate of the lessons violate something.  Half of these are bad weather (an
+hourly report below every minimum, or with a measurement 'unavailable').  The other
+half are lessons that fly a plane in the shop (when one is in the shop that day) or that
+lack a credential (a solo before the student has soloed, an advanced plane without the
+endorsement, or an IFR flight without an instrument rating).
+
+All of the choices come from random number generators seeded with the seed, so the
+same arguments always produce the same files.  The lessons, students, and weather are
+written as they are generated, so the memory use does not grow with the number of
+lessons (only with the number of students and planes).
+
+Author: Melissa Nondorf
+Date: 10/18/26
+"""
+import os
+import os.path
+import csv
+import json
+import math
+import array
+import bisect
+import random
+import datetime
+import utils
+
+
+# The default number of lessons (ten times KITH-2017)
+LESSONS = 58440
+# The default first year of the lessons
+START = 2017
+# The default fraction of lessons with a violation
+RATE = 0.05
+
+# The number of lessons flown in a year for every plane, student, and instructor (as KITH)
+LESSONS_PER_PLANE = 420
+LESSONS_PER_STUDENT = 48
+LESSONS_PER_INSTRUCTOR = 450
+# The fewest planes, students, and instructors in a dataset
+MIN_FLEET = 4
+MIN_STUDENTS = 10
+MIN_INSTRUCTORS = 4
+
+# The location of the flight school (the latitude and longitude in daycycle.json are
+# swapped, exactly as in the KITH datasets)
+LOCATION = {'city': 'Ithaca', 'state': 'New York', 'latitude': '076-29W',
+            'longitude': '42-26N', 'timezone': 'America/New_York'}
+LATITUDE = 42.44
+LONGITUDE = -76.48
+# The extra years of daycycle.json before and after the lessons
+DAYCYCLE_MARGIN = 2
+
+# The minimums of the KITH datasets
+MINIMUMS = [['CATEGORY','CONDITIONS','AREA','TIME','CEILING','VISIBILITY','WIND','CROSSWIND'],
+            ['Student','VMC','Pattern','Day','2000','5','20','8'],
+            ['Student','VMC','Practice Area','Day','3000','10','20','8'],
+            ['Student','VMC','Cross Country','Day','3500','10','20','8'],
+            ['Certified','VMC','Pattern','Day','1500','5','20','10'],
+            ['Certified','VMC','Practice Area','Day','3000','10','20','10'],
+            ['Certified','VMC','Cross Country','Day','3000','10','20','10'],
+            ['Certified','VMC','Local','Night','3000','10','20','10'],
+            ['Certified','VMC','Cross Country','Night','5000','10','20','10'],
+            ['50 Hours','VMC','Pattern','Day','1500','5','25','15'],
+            ['50 Hours','VMC','Practice Area','Day','2000','8','25','15'],
+            ['50 Hours','VMC','Cross Country','Day','2500','10','25','15'],
+            ['50 Hours','VMC','Local','Night','3000','10','20','10'],
+            ['50 Hours','VMC','Cross Country','Night','5000','10','20','10'],
+            ['Dual','VMC','Pattern','Day','1500','3','30','20'],
+            ['Dual','VMC','Practice Area','Day','2000','5','30','20'],
+            ['Dual','VMC','Cross Country','Day','2000','5','30','20'],
+            ['Dual','VMC','Local','Night','3000','10','20','10'],
+            ['Dual','VMC','Cross Country','Night','5000','10','20','10'],
+            ['Certified','IMC','Any','Day','500','1','25','15'],
+            ['Certified','IMC','Any','Night','1000','2','25','15'],
+            ['Dual','IMC','Any','Day','500','0.75','30','20'],
+            ['Dual','IMC','Any','Night','1000','2','25','15']]
+
+# Good weather is at least as good as every minimum above (visibility in miles, ceiling
+# in feet, and winds in knots); bad weather is worse than every minimum
+GOOD_VISIBILITY = 10
+GOOD_CEILING = 5500
+GOOD_WIND = 15
+GOOD_GUSTS = 19
+GOOD_CROSSWIND = 7
+BAD_VISIBILITY = 0.5
+BAD_CEILING = 400
+BAD_WIND = 35
+BAD_CROSSWIND = 25
+# The units conversions (see weather.py)
+FEET_PER_MILE = 5280
+KNOTS_PER_MPS = 1.94384
+# The chance that an hour has no weather report
+MISSING_REPORT = 0.01
+# The cloud layers that set the ceiling, and those that do not
+CEILING_LAYERS = ('broken','overcast','indefinite ceiling')
+OTHER_LAYERS = ('a few','scattered')
+
+# The airplane models (type, capability, advanced, multiengine), repeated as in KITH
+MODELS = [('Cessna 152','VFR','No','No')]*3+[('Cessna 172','IFR','No','No')]*3+\
+         [('Cessna 172S','IFR','No','No')]*2+\
+         [('Cessna 182','IFR','Yes','No'),('Cessna 206','IFR','Yes','No'),
+          ('Piper Cherokee 161','VFR','No','No'),('Piper Arrow 200','IFR','Yes','No'),
+          ('Piper Seneca 200T','IFR','Yes','Yes'),('Cirrus SR22','IFR','Yes','No')]
+# The hours at which a plane goes to the shop for its 100 hour inspection
+SERVICE_HOURS = 90
+# The days after its last annual at which a plane goes to the shop for its next one
+ANNUAL_DUE = 355
+# The chance that a plane goes to the shop for some other repair on any day
+REPAIR_CHANCE = 0.002
+# The other repairs
+REPAIRS = ('minor repair','minor repair','minor repair','medium repair','major repair')
+
+# The lesson areas and their chances
+AREAS = (('Pattern',0.68),('Practice Area',0.27),('Cross Country',0.05))
+# The lesson lengths in hours and their chances
+LENGTHS = ((2,0.83),(3,0.15),(4,0.02))
+# The chance that a lesson is filed IFR (if the plane and pilots allow it)
+IFR_CHANCE = 0.11
+# The chance that a student who may fly solo does so
+SOLO_CHANCE = 0.35
+# The earliest and latest takeoff hours (takeoffs are also between sunrise and sunset)
+FIRST_HOUR = 8
+LAST_HOUR = 18
+# The days after joining that a student stays active
+ACTIVE_DAYS = 730
+# The number of random planes to try before searching the whole fleet
+PLANE_TRIES = 8
+
+# The milestones of students.csv, as (column, previous milestone, chance, least days,
+# most days); each milestone comes a random number of days after the previous one
+MILESTONES = [('SOLO','JOINED',1.0,30,200),
+              ('LICENSE','SOLO',0.6,60,300),
+              ('50 HOURS','LICENSE',0.7,30,200),
+              ('INSTRUMENT','50 HOURS',0.5,10,300),
+              ('ADVANCED','LICENSE',0.4,10,400),
+              ('MULTIENGINE','ADVANCED',0.3,30,300)]
+# A day after every other day (a milestone that is never reached)
+NEVER = 2**31-1
+
+# The names for students and instructors
+FIRST_NAMES = ['Alan','Ashley','Austin','Brian','Bruce','Charles','Donald','Doris','Frances',
+               'Howard','Janet','John','Katherine','Keith','Kelly','Pamela','Robert','Sean',
+               'Sharon','Tammy','Terry','Walter','Zachary']
+LAST_NAMES = ['Armstrong','Bailey','Bates','Castillo','Cook','Day','Estrada','Fox','Franklin',
+              'Graham','Jimenez','Jones','Kelley','Kim','Lane','Long','Marshall','May','Morgan',
+              'Ramos','Reed','Romero','Sullivan','Turner','Vasquez','Wilson']
+
+
+def day_to_date(day):
+    """
+    Returns the date string 'YYYY-MM-DD' for a day (or '' for NEVER).
+    
+    Parameter day: The number of days since 1970-01-01
+    Precondition: day is an int
+    """
+    if day == NEVER:
+        return ''
+    return datetime.date.fromordinal(utils.EPOCH_ORDINAL+day).isoformat()
+
+
+def date_to_day(year, month=1, day=1):
+    """
+    Returns the number of days since 1970-01-01 for the given date.
+    
+    Parameter year: The year
+    Precondition: year is an int
+    
+    Parameter month: The month (OPTIONAL)
+    Precondition: month is an int 1..12
+    
+    Parameter day: The day of the month (OPTIONAL)
+    Precondition: day is a valid day of that month
+    """
+    return datetime.date(year,month,day).toordinal()-utils.EPOCH_ORDINAL
+
+
+def format_offset(offset):
+    """
+    Returns the ISO suffix (like '-05:00') for a UTC offset.
+    
+    Parameter offset: The UTC offset in seconds
+    Precondition: offset is an int that is a whole number of minutes
+    """
+    sign = '-' if offset < 0 else '+'
+    minutes = abs(offset)//60
+    return '%s%02d:%02d' % (sign,minutes//60,minutes % 60)
+
+
+def local_offset(day, hour, timezone):
+    """
+    Returns the UTC offset (in seconds) of a local time.
+    
+    Parameter day: The number of days since 1970-01-01
+    Precondition: day is an int
+    
+    Parameter hour: The local hour
+    Precondition: hour is an int 0..23
+    
+    Parameter timezone: The time zone
+    Precondition: timezone is a string naming a valid time zone
+    """
+    wall = day*86400+hour*3600
+    return wall-utils.wall_to_epoch(wall,timezone)
+
+
+def choose(rng, weighted):
+    """
+    Returns a random value from a list of (value, chance) pairs.
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    
+    Parameter weighted: The values and their chances
+    Precondition: weighted is a nonempty sequence of pairs whose chances sum to 1
+    """
+    pick = rng.random()
+    for value, chance in weighted:
+        if pick < chance:
+            return value
+        pick -= chance
+    return weighted[-1][0]
+
+
+def sun_times(day):
+    """
+    Returns the pair (sunrise, sunset) for a day, in minutes after local midnight.
+    
+    The times use the usual approximations of the declination of the sun and of the
+    equation of time, which are within a few minutes of the KITH daycycle.  Like the
+    KITH daycycle, they are in standard time all year (the offset of January 1).
+    
+    Parameter day: The number of days since 1970-01-01
+    Precondition: day is an int
+    """
+    date = datetime.date.fromordinal(utils.EPOCH_ORDINAL+day)
+    number = date.timetuple().tm_yday
+    declination = math.radians(-23.44*math.cos(2*math.pi*(number+10)/365))
+    latitude = math.radians(LATITUDE)
+    cosine = ((math.sin(math.radians(-0.833))-math.sin(latitude)*math.sin(declination))/
+              (math.cos(latitude)*math.cos(declination)))
+    angle = math.degrees(math.acos(max(-1,min(1,cosine))))
+    b = 2*math.pi*(number-81)/364
+    equation = 9.87*math.sin(2*b)-7.53*math.cos(b)-1.5*math.sin(b)
+    offset = local_offset(date_to_day(date.year),12,LOCATION['timezone'])
+    noon = 720-4*LONGITUDE-equation+offset/60
+    return (round(noon-4*angle),round(noon+4*angle))
+
+
+def write_rows(filename, rows, encoding='utf-8'):
+    """
+    Writes the rows to a CSV file, with the line breaks of the KITH datasets.
+    
+    Parameter filename: The file to write
+    Precondition: filename is a string
+    
+    Parameter rows: The rows to write (including the header)
+    Precondition: rows is a list of lists of strings
+    
+    Parameter encoding: The text encoding (OPTIONAL)
+    Precondition: encoding is a string naming a Python codec
+    """
+    with open(filename,'w',newline='',encoding=encoding) as file:
+        csv.writer(file,lineterminator='\n').writerows(rows)
+
+
+def write_daycycle(filename, first, last):
+    """
+    Writes daycycle.json for the years first to last (inclusive).
+    
+    Parameter filename: The file to write
+    Precondition: filename is a string
+    
+    Parameter first: The first year
+    Precondition: first is an int
+    
+    Parameter last: The last year
+    Precondition: last is an int >= first
+    """
+    daycycle = dict(LOCATION)
+    for year in range(first,last+1):
+        days = {}
+        for day in range(date_to_day(year),date_to_day(year+1)):
+            sunrise, sunset = sun_times(day)
+            days[day_to_date(day)[5:]] = {'sunrise': '%02d:%02d' % divmod(sunrise,60),
+                                          'sunset': '%02d:%02d' % divmod(sunset,60)}
+        daycycle[str(year)] = days
+    with open(filename,'w') as file:
+        json.dump(daycycle,file,indent=4)
+        file.write('\n')
+
+
+def good_visibility(rng):
+    """
+    Returns a visibility measurement at least as good as every minimum.
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    """
+    miles = rng.choice((10.0,10.0,10.0,15.0,20.0))
+    if rng.random() < 0.5:
+        return {'prevailing': miles, 'units': 'SM'}
+    feet = miles*FEET_PER_MILE
+    return {'prevailing': feet, 'minimum': float(GOOD_VISIBILITY*FEET_PER_MILE),
+            'maximum': feet, 'units': 'FT'}
+
+
+def bad_visibility(rng):
+    """
+    Returns a visibility measurement worse than every minimum (or 'unavailable').
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    """
+    if rng.random() < 0.1:
+        return 'unavailable'
+    miles = rng.choice((0.125,0.25,0.25,BAD_VISIBILITY/2))
+    if rng.random() < 0.5:
+        return {'prevailing': 1.0, 'minimum': miles, 'units': 'SM'}
+    return {'prevailing': miles*FEET_PER_MILE, 'units': 'FT'}
+
+
+def measure_wind(rng, speed, crosswind, gusts):
+    """
+    Returns a wind measurement for the given speeds (in knots), in KT or MPS units.
+    
+    MPS values are rounded down, so a measurement is never worse than the speeds.
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    
+    Parameter speed: The wind speed
+    Precondition: speed is a float >= 0
+    
+    Parameter crosswind: The crosswind speed (or None)
+    Precondition: crosswind is a float >= 0 or None
+    
+    Parameter gusts: The gust speed (or None)
+    Precondition: gusts is a float >= 0 or None
+    """
+    units = 'KT' if rng.random() < 0.7 else 'MPS'
+    scale = 1 if units == 'KT' else 1/KNOTS_PER_MPS
+    winds = {'speed': math.floor(speed*scale*10)/10}
+    if crosswind != None:
+        winds['crosswind'] = math.floor(crosswind*scale*10)/10
+    if gusts != None:
+        winds['gusts'] = math.floor(gusts*scale*10)/10
+    winds['units'] = units
+    return winds
+
+
+def good_winds(rng):
+    """
+    Returns a wind measurement within every maximum.
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    """
+    if rng.random() < 0.15:
+        return 'calm'
+    speed = rng.randint(3,GOOD_WIND)
+    crosswind = rng.randint(0,min(speed,GOOD_CROSSWIND)) if rng.random() < 0.8 else None
+    gusts = rng.randint(speed,GOOD_GUSTS) if rng.random() < 0.3 else None
+    return measure_wind(rng,speed,crosswind,gusts)
+
+
+def bad_winds(rng):
+    """
+    Returns a wind measurement over every maximum (or 'unavailable').
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    """
+    pick = rng.random()
+    if pick < 0.1:
+        return 'unavailable'
+    if pick < 0.4:
+        return measure_wind(rng,rng.randint(10,20),rng.randint(BAD_CROSSWIND,BAD_CROSSWIND+10),None)
+    if pick < 0.7:
+        speed = rng.randint(15,25)
+        return measure_wind(rng,speed,None,rng.randint(BAD_WIND,BAD_WIND+10))
+    return measure_wind(rng,rng.randint(BAD_WIND,BAD_WIND+10),rng.randint(0,10),None)
+
+
+def good_ceiling(rng):
+    """
+    Returns a ceiling measurement at least as good as every minimum.
+    
+    Lower layers may be 'a few' or 'scattered', which do not set the ceiling.
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    """
+    if rng.random() < 0.3:
+        return 'clear'
+    layers = []
+    height = 0
+    for layer in range(rng.randint(1,3)):
+        height += rng.choice((500,1000,2000,3000))
+        if height < GOOD_CEILING or rng.random() < 0.5:
+            kind = rng.choice(OTHER_LAYERS)
+        else:
+            kind = rng.choice(CEILING_LAYERS)
+        layers.append({'type': kind, 'height': float(height), 'units': 'FT'})
+    if rng.random() < 0.5:
+        height = max(height+1000,GOOD_CEILING+rng.choice((0,1000,3000)))
+        layers.append({'type': rng.choice(CEILING_LAYERS), 'height': float(height), 'units': 'FT'})
+    return layers
+
+
+def bad_ceiling(rng):
+    """
+    Returns a ceiling measurement worse than every minimum (or 'unavailable').
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    """
+    if rng.random() < 0.1:
+        return 'unavailable'
+    layers = []
+    if rng.random() < 0.3:
+        layers.append({'type': rng.choice(OTHER_LAYERS), 'height': 100.0, 'units': 'FT'})
+    layers.append({'type': rng.choice(CEILING_LAYERS), 'height': float(rng.choice((200,300,BAD_CEILING))),
+                   'units': 'FT'})
+    if rng.random() < 0.5:
+        layers.append({'type': 'overcast', 'height': 2500.0, 'units': 'FT'})
+    return layers
+
+
+def make_report(rng, bad, code):
+    """
+    Returns an hourly weather report.
+    
+    A bad report has one measurement (sometimes two) worse than every minimum.
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    
+    Parameter bad: Whether the report is bad
+    Precondition: bad is a boolean
+    
+    Parameter code: The METAR code of the report
+    Precondition: code is a string
+    """
+    worse = set()
+    if bad:
+        worse.add(rng.randrange(3))
+        if rng.random() < 0.1:
+            worse.add(rng.randrange(3))
+    return {'visibility': bad_visibility(rng) if 0 in worse else good_visibility(rng),
+            'wind': bad_winds(rng) if 1 in worse else good_winds(rng),
+            'temperature': {'value': float(rng.randint(-10,30)), 'units': 'C'},
+            'sky': bad_ceiling(rng) if 2 in worse else good_ceiling(rng),
+            'code': code}
+
+
+def write_weather(filename, first, last, rate, rng):
+    """
+    Writes weather.json with a report for every hour of the days first to last.
+    
+    The reports are written one at a time, newest first (as in the KITH datasets).  A
+    report is bad with chance rate/2 (see the module docstring), and an hour has no
+    report with chance MISSING_REPORT.
+    
+    Parameter filename: The file to write
+    Precondition: filename is a string
+    
+    Parameter first: The first day
+    Precondition: first is an int (days since 1970-01-01)
+    
+    Parameter last: The last day
+    Precondition: last is an int >= first
+    
+    Parameter rate: The fraction of lessons with a violation
+    Precondition: rate is a float 0..1
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    """
+    timezone = LOCATION['timezone']
+    written = 0
+    seen = None
+    with open(filename,'w') as file:
+        file.write('{')
+        for day in range(last,first-1,-1):
+            date = day_to_date(day)
+            for hour in range(23,-1,-1):
+                offset = local_offset(day,hour,timezone)
+                epoch = day*86400+hour*3600-offset
+                # A skipped hour (daylight savings) has the same time as the next one
+                if epoch == seen or rng.random() < MISSING_REPORT:
+                    continue
+                seen = epoch
+                stamp = utils.epoch_to_time(epoch).strftime('KITH %d%H%MZ')
+                key = '%sT%02d:00:00%s' % (date,hour,format_offset(offset))
+                report = make_report(rng,rng.random() < rate/2,stamp)
+                file.write('%s\n    %s: %s' % (',' if written else '',json.dumps(key),json.dumps(report)))
+                written += 1
+        file.write('\n}\n')
+
+
+def make_fleet(size, start, rng):
+    """
+    Returns the rows of fleet.csv (without the header) for a fleet of the given size.
+    
+    The tail numbers are three digits and two letters, as in KITH.  The ANNUAL of each
+    plane is in the year before start, and its HOURS are below SERVICE_HOURS.
+    
+    Parameter size: The number of planes
+    Precondition: size is an int > 0 (and less than 600000)
+    
+    Parameter start: The first day of the lessons
+    Precondition: start is an int (days since 1970-01-01)
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    """
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    tails = set()
+    rows = []
+    for pos in range(size):
+        tail = None
+        while tail == None or tail in tails:
+            tail = '%d%02d%s%s' % (rng.randint(1,9),rng.randint(0,99),rng.choice(letters),
+                                   rng.choice(letters))
+        tails.add(tail)
+        model = MODELS[pos % len(MODELS)]
+        annual = start-rng.randint(1,ANNUAL_DUE-10)
+        rows.append([tail]+list(model)+[day_to_date(annual),str(rng.randint(0,SERVICE_HOURS-10))])
+    return rows
+
+
+def make_instructors(size, rng):
+    """
+    Returns the rows of instructors.csv (without the header).
+    
+    The first instructor has every rating, so every lesson can find an instructor.
+    
+    Parameter size: The number of instructors
+    Precondition: size is an int > 0
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    """
+    width = max(3,len(str(size)))
+    rows = []
+    for pos in range(size):
+        cfii = pos == 0 or rng.random() < 0.5
+        mei = pos == 0 or rng.random() < 0.25
+        rows.append(['I%0*d' % (width,pos+1),rng.choice(LAST_NAMES),rng.choice(FIRST_NAMES),
+                     'Yes','Yes' if cfii else 'No','Yes' if mei else 'No'])
+    return rows
+
+
+def write_students(filename, size, first, last, end, rng):
+    """
+    Writes students.csv, and returns the students as a dictionary of arrays.
+    
+    The students join on random days from first to last, and are numbered in the order
+    they join.  The dictionary maps 'ID' to the list of identifiers, and 'JOINED' and
+    each milestone in MILESTONES to an array of days (NEVER if it is not reached by the
+    day end, which is then left empty in the file).
+    
+    Parameter filename: The file to write
+    Precondition: filename is a string
+    
+    Parameter size: The number of students
+    Precondition: size is an int > 0
+    
+    Parameter first: The first day to join
+    Precondition: first is an int (days since 1970-01-01)
+    
+    Parameter last: The last day to join
+    Precondition: last is an int >= first
+    
+    Parameter end: The last day of the lessons
+    Precondition: end is an int
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    """
+    width = max(5,len(str(size)))
+    joined = sorted(rng.randint(first,last) for pos in range(size))
+    students = {'ID': [], 'JOINED': array.array('l',joined)}
+    for column, previous, chance, least, most in MILESTONES:
+        students[column] = array.array('l')
+
+    columns = ['JOINED']+[milestone[0] for milestone in MILESTONES]
+    with open(filename,'w',newline='') as file:
+        writer = csv.writer(file,lineterminator='\n')
+        writer.writerow(['ID','LAST NAME','FIRST NAME']+columns)
+        for pos in range(size):
+            id = 'S%0*d' % (width,pos+1)
+            students['ID'].append(id)
+            for column, previous, chance, least, most in MILESTONES:
+                day = students[previous][pos]
+                if day != NEVER and rng.random() < chance:
+                    day += rng.randint(least,most)
+                else:
+                    day = NEVER
+                students[column].append(day if day <= end else NEVER)
+            writer.writerow([id,rng.choice(LAST_NAMES),rng.choice(FIRST_NAMES)]+
+                            [day_to_date(students[column][pos]) for column in columns])
+    return students
+
+
+class Fleet(object):
+    """
+    A class tracking the planes of a synthetic dataset from day to day.
+    
+    Attribute rows: The rows of fleet.csv (without the header)
+    Invariant: rows is a list of 7-element lists of strings
+    
+    Attribute hours: The hours flown by each plane since its last repair
+    Invariant: hours is a list of ints, one for each plane
+    
+    Attribute annual: The day of the last annual of each plane
+    Invariant: annual is a list of ints, one for each plane
+    
+    Attribute back: The day each plane leaves the shop (or an earlier day if not in it)
+    Invariant: back is a list of ints, one for each plane
+    
+    Attribute ready: The planes that are not in the shop today
+    Invariant: ready is a list of positions in rows
+    
+    Attribute shop: The planes that are in the shop today
+    Invariant: shop is a list of positions in rows
+    """
+
+    def __init__(self, rows):
+        """
+        Initializes the planes at the start of the lessons.
+        
+        Parameter rows: The rows of fleet.csv (without the header)
+        Precondition: rows is a list of rows returned by make_fleet
+        """
+        self.rows = rows
+        self.hours = [int(row[6]) for row in rows]
+        self.annual = []
+        for row in rows:
+            year, month, day = row[5].split('-')
+            self.annual.append(date_to_day(int(year),int(month),int(day)))
+        self.back = [0]*len(rows)
+        self._annual = [False]*len(rows)
+        self.ready = []
+        self.shop = []
+
+    def start_day(self, day, rng, writer):
+        """
+        Starts a new day, sending planes to the shop as needed.
+        
+        A plane that leaves the shop today has its hours reset (and its annual, if it was
+        an annual inspection).  A plane goes to the shop when it reaches SERVICE_HOURS,
+        when its annual is due, or (rarely) for some other repair.  Each new repair is
+        written to repairs.csv.
+        
+        Parameter day: The day
+        Precondition: day is an int (days since 1970-01-01) after the previous day
+        
+        Parameter rng: The random number generator
+        Precondition: rng is a random.Random
+        
+        Parameter writer: The writer for repairs.csv
+        Precondition: writer is a csv.writer
+        """
+        self.ready = []
+        self.shop = []
+        for pos in range(len(self.rows)):
+            if self.back[pos] == day:
+                self.hours[pos] = 0
+                if self._annual[pos]:
+                    self.annual[pos] = day
+            if self.back[pos] > day:
+                self.shop.append(pos)
+                continue
+            if day-self.annual[pos] >= ANNUAL_DUE:
+                description = 'annual inspection'
+                days = rng.randint(2,4)
+            elif self.hours[pos] >= SERVICE_HOURS:
+                description = '100 hour inspection'
+                days = rng.randint(1,2)
+            elif rng.random() < REPAIR_CHANCE:
+                description = rng.choice(REPAIRS)
+                days = rng.randint(1,7)
+            else:
+                self.ready.append(pos)
+                continue
+            self.back[pos] = day+days
+            self._annual[pos] = description == 'annual inspection'
+            self.shop.append(pos)
+            writer.writerow([self.rows[pos][0],day_to_date(day),day_to_date(day+days),description])
+
+    def pick(self, length, rng):
+        """
+        Returns a plane that is not in the shop and can fly length more hours.
+        
+        If no such plane exists, this returns any plane (and the lesson is likely an
+        inspection violation).
+        
+        Parameter length: The hours of the lesson
+        Precondition: length is an int > 0
+        
+        Parameter rng: The random number generator
+        Precondition: rng is a random.Random
+        """
+        limit = 100-length
+        if self.ready:
+            for attempt in range(PLANE_TRIES):
+                pos = rng.choice(self.ready)
+                if self.hours[pos] <= limit:
+                    return pos
+            fits = [pos for pos in self.ready if self.hours[pos] <= limit]
+            if fits:
+                return rng.choice(fits)
+        return rng.randrange(len(self.rows))
+
+
+def make_lesson(rng, day, students, student, plane, fleet, instructors, fault):
+    """
+    Returns the lesson as the tuple (instructor, ifr), given its student and plane.
+    
+    The value instructor is a position in instructors (or None for a solo) and ifr is
+    whether the lesson is filed IFR.  If fault is True, the lesson lacks a credential.
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    
+    Parameter day: The day of the lesson
+    Precondition: day is an int (days since 1970-01-01)
+    
+    Parameter students: The students
+    Precondition: students is a dictionary returned by write_students
+    
+    Parameter student: The student of the lesson
+    Precondition: student is a position in students
+    
+    Parameter plane: The plane of the lesson
+    Precondition: plane is a position in fleet.rows
+    
+    Parameter fleet: The planes
+    Precondition: fleet is a Fleet
+    
+    Parameter instructors: The instructor positions for each pair (cfii, mei) of needs
+    Precondition: instructors is a dictionary of nonempty lists
+    """
+    row = fleet.rows[plane]
+    equipped = row[2] == 'IFR'
+    advanced = row[3] == 'Yes'
+    multiengine = row[4] == 'Yes'
+    soloed = students['SOLO'][student] <= day
+    rated = students['INSTRUMENT'][student] <= day
+    if fault:
+        if not soloed:
+            return (None,False)
+        if advanced and students['ADVANCED'][student] > day:
+            return (None,False)
+        if not rated:
+            return (None,True)
+        if not equipped:
+            return (None,True)
+
+    solo = (soloed and rng.random() < SOLO_CHANCE and
+            (not advanced or students['ADVANCED'][student] <= day) and
+            (not multiengine or students['MULTIENGINE'][student] <= day))
+    ifr = equipped and rng.random() < IFR_CHANCE and (rated or not solo)
+    if solo:
+        return (None,ifr)
+    return (rng.choice(instructors[(ifr,multiengine)]),ifr)
+
+
+def write_lessons(directory, days, lessons, rate, rng, students, fleet, instructors):
+    """
+    Writes lessons.csv and repairs.csv for the given days.
+    
+    The lessons are spread evenly over the days, and each day is written (in order of
+    takeoff) before the next day is generated.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string naming a directory
+    
+    Parameter days: The days of the lessons
+    Precondition: days is a range of ints (days since 1970-01-01)
+    
+    Parameter lessons: The number of lessons
+    Precondition: lessons is an int >= 0
+    
+    Parameter rate: The fraction of lessons with a violation
+    Precondition: rate is a float 0..1
+    
+    Parameter rng: The random number generator
+    Precondition: rng is a random.Random
+    
+    Parameter students: The students
+    Precondition: students is a dictionary returned by write_students
+    
+    Parameter fleet: The planes
+    Precondition: fleet is a Fleet
+    
+    Parameter instructors: The rows of instructors.csv (without the header)
+    Precondition: instructors is a list returned by make_instructors
+    """
+    pools = {}
+    for cfii in (False,True):
+        for mei in (False,True):
+            pools[(cfii,mei)] = [pos for pos in range(len(instructors)) if
+                                 (not cfii or instructors[pos][4] == 'Yes') and
+                                 (not mei or instructors[pos][5] == 'Yes')]
+    timezone = LOCATION['timezone']
+    joined = students['JOINED']
+    with open(os.path.join(directory,'lessons.csv'),'w',newline='') as file, \
+         open(os.path.join(directory,'repairs.csv'),'w',newline='') as repairs:
+        writer = csv.writer(file,lineterminator='\n')
+        writer.writerow(['STUDENT','AIRPLANE','INSTRUCTOR','TAKEOFF','LANDING','FILED','AREA'])
+        shop = csv.writer(repairs,lineterminator='\n')
+        shop.writerow(['TAIL NO','IN DATE','OUT DATE','DESCRIPTION'])
+        for pos in range(len(days)):
+            day = days[pos]
+            fleet.start_day(day,rng,shop)
+            count = (pos+1)*lessons//len(days)-pos*lessons//len(days)
+            newest = bisect.bisect_left(joined,day)
+            oldest = bisect.bisect_left(joined,day-ACTIVE_DAYS)
+            if count == 0 or newest == 0:
+                continue
+            if oldest == newest:
+                oldest = 0
+
+            offset = local_offset(day,12,timezone)
+            sunrise, sunset = sun_times(day)
+            first = max(FIRST_HOUR,sunrise//60+1)
+            last = min(LAST_HOUR,(sunset-1)//60)
+            date = day_to_date(day)
+            suffix = format_offset(offset)
+            rows = []
+            for lesson in range(count):
+                student = rng.randrange(oldest,newest)
+                length = choose(rng,LENGTHS)
+                hour = rng.randint(first,last)
+                pick = rng.random()
+                grounded = pick < rate/4 and len(fleet.shop) > 0
+                if grounded:
+                    plane = rng.choice(fleet.shop)
+                else:
+                    plane = fleet.pick(length,rng)
+                fleet.hours[plane] += length
+                instructor, ifr = make_lesson(rng,day,students,student,plane,fleet,pools,
+                                              not grounded and pick < rate/2)
+                area = 'Pattern' if ifr and rng.random() < 0.6 else choose(rng,AREAS)
+                rows.append((hour,[students['ID'][student],fleet.rows[plane][0],
+                                   '' if instructor == None else instructors[instructor][0],
+                                   '%sT%02d:00:00%s' % (date,hour,suffix),
+                                   '%sT%02d:00:00%s' % (date,hour+length,suffix),
+                                   'IFR' if ifr else 'VFR',area]))
+            rows.sort(key=lambda item: item[0])
+            writer.writerows([item[1] for item in rows])
+
+
+def generate_dataset(directory, lessons=LESSONS, years=1, start=START, fleet=0, rate=RATE, seed=0):
+    """
+    Writes a synthetic dataset to directory, and returns the number of lessons.
+    
+    The lessons are spread evenly over the years from start (inclusive).  If fleet is 0,
+    the number of planes is proportional to the lessons per year, as are the numbers of
+    students and instructors.  The directory is created if it does not exist, and any
+    dataset files in it are replaced.
+    
+    Parameter directory: The dataset directory
+    Precondition: directory is a string that is a valid directory name
+    
+    Parameter lessons: The number of lessons (OPTIONAL)
+    Precondition: lessons is an int >= 0
+    
+    Parameter years: The number of years of lessons (OPTIONAL)
+    Precondition: years is an int > 0
+    
+    Parameter start: The first year of lessons (OPTIONAL)
+    Precondition: start is an int > 1970 + DAYCYCLE_MARGIN
+    
+    Parameter fleet: The number of planes, or 0 to match the lessons (OPTIONAL)
+    Precondition: fleet is an int >= 0 (and less than 600000)
+    
+    Parameter rate: The fraction of lessons with a violation (OPTIONAL)
+    Precondition: rate is a float 0..1
+    
+    Parameter seed: The seed of the random number generators (OPTIONAL)
+    Precondition: seed is an int or a string
+    """
+    os.makedirs(directory,exist_ok=True)
+    per_year = max(1,lessons//years)
+    first = date_to_day(start)
+    days = range(first,date_to_day(start+years))
+    if fleet == 0:
+        fleet = max(MIN_FLEET,per_year//LESSONS_PER_PLANE)
+
+    write_daycycle(os.path.join(directory,'daycycle.json'),start-DAYCYCLE_MARGIN,
+                   start+years-1+DAYCYCLE_MARGIN)
+    write_weather(os.path.join(directory,'weather.json'),days[0],days[-1],rate,
+                  random.Random('%s/weather' % seed))
+    write_rows(os.path.join(directory,'minimums.csv'),MINIMUMS)
+
+    rng = random.Random('%s/school' % seed)
+    size = max(MIN_STUDENTS,per_year*(years+DAYCYCLE_MARGIN)//LESSONS_PER_STUDENT)
+    students = write_students(os.path.join(directory,'students.csv'),size,
+                              first-DAYCYCLE_MARGIN*365,days[-1]-30,days[-1],rng)
+    instructors = make_instructors(max(MIN_INSTRUCTORS,per_year//LESSONS_PER_INSTRUCTOR),rng)
+    # The KITH instructors.csv starts with a byte order mark
+    write_rows(os.path.join(directory,'instructors.csv'),
+               [['ID','LAST','FIRST','CFI','CFII','MEI']]+instructors,'utf-8-sig')
+    planes = make_fleet(fleet,first,rng)
+    write_rows(os.path.join(directory,'fleet.csv'),
+               [['TAIL NO','TYPE','CAPABILITY','ADVANCED','MULTIENGINE','ANNUAL','HOURS']]+planes)
+
+    write_lessons(directory,days,lessons,rate,random.Random('%s/lessons' % seed),students,
+                  Fleet(planes),instructors)
+    return lessons